@@ -1,4 +1,4 @@
-from flask import Flask
+from flask import Flask, current_app
 from flask_sqlalchemy import SQLAlchemy
 from dotenv import load_dotenv
 import os
@@ -6,7 +6,15 @@ import logging
 from flask_migrate import Migrate
 from flask_cors import CORS
 from flask_jwt_extended import JWTManager
-from redis import Redis
+from app.utils.ref_cache import ReferenceCache
+from app.utils.query_profiler import QueryProfiler
+from app.utils.log_pipeline import setup_logging
+from app.utils.db_pool import engine_options, configure_driver
+from app.utils.redis_pool import create_redis_client, RedisGuard
+from app.utils.password_hashing import PasswordHasher
+from app.utils.session_store import SessionStore
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
 
 load_dotenv()
 
@@ -17,17 +25,54 @@ CORS(
     origins=os.getenv('CORS_ALLOWED_ORIGINS').split(',') if os.getenv('CORS_ALLOWED_ORIGINS') else []
 )
      
-# Initialize Redis client
-redis_client = Redis(
-    host=os.getenv('REDIS_HOST', 'localhost'),
-    port=int(os.getenv('REDIS_PORT', 6379)),
-    db=int(os.getenv('REDIS_DB', 0)),
-    decode_responses=True
+# Initialize Redis client (see app.utils.redis_pool); the pool is per worker process
+app.config['REDIS_HOST'] = os.getenv('REDIS_HOST', 'localhost')
+app.config['REDIS_PORT'] = int(os.getenv('REDIS_PORT', 6379))
+app.config['REDIS_DB'] = int(os.getenv('REDIS_DB', 0))
+app.config['REDIS_MAX_CONNECTIONS'] = int(os.getenv('REDIS_MAX_CONNECTIONS', 50))
+app.config['REDIS_POOL_TIMEOUT'] = float(os.getenv('REDIS_POOL_TIMEOUT', 2))  # seconds to wait for a free connection
+app.config['REDIS_SOCKET_TIMEOUT'] = float(os.getenv('REDIS_SOCKET_TIMEOUT', 1))
+app.config['REDIS_CONNECT_TIMEOUT'] = float(os.getenv('REDIS_CONNECT_TIMEOUT', 0.5))
+app.config['REDIS_HEALTH_CHECK_INTERVAL'] = int(os.getenv('REDIS_HEALTH_CHECK_INTERVAL', 30))
+app.config['REDIS_RETRIES'] = int(os.getenv('REDIS_RETRIES', 2))
+app.config['REDIS_RETRY_BACKOFF_CAP'] = float(os.getenv('REDIS_RETRY_BACKOFF_CAP', 0.2))
+app.config['REDIS_FALLBACK_COOLDOWN'] = float(os.getenv('REDIS_FALLBACK_COOLDOWN', 5))
+redis_client = create_redis_client(app.config)
+# Local fallback for operations that can be approximate while Redis is down (rate limits)
+redis_guard = RedisGuard(redis_client, cooldown=app.config['REDIS_FALLBACK_COOLDOWN'])
+
+# Reference data cache (categories, currencies, goal priorities and statuses)
+reference_cache = ReferenceCache(
+    redis_client,
+    maxsize=int(os.getenv('REFERENCE_CACHE_MAXSIZE', 1024)),
+    ttl=int(os.getenv('REFERENCE_CACHE_TTL', 60)),
+    redis_ttl=int(os.getenv('REFERENCE_CACHE_REDIS_TTL', 3600))
+)
+
+# Per-user request context (user id, currency, financial profile id; see app.helpers.user_context).
+# Short TTLs: entries are dropped on change, but other workers keep their local copy until it expires
+user_context_cache = ReferenceCache(
+    redis_client,
+    maxsize=int(os.getenv('USER_CONTEXT_CACHE_MAXSIZE', 10000)),
+    ttl=int(os.getenv('USER_CONTEXT_CACHE_TTL', 30)),
+    redis_ttl=int(os.getenv('USER_CONTEXT_CACHE_REDIS_TTL', 300)),
+    prefix="userctx"
 )
 
 # Load the database URI from environment variables
 app.config['SQLALCHEMY_DATABASE_URI'] = os.getenv('SQLALCHEMY_DATABASE_URI')
 
+# Database pool and driver (see app.utils.db_pool); sizes are per worker process
+app.config['DB_POOL_SIZE'] = int(os.getenv('DB_POOL_SIZE', 10))
+app.config['DB_MAX_OVERFLOW'] = int(os.getenv('DB_MAX_OVERFLOW', 20))
+app.config['DB_POOL_TIMEOUT'] = int(os.getenv('DB_POOL_TIMEOUT', 10))  # seconds to wait for a free connection
+app.config['DB_POOL_RECYCLE'] = int(os.getenv('DB_POOL_RECYCLE', 1800))  # seconds before a connection is replaced
+app.config['DB_POOL_PRE_PING'] = os.getenv('DB_POOL_PRE_PING', 'true').lower() == 'true'
+app.config['DB_CONNECT_TIMEOUT'] = int(os.getenv('DB_CONNECT_TIMEOUT', 5))
+app.config['DB_STATEMENT_TIMEOUT_MS'] = int(os.getenv('DB_STATEMENT_TIMEOUT_MS', 30000))  # 0 disables
+app.config['DB_GEVENT_WAIT_CALLBACK'] = os.getenv('DB_GEVENT_WAIT_CALLBACK', 'auto').lower()  # auto, true or false
+app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options(app.config)
+
 # JWT Configuration
 app.config['JWT_SECRET_KEY'] = os.getenv('JWT_SECRET_KEY')
 app.config['SECRET_KEY'] = os.getenv('SECRET_KEY')
@@ -39,28 +84,126 @@ app.config['JWT_COOKIE_CSRF_PROTECT'] = True
 app.config['JWT_HTTPONLY'] = True
 app.config['FRONTEND_URL'] = os.getenv('FRONTEND_URL', '')
 
+# Password hashing (see app.utils.password_hashing); changing the method rehashes passwords at next login
+app.config['PASSWORD_HASH_METHOD'] = os.getenv('PASSWORD_HASH_METHOD', 'scrypt')  # werkzeug method, e.g. "pbkdf2:sha256:1000000"
+app.config['PASSWORD_HASH_WORKERS'] = int(os.getenv('PASSWORD_HASH_WORKERS', 4))  # native threads per worker process
+password_hasher = PasswordHasher(
+    method=app.config['PASSWORD_HASH_METHOD'],
+    workers=app.config['PASSWORD_HASH_WORKERS']
+)
+
+# SQL query profiling (see app.utils.query_profiler)
+app.config['QUERY_PROFILER_ENABLED'] = os.getenv('QUERY_PROFILER_ENABLED', 'true').lower() == 'true'
+app.config['QUERY_PROFILER_HEADERS'] = os.getenv('QUERY_PROFILER_HEADERS', 'false').lower() == 'true'
+app.config['QUERY_PROFILER_LOG_REQUESTS'] = os.getenv('QUERY_PROFILER_LOG_REQUESTS', 'true').lower() == 'true'
+app.config['METRICS_TOKEN'] = os.getenv('METRICS_TOKEN')  # bearer token for scrapers; admins can use their access token
+app.config['METRICS_STATEMENT_LABELS'] = os.getenv('METRICS_STATEMENT_LABELS', 'false').lower() == 'true'  # export slowest SQL text
+app.config['QUERY_COUNT_WARN_THRESHOLD'] = int(os.getenv('QUERY_COUNT_WARN_THRESHOLD', 0))  # 0 disables the warning
+
+# Rate limiting (see app.utils.rate_limiter); limits are set per endpoint
+app.config['RATE_LIMIT_ENABLED'] = os.getenv('RATE_LIMIT_ENABLED', 'true').lower() == 'true'
+app.config['RATE_LIMIT_TRUSTED_PROXIES'] = int(os.getenv('RATE_LIMIT_TRUSTED_PROXIES', 1))  # proxies appending to X-Forwarded-For (nginx); 0 when exposed directly
+app.config['RATE_LIMIT_LOCAL_HEADROOM'] = float(os.getenv('RATE_LIMIT_LOCAL_HEADROOM', 0.5))  # skip Redis while more than this share of a bucket is left
+app.config['RATE_LIMIT_LOCAL_TTL'] = float(os.getenv('RATE_LIMIT_LOCAL_TTL', 1))  # seconds; 0 always asks Redis
+
+# Email outbox delivery (see app.helpers.send_email); handlers only queue, `flask email worker` delivers
+app.config['EMAIL_SERVICE_URL'] = os.getenv('NETPIPO_EMAIL_URL')
+app.config['EMAIL_CONNECT_TIMEOUT'] = float(os.getenv('EMAIL_CONNECT_TIMEOUT', 3))
+app.config['EMAIL_READ_TIMEOUT'] = float(os.getenv('EMAIL_READ_TIMEOUT', 10))
+app.config['EMAIL_BATCH_SIZE'] = int(os.getenv('EMAIL_BATCH_SIZE', 50))  # messages claimed per round
+app.config['EMAIL_DELIVERY_CONCURRENCY'] = int(os.getenv('EMAIL_DELIVERY_CONCURRENCY', 8))  # threads / pooled connections
+app.config['EMAIL_MAX_ATTEMPTS'] = int(os.getenv('EMAIL_MAX_ATTEMPTS', 8))  # then dead-lettered
+app.config['EMAIL_RETRY_BASE'] = float(os.getenv('EMAIL_RETRY_BASE', 30))  # seconds, doubled per attempt
+app.config['EMAIL_RETRY_CAP'] = float(os.getenv('EMAIL_RETRY_CAP', 3600))
+app.config['EMAIL_LEASE_SECONDS'] = int(os.getenv('EMAIL_LEASE_SECONDS', 120))  # a claimed message is retried after this if its worker dies
+app.config['EMAIL_POLL_INTERVAL'] = float(os.getenv('EMAIL_POLL_INTERVAL', 1))
+
+# Allocation recalculation (see app.helpers.allocation_jobs)
+app.config['ALLOC_SYNC_LOCK_WAIT'] = float(os.getenv('ALLOC_SYNC_LOCK_WAIT', 2))  # seconds a sync recalculation waits for the worker, then queues
+
+# Pagination
+app.config['FINANCIAL_RECORDS_PAGE_SIZE'] = int(os.getenv('FINANCIAL_RECORDS_PAGE_SIZE', 100))
+app.config['FINANCIAL_RECORDS_MAX_PAGE_SIZE'] = int(os.getenv('FINANCIAL_RECORDS_MAX_PAGE_SIZE', 1000))
+
 
 if not app.config['SQLALCHEMY_DATABASE_URI']:
     raise RuntimeError("SQLALCHEMY_DATABASE_URI is not set")
 
 # Initialize db with the app after configuration
+db_wait_callback = configure_driver(app.config['SQLALCHEMY_DATABASE_URI'], app.config['DB_GEVENT_WAIT_CALLBACK'])
 db = SQLAlchemy(app)
 jwt = JWTManager(app)
+
+# Refresh-token sessions, one per login (see app.utils.session_store)
+session_store = SessionStore(redis_guard, ttl=app.config['JWT_REFRESH_TOKEN_EXPIRES'])
+
+
+@jwt.token_in_blocklist_loader
+def check_if_token_revoked(jwt_header, jwt_payload):
+    """
+    A refresh token is valid while its session exists; an access token while the session
+    named in its "sid" claim does. If Redis is unreachable, refresh tokens are refused
+    and access tokens (short-lived) accepted.
+    """
+    if jwt_payload.get("type") == "refresh":
+        return not session_store.is_active(jwt_payload["jti"], when_unavailable=False)
+    sid = jwt_payload.get("sid")
+    if sid is None:
+        return False  # issued before sessions existed; expires within JWT_ACCESS_TOKEN_EXPIRES
+    return not session_store.is_active(sid, when_unavailable=True)
+
 #initialize Flask-Migrate
 migrate = Migrate(app, db)
 
 # Other setup code if necessary
 
-# Configure the Flask logger
-handler = logging.FileHandler('app.log')
-handler.setLevel(logging.INFO)  # Set the handler logging level
+# Per-request SQL statement counts and timings
+query_profiler = QueryProfiler(slowest=int(os.getenv('QUERY_PROFILER_SLOWEST', 5)))
+queries_log = logging.getLogger("app.queries")
+if app.config['QUERY_PROFILER_ENABLED']:
+    event.listen(Engine, "before_cursor_execute", query_profiler.on_before_execute)
+    event.listen(Engine, "after_cursor_execute", query_profiler.on_after_execute)
+
+    @app.before_request
+    def start_query_profile():
+        query_profiler.start()
 
-# Update formatter to include pathname, filename, and line number
-formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s - [in %(pathname)s:%(lineno)d]')
-handler.setFormatter(formatter)
+    @app.after_request
+    def finish_query_profile(response):
+        summary = query_profiler.finish(response)
+        if summary is None:
+            return response
+        if app.config['QUERY_PROFILER_HEADERS']:
+            response.headers['X-DB-Query-Count'] = str(summary['queries'])
+            response.headers['X-DB-Time-Ms'] = str(summary['db_ms'])
+            response.headers['Server-Timing'] = f"db;dur={summary['db_ms']};desc=\"{summary['queries']} queries\""
+        if app.config['QUERY_PROFILER_LOG_REQUESTS'] and queries_log.isEnabledFor(logging.INFO):
+            queries_log.info(QueryProfiler.log_line(summary))
+        threshold = app.config['QUERY_COUNT_WARN_THRESHOLD']
+        if threshold and summary['queries'] > threshold:
+            current_app.logger.warning(
+                f"[queries] {summary['endpoint']} issued {summary['queries']} queries "
+                f"(threshold {threshold}) for {summary['method']} {summary['path']}"
+            )
+        return response
 
-app.logger.addHandler(handler)
-app.logger.setLevel(logging.INFO)
+# Configure the Flask logger: records go through a bounded queue to a rotating file
+# written by a background listener (see app.utils.log_pipeline)
+app.config['LOG_FILE'] = os.getenv('LOG_FILE', 'logs/app-{pid}.log')  # {pid}: one file per process, so workers never race on rollover
+app.config['LOG_FORMAT'] = os.getenv('LOG_FORMAT', 'json')  # json or text
+app.config['LOG_MAX_BYTES'] = int(os.getenv('LOG_MAX_BYTES', 50 * 1024 * 1024))
+app.config['LOG_BACKUP_COUNT'] = int(os.getenv('LOG_BACKUP_COUNT', 5))
+app.config['LOG_ROTATE_WHEN'] = os.getenv('LOG_ROTATE_WHEN')  # e.g. "midnight" to rotate by time instead of size
+app.config['LOG_QUEUE_SIZE'] = int(os.getenv('LOG_QUEUE_SIZE', 10000))
+app.config['LOG_LEVEL'] = os.getenv('LOG_LEVEL', 'INFO').upper()
+app.config['LOG_LEVELS'] = os.getenv('LOG_LEVELS', '')  # per logger, e.g. "app.alloc=WARNING,app.auth=DEBUG"
+app.config['LOG_SAMPLING'] = os.getenv('LOG_SAMPLING', '')  # DEBUG/INFO keep rate per logger, e.g. "app.alloc=0.05"
+log_queue_handler = setup_logging(app)
+app.logger.info(
+    "Database pool: size=%s overflow=%s timeout=%ss statement_timeout=%sms gevent_wait_callback=%s",
+    app.config['DB_POOL_SIZE'], app.config['DB_MAX_OVERFLOW'], app.config['DB_POOL_TIMEOUT'],
+    app.config['DB_STATEMENT_TIMEOUT_MS'], db_wait_callback
+)
 
 from app.api.v1.user.users import user_blueprint
 from app.api.v1.goals.goals import goal_blueprint
@@ -77,8 +220,11 @@ from app.api.v1.user.user_access import user_access_bp
 from app.api.v1.goals.goal_categories import goal_categories_blueprint
 from app.api.v1.goals.goal_recalculation import allocations_blueprint
 from app.routes.pages import pages
+from app.routes.metrics import metrics
 from app.api.v1.central.expense_orientation import expense_orientation_bp
 from app.api.v1.central.expense_beneficiaries import expense_beneficiary_bp
+from app.api.v1.central.reference_cache import reference_cache_bp
+from app.cli import totals_cli, allocations_cli, email_cli
 
 # Register blueprint
 app.register_blueprint(user_blueprint)
@@ -96,5 +242,12 @@ app.register_blueprint(user_access_bp)
 app.register_blueprint(goal_categories_blueprint)
 app.register_blueprint(allocations_blueprint)
 app.register_blueprint(pages)
+app.register_blueprint(metrics)
 app.register_blueprint(expense_orientation_bp)
-app.register_blueprint(expense_beneficiary_bp)
\ No newline at end of file
+app.register_blueprint(expense_beneficiary_bp)
+app.register_blueprint(reference_cache_bp)
+
+# Register CLI commands
+app.cli.add_command(totals_cli)
+app.cli.add_command(allocations_cli)
+app.cli.add_command(email_cli)
@@ -1,5 +1,7 @@
 from flask import Blueprint, request, jsonify, current_app
 from app.models.central.central import ExpenseBeneficiary
+from app import redis_guard
+from app.utils.rate_limiter import rate_limiter
 
 expense_beneficiary_bp = Blueprint('expense_beneficiary', __name__, url_prefix='/api/v1/expense_beneficiaries')
 
@@ -151,6 +153,7 @@ def list_expense_beneficiaries(user_id):
         ), 400
     
 @expense_beneficiary_bp.route('/bulk_create', methods=['POST'])
+@rate_limiter(redis_guard, limit=10, window=60, key_prefix="bulk", key=("user", "route"))
 def bulk_create_expense_beneficiaries():
     data = request.get_json()
     beneficiaries = data.get('expense_beneficiaries', [])
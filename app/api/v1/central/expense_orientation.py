@@ -1,5 +1,7 @@
 from flask import Blueprint, request, jsonify, current_app
 from app.models.central.central import ExpenseOrientation
+from app import redis_guard
+from app.utils.rate_limiter import rate_limiter
 
 expense_orientation_bp = Blueprint('expense_orientation', __name__, url_prefix='/api/v1/expense_orientation')
 
@@ -167,6 +169,7 @@ def get_expense_orientation_by_name(name):
     
 
 @expense_orientation_bp.route('/bulk_create', methods=['POST'])
+@rate_limiter(redis_guard, limit=10, window=60, key_prefix="bulk", key=("user", "route"))
 def bulk_create_expense_orientations():
     data = request.get_json()
     orientations = data.get('expense_orientations', [])
@@ -0,0 +1,34 @@
+from flask import Blueprint, jsonify, current_app
+from flask_jwt_extended import jwt_required, get_jwt_identity
+from app import reference_cache, user_context_cache
+from app.utils.access import admin_forbidden
+
+reference_cache_bp = Blueprint('reference_cache', __name__, url_prefix='/api/v1/reference_cache')
+
+
+@reference_cache_bp.route('/stats', methods=['GET'])
+@jwt_required()
+def get_reference_cache_stats():
+    """Hit counters and hit rate of the reference data and user context caches for this worker process. Admins only."""
+    forbidden = admin_forbidden()
+    if forbidden:
+        return forbidden
+    return jsonify({
+        "status": "success",
+        "data": dict(reference_cache.stats(), user_context=user_context_cache.stats())
+    }), 200
+
+
+@reference_cache_bp.route('/invalidate', methods=['POST'])
+@jwt_required()
+def invalidate_reference_cache():
+    """Invalidate every reference data namespace, e.g. after editing rows directly in the database. Admins only."""
+    forbidden = admin_forbidden()
+    if forbidden:
+        return forbidden
+    reference_cache.invalidate("categories", "currencies", "goal_priorities", "goal_statuses")
+    current_app.logger.info("Reference cache invalidated by user %s", get_jwt_identity())
+    return jsonify({
+        "status": "success",
+        "message": "Reference cache invalidated"
+    }), 200
@@ -1,6 +1,7 @@
 from flask import request, jsonify, Blueprint, current_app
 from app.models.client.financial import Categories
-from app import db
+from app import db, redis_guard
+from app.utils.rate_limiter import rate_limiter
 from datetime import datetime
 import traceback
 from sqlalchemy.orm.exc import NoResultFound
@@ -225,6 +226,7 @@ def get_all_categories():
         return jsonify({"error": "An unexpected error occurred", "status":"error"}), 500
 
 @categories_blueprint.route('/bulk_create', methods=['POST'])
+@rate_limiter(redis_guard, limit=10, window=60, key_prefix="bulk", key=("user", "route"))
 def bulk_create_categories():
     """Bulk create categories."""
     try:
@@ -1,5 +1,7 @@
 from flask import request, jsonify, Blueprint, current_app
 from app.models.client.financial import CategoriesType
+from app import redis_guard
+from app.utils.rate_limiter import rate_limiter
 from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm.exc import NoResultFound
 from flask import json
@@ -62,6 +64,7 @@ def create_category_type():
             ), 500
 
 @cat_types_blueprint.route('/api/v1/category-types/bulk', methods=['POST'])
+@rate_limiter(redis_guard, limit=10, window=60, key_prefix="bulk", key=("user", "route"))
 def bulk_create_category_types():
     """send category types from file/category_types.json file"""
     try:
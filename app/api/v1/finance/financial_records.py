@@ -1,5 +1,6 @@
-from flask import request, jsonify, Blueprint, current_app
-from app.models.client.financial import FinancialRecord
+from flask import request, jsonify, Blueprint, current_app, Response, stream_with_context
+import json
+from app.models.client.financial import FinancialRecord, UserMonthlyTotal
 from datetime import datetime
 from sqlalchemy.orm.exc import NoResultFound
 from app.models.client.financial import Categories
@@ -7,10 +8,13 @@ import uuid
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from decimal import Decimal, InvalidOperation
 from app.models.central.central import Currency
-from app.models.client.users_model import User
+from app.helpers.user_context import get_user_context
 # Validate amount
 from decimal import Decimal, InvalidOperation
 from app.models.central.central import ExpenseOrientation, ExpenseBeneficiary
+from app.utils.pagination import encode_cursor, decode_cursor, parse_page_size
+from app.helpers.allocation_jobs import enqueue_recalculation
+from redis.exceptions import RedisError
 
 
 financial_records_blueprint = Blueprint('financial_record_api', __name__, url_prefix='/api/v1/financial_records')
@@ -24,18 +28,13 @@ def create_financial_record(user_id):
     if str(current_user_id) != str(user_id):
         return jsonify({"status": "error", "error": "Unauthorized access"}), 403
     """
-    # Fetch user + preferred currency
-    user_obj = User.get_user_by_id(user_id)
-    user = user_obj.to_dict() if user_obj else None
+    # User + preferred currency, from the request/user context cache
+    user = get_user_context(user_id)
     if not user:
         return jsonify({"status": "error", "error": "User not found"}), 404
 
-    user_currency_id = None
-    if user.get("currency"):
-        preffered_currency = Currency.get_currency_by_code(user["currency"])
-        if preffered_currency:
-            user_currency_id = preffered_currency.id
-            
+    user_currency_id = uuid.UUID(user["currency_id"]) if user["currency_id"] else None
+
 
     try:
         data = request.get_json()
@@ -72,10 +71,10 @@ def create_financial_record(user_id):
             except ValueError:
                 return jsonify({"status": "error", "error": "Invalid currency format"}), 400
 
-            currency = Currency.get_currency_by_id(currency_uuid)
+            currency = Currency.get_cached_currency_by_id(currency_uuid)
             if not currency:
                 return jsonify({"status": "error", "error": "Invalid currency"}), 400
-            currency_id = currency.id
+            currency_id = uuid.UUID(currency["id"])
         elif user_currency_id:
             currency_id = user_currency_id
         else:
@@ -122,13 +121,22 @@ def create_financial_record(user_id):
         if new_record:
             message = f"{category.name} {category.type.name if hasattr(category, 'type') else ''} recorded successfully"
             current_app.logger.info(message)
+
+            # Queue the allocation recalculation; bursts of inserts coalesce into one job
+            allocation_job_id = None
+            try:
+                allocation_job_id, _ = enqueue_recalculation(user_id)
+            except RedisError as e:
+                current_app.logger.error(f"Could not queue allocation recalculation for user {user_id}: {e}")
+
             return jsonify({
                 "message": message,
                 "status": "success",
                 "record_id": str(new_record.record_id),
                 "amount": str(new_record.amount),
                 "currency": str(new_record.currency),
-                "recorded_at": new_record.recorded_at.isoformat()
+                "recorded_at": new_record.recorded_at.isoformat(),
+                "allocation_job_id": allocation_job_id
             }), 201
 
         return jsonify({"status": "error", "error": "Failed to create financial record"}), 500
@@ -142,16 +150,44 @@ def create_financial_record(user_id):
 @financial_records_blueprint.route('/all/<uuid:user_id>', methods=['GET', 'OPTIONS'])
 @jwt_required(optional=True)
 def get_financial_records(user_id):
-    """Fetch all financial records for a user."""
+    """
+    Fetch a user's financial records, newest first.
+
+    Query parameters:
+        limit: page size (default FINANCIAL_RECORDS_PAGE_SIZE, capped at FINANCIAL_RECORDS_MAX_PAGE_SIZE)
+        cursor: next_cursor from the previous page
+        format: "ndjson" streams every record, one JSON object per line, instead of paging
+    """
 
     if request.method == 'OPTIONS':
         return jsonify({}), 200
 
+    if request.args.get("format") == "ndjson":
+        def generate():
+            for record in FinancialRecord.stream_records_by_user(user_id):
+                yield json.dumps(FinancialRecord.row_to_dict(record)) + "\n"
+
+        return Response(stream_with_context(generate()), mimetype="application/x-ndjson"), 200
+
+    try:
+        limit = parse_page_size(
+            request.args.get("limit"),
+            default=current_app.config['FINANCIAL_RECORDS_PAGE_SIZE'],
+            maximum=current_app.config['FINANCIAL_RECORDS_MAX_PAGE_SIZE']
+        )
+        after = decode_cursor(request.args["cursor"]) if request.args.get("cursor") else None
+    except ValueError as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
+
     try:
-        records = FinancialRecord.get_records_by_user(user_id)
+        records, has_more = FinancialRecord.get_records_page(user_id, limit, after=after)
+        next_cursor = encode_cursor(records[-1].recorded_at, records[-1].record_id) if has_more else None
         return jsonify({
             "message": "Financial records fetched successfully",
-            "data":[record.to_dict() for record in records],
+            "data":[FinancialRecord.row_to_dict(record) for record in records],
+            "count": len(records),
+            "has_more": has_more,
+            "next_cursor": next_cursor,
             "status": "success"
         }), 200
     except Exception as e:
@@ -162,10 +198,10 @@ def get_financial_records(user_id):
 def get_income_records(user_id):
     """Fetch all income financial records for a user."""
     try:
-        records = FinancialRecord.get_income_records_by_user(user_id)
+        records = FinancialRecord.get_income_records_by_user(user_id) or []
         return jsonify({
             "message": "Income financial records fetched successfully",
-            "data":[record.to_dict() for record in records],
+            "data":[FinancialRecord.row_to_dict(record) for record in records],
             "status": "success"
         }), 200
     except Exception as e:
@@ -177,10 +213,10 @@ def get_income_records(user_id):
 def get_expense_records(user_id):
     """Fetch all expense financial records for a user."""
     try:
-        records = FinancialRecord.get_expense_records_by_user(user_id)
+        records = FinancialRecord.get_expense_records_by_user(user_id) or []
         return jsonify({
             "message": "Expense financial records fetched successfully",
-            "data":[record.to_dict() for record in records],
+            "data":[FinancialRecord.row_to_dict(record) for record in records],
             "total": sum(record.amount for record in records),
             "count": len(records),
             "status": "success"
@@ -213,11 +249,15 @@ def get_financial_records_by_month(user_id, month_year):
             }), 200
 
         # separate income and expenses
-        income_records = [record.to_dict() for record in records if record.category.type.name.lower() == 'income']
-        expense_records = [record.to_dict() for record in records if record.category.type.name.lower() == 'expense']
-        
-        total_income = sum(record['amount'] for record in income_records)
-        total_expenses = sum(record['amount'] for record in expense_records)
+        income_records = [FinancialRecord.row_to_dict(record) for record in records if (record.category_type_name or '').lower() == 'income']
+        expense_records = [FinancialRecord.row_to_dict(record) for record in records if (record.category_type_name or '').lower() == 'expense']
+
+        # Totals come from the monthly rollup (actual + expected records)
+        month_totals = UserMonthlyTotal.get_month_rows(user_id, year, month)
+        income_row = month_totals.get("Income")
+        expense_row = month_totals.get("Expense")
+        total_income = float(income_row.total_amount + income_row.expected_amount) if income_row else 0
+        total_expenses = float(expense_row.total_amount + expense_row.expected_amount) if expense_row else 0
 
         return jsonify({
             "message": "Financial records fetched successfully",
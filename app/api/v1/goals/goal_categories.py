@@ -1,5 +1,6 @@
 from flask import request, jsonify, Blueprint, current_app
-from app import db
+from app import db, redis_guard
+from app.utils.rate_limiter import rate_limiter
 from datetime import datetime, timezone
 from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm.exc import NoResultFound
@@ -123,6 +124,7 @@ def delete_category(category_id):
         return jsonify({"status": "error", "message": str(e)}), 500
 
 @goal_categories_blueprint.route('/bulk_create', methods=['POST'])
+@rate_limiter(redis_guard, limit=10, window=60, key_prefix="bulk", key=("user", "route"))
 def bulk_create_categories():
     try:
         data = request.get_json()
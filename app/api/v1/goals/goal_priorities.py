@@ -1,6 +1,7 @@
 from flask import request, jsonify, Blueprint, current_app
 from app.models.client.goal import GoalPriority
-from app import db
+from app import db, redis_guard
+from app.utils.rate_limiter import rate_limiter
 
 from sqlalchemy.exc import IntegrityError
 goal_priorities_blueprint = Blueprint('goal_priorities_api', __name__, url_prefix='/api/v1/goal_priorities')
@@ -37,6 +38,7 @@ def create_goal_priority():
     
 
 @goal_priorities_blueprint.route('/bulk_create', methods=['POST'])
+@rate_limiter(redis_guard, limit=10, window=60, key_prefix="bulk", key=("user", "route"))
 def bulk_create_goal_priorities():
     try:
         data = request.get_json()
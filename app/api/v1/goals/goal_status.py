@@ -1,5 +1,7 @@
 from flask import Blueprint, current_app
 from flask import request, jsonify
+from app import redis_guard
+from app.utils.rate_limiter import rate_limiter
 from app.models.client.goal import GoalStatus
 from app.utils.validator import (is_valid_string)
 
@@ -67,6 +69,7 @@ def delete_goal_status(status_id):
         return jsonify({"status": "error", "message": "Error while deleting goal status"}), 500
     
 @goal_status_bp.route('/api/v1/goal_status/bulk_create', methods=['POST'])
+@rate_limiter(redis_guard, limit=10, window=60, key_prefix="bulk", key=("user", "route"))
 def bulk_create_goal_statuses():
     try:
         data = request.get_json()
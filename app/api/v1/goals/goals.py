@@ -1,7 +1,8 @@
 from flask import request, jsonify, Blueprint, current_app
 from app.models.client.goal import Goal
-from app.models.client.users_model import User
-from app import db
+from app.helpers.user_context import get_user_context
+from app import db, redis_guard
+from app.utils.rate_limiter import rate_limiter
 from datetime import datetime
 import traceback
 from sqlalchemy.orm.exc import NoResultFound
@@ -20,7 +21,7 @@ def create_goal():
                 return jsonify({"status":"error","message": f"'{field}' is required"}), 400
             
         # Check if user exists
-        existing_user = User.get_user_by_id(data['user_id'])
+        existing_user = get_user_context(data['user_id'])
         if existing_user is None:
             current_app.logger.info(f"User with id {data['user_id']} does not exist")
             return jsonify({"status":"error","message": "User does not exist"}), 400
@@ -113,6 +114,7 @@ def get_all_goals(user_id):
         return jsonify({"status":"error", "message":"something went wrong, try again"}), 500
     
 @goal_blueprint.route('/bulk_create', methods=['POST'])
+@rate_limiter(redis_guard, limit=10, window=60, key_prefix="bulk", key=("user", "route"))
 def bulk_create_goals():
     try:
         data = request.get_json()
@@ -126,7 +128,7 @@ def bulk_create_goals():
                 if field not in goal_data:
                     return jsonify({"status":"error","message": f"'{field}' is required in each goal"}), 400
                 
-            existing_user = User.get_user_by_id(goal_data['user_id'])
+            existing_user = get_user_context(goal_data['user_id'])
             if existing_user is None:
                 current_app.logger.info(f"User with id {goal_data['user_id']} does not exist")
                 return jsonify({"status":"error","message": f"User with id {goal_data['user_id']} does not exist"}), 400
@@ -1,15 +1,26 @@
 from flask import request, jsonify, Blueprint, current_app
 from app.models.client.users_model import User
-from app import db, jwt
-from flask_jwt_extended import create_access_token, jwt_required, get_jwt_identity, create_refresh_token, set_refresh_cookies
+from app import db, jwt, session_store, redis_guard
+from flask_jwt_extended import (
+    create_access_token, jwt_required, get_jwt, get_jwt_identity, get_jti, create_refresh_token,
+    set_refresh_cookies, unset_jwt_cookies, verify_jwt_in_request
+)
+from flask_jwt_extended.exceptions import JWTExtendedException
+from jwt.exceptions import PyJWTError
+from redis.exceptions import RedisError
 from flask import make_response
 from datetime import datetime, timedelta
 import traceback
+import logging
 import os
 from app.models.central.central import Currency
+from app.utils.rate_limiter import rate_limiter
+
+auth_log = logging.getLogger("app.auth")
 user_access_bp = Blueprint('user_access_api', __name__, url_prefix='/api/v1/auth')
 
 @user_access_bp.route('/signup', methods=['POST'])
+@rate_limiter(redis_guard, limit=5, window=600, key_prefix="signup")
 def signup():
     try:
         data = request.get_json()
@@ -24,9 +35,6 @@ def signup():
             if field not in data:
                 return jsonify({"status": "error", "message": f"'{field}' is required"}), 400
         
-        # hash the password
-        hashed_password = User.set_password(password)
-
         # Check if user exists
         existing_user = User.get_user_by_email(data['email'])
         if existing_user:
@@ -36,7 +44,7 @@ def signup():
         # Create user
         user = User.create_user(
             email=data['email'],
-            password=hashed_password,
+            password=password,
             first_name=data['first_name'],
             last_name=data['last_name'],
             country_of_residence=data['country_of_residence'],
@@ -70,6 +78,7 @@ def signup():
         return jsonify({"status": "error", "message": str(e)}), 500
     
 @user_access_bp.route('/login', methods=['POST'])
+@rate_limiter(redis_guard, limit=10, window=60, key_prefix="login")
 def login():
     try:
 
@@ -87,32 +96,30 @@ def login():
         if email:
             email = email.strip()
         password = data.get('password')
-        cors_allowed_origins = os.getenv('CORS_ALLOWED_ORIGINS')
-        current_app.logger.info(f"CORS_ALLOWED_ORIGINS: {cors_allowed_origins}")
+        auth_log.debug("CORS_ALLOWED_ORIGINS: %s", os.getenv('CORS_ALLOWED_ORIGINS'))
         if not email or not password:
             return jsonify({"status": "error", "message": "'email' and 'password' are required"}), 400
 
         user = User.get_user_by_email(email)
         if user is None or not User.check_password(user, password):
-            current_app.logger.info(f"Invalid login attempt for email {email}, password {password}")
+            auth_log.info("Invalid login attempt for email %s", email)
             return jsonify({"status": "error", "message": "Invalid email or password"}), 401
+        if user.rehash_password_if_needed(password):
+            auth_log.info("Rehashed password for user %s", user.user_id)
         
-        current_app.logger.info(f"User {email} authenticated successfully")
-        # Create JWT token
-        access_token = create_access_token(identity=str(user.user_id))
+        auth_log.debug("User %s authenticated successfully", email)
+        # Create JWT tokens; the refresh token starts a session, which the access token names in "sid"
         refresh_token = create_refresh_token(identity=str(user.user_id))
-        
+        session_id = get_jti(refresh_token)
         try:
-            # hash refresh token in the database
-            hashed_refresh_token = User.set_password(refresh_token)
-            # save hashed refresh token to the user record
-            save_refresh_token = User.set_refresh_token(user.user_id, refresh_token)
-        except Exception as e:
-            current_app.logger.error(f"An error occurred while saving refresh token: {str(e)}")
-            return jsonify({"status": "error", "message": "An error occurred while processing login"}), 500
-
-        currency = Currency.get_currency_by_code(user.currency)
-        default_currency = currency.id
+            session_store.create(user.user_id, session_id)
+        except RedisError as e:
+            current_app.logger.error(f"Could not store session for user {user.user_id}: {e}")
+            return jsonify({"status": "error", "message": "Login is temporarily unavailable"}), 503
+        access_token = create_access_token(identity=str(user.user_id), additional_claims={"sid": session_id})
+
+        currency = Currency.get_cached_currency_by_code(user.currency)
+        default_currency = currency["id"]
         response = jsonify({
             "status": "success", 
             "message": "Login successful", 
@@ -126,9 +133,11 @@ def login():
         })
         set_refresh_cookies(response, refresh_token) # Set the refresh token in a secure HttpOnly cookie
 
-        current_app.logger.info(f"User {email} logged in successfully")
-        current_app.logger.info(f"Response data: {response.get_json()}")
-        current_app.logger.info(f"Response headers: {response.headers}")
+        auth_log.info("User %s logged in successfully", email)
+        if auth_log.isEnabledFor(logging.DEBUG):
+            body = {key: value for key, value in response.get_json().items() if key != "access_token"}
+            auth_log.debug("Login response data: %s", body)
+        auth_log.debug("Login response headers: %s", response.headers)
         return response, 200
 
     except Exception as e:
@@ -139,32 +148,67 @@ def login():
 @user_access_bp.route('/refresh', methods=['POST'])
 @jwt_required(refresh=True)
 def refresh():
+    """
+    Rotate the refresh token: its session (already checked live by the blocklist
+    loader) is replaced by a new one, and a new access token is issued for it.
+    """
     try:
         current_user_id = get_jwt_identity()
-        user = User.get_user_by_id(current_user_id)
-        if user is None:
-            return jsonify({"status": "error", "message": "User not found"}), 404
+        refresh_token = create_refresh_token(identity=current_user_id)
+        session_id = get_jti(refresh_token)
+        if not session_store.rotate(current_user_id, get_jwt()["jti"], session_id):
+            # Rotated or revoked since the check, e.g. by a concurrent refresh with the same token
+            return jsonify({"status": "error", "message": "No refresh token found, please log in again"}), 401
 
-        # Get existing refresh token from db
-        existing_hashed_token = user.refresh_token_hash
-        
-        if existing_hashed_token is None or user.check_password(user, request.cookies.get('refresh_token_cookie')) is False:
-            return jsonify({"status": "error", "message": "No refresh token found, please log in again"}), 401  
-        # Create new access token
-        new_access_token = create_access_token(identity=str(user.user_id))
+        new_access_token = create_access_token(identity=current_user_id, additional_claims={"sid": session_id})
         response = jsonify({"status": "success", "message": "Token refreshed successfully", "access_token": new_access_token})
+        set_refresh_cookies(response, refresh_token)
         return response, 200
+    except RedisError as e:
+        current_app.logger.error(f"Could not rotate session: {e}")
+        return jsonify({"status": "error", "message": "Token refresh is temporarily unavailable"}), 503
     except Exception as e:
         current_app.logger.error(f"An error occurred: {str(e)}")
         return jsonify({"status": "error", "message": str(e)}), 500
 
 @user_access_bp.route('/logout', methods=['POST'])
 def logout():
+    """End this device's session (if the refresh cookie is still valid) and clear the JWT cookies."""
     try:
+        try:
+            verify_jwt_in_request(refresh=True, optional=True)
+            session_id = get_jwt().get("jti")
+        except (JWTExtendedException, PyJWTError):
+            session_id = None  # expired, revoked or missing: nothing left to end
+        if session_id:
+            try:
+                session_store.revoke(session_id)
+            except RedisError as e:
+                current_app.logger.error(f"Could not revoke session {session_id}: {e}")
+
         response = jsonify({"status": "success", "message": "Logout successful"})
-        # Clear the refresh token cookie
-        response.set_cookie('refresh_token_cookie', '', expires=0, httponly=True, secure=True if os.getenv('FLASK_ENV') == 'production' else False, samesite='Lax')
+        unset_jwt_cookies(response)
         return response, 200
     except Exception as e:
         current_app.logger.error(f"An error occurred: {str(e)}")
-        return jsonify({"status": "error", "message": str(e)}), 500
\ No newline at end of file
+        return jsonify({"status": "error", "message": str(e)}), 500
+
+
+@user_access_bp.route('/logout_all', methods=['POST'])
+@jwt_required()
+def logout_all():
+    """End every session of the current user (all devices) and clear this device's JWT cookies."""
+    try:
+        current_user_id = get_jwt_identity()
+        deleted = session_store.revoke_all(current_user_id)
+        auth_log.info("User %s logged out everywhere", current_user_id)
+        response = jsonify({
+            "status": "success",
+            "message": "Logged out of all sessions",
+            "sessions_revoked": max(deleted - 1, 0)
+        })
+        unset_jwt_cookies(response)
+        return response, 200
+    except RedisError as e:
+        current_app.logger.error(f"Could not revoke sessions: {e}")
+        return jsonify({"status": "error", "message": "Logout is temporarily unavailable"}), 503
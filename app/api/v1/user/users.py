@@ -5,12 +5,15 @@ from datetime import datetime
 import traceback
 import re
 from itsdangerous import BadSignature, SignatureExpired, URLSafeTimedSerializer
-from app import redis_client
+from app import redis_client, redis_guard
 from app.utils.rate_limiter import rate_limiter
 from app.helpers.send_email import send_email
 
 
 user_blueprint = Blueprint('user_api', __name__, url_prefix='/api/v1/users')
+
+VERIFY_TOKEN_TTL = 900  # seconds a waitlist verification link stays valid
+
 @user_blueprint.route('/create', methods=['POST'])
 def create_user():
     try:
@@ -126,7 +129,7 @@ def update_user(user_id):
         return jsonify({"error": str(e)}), 500
 
 @user_blueprint.route('/add_to_waitlist', methods=['POST'])
-@rate_limiter(redis_client, limit=1, window=30, key_prefix="waitlist")
+@rate_limiter(redis_guard, limit=1, window=30, key_prefix="waitlist")
 def add_to_waitlist():
     try:
         data = request.get_json() or {}
@@ -143,9 +146,8 @@ def add_to_waitlist():
 
         # 3️⃣ Redis rate limit (1 request / 30 sec)
         rate_key = f"rate:waitlist:{email}"
-        if redis_client.get(rate_key):
+        if not redis_client.set(rate_key, "1", nx=True, ex=30):
             return jsonify({"status": "error", "message": "Too many requests. Please wait before retrying."}), 429
-        redis_client.setex(rate_key, 30, "1")
 
         # 4️⃣ Prevent duplicates
         existing_user = Waitlist.get_waitlist_user_by_email(email)
@@ -158,7 +160,7 @@ def add_to_waitlist():
         token = s.dumps(email)
 
         # Store in Redis for 15 min (until user verifies)
-        redis_client.setex(f"verify:{token}", 900, email)
+        redis_client.setex(f"verify:{token}", VERIFY_TOKEN_TTL, email)
 
         # 6️⃣ Send verification email
         verify_url = f"{current_app.config['FRONTEND_URL']}/verify-email?token={token}"
@@ -167,7 +169,7 @@ def add_to_waitlist():
         if not email_sent:
             return jsonify({"status": "error", "message": "Failed to send verification email"}), 500
 
-        current_app.logger.info(f"Verification email sent for waitlist: {email}")
+        current_app.logger.info(f"Verification email queued for waitlist: {email}")
 
         return jsonify({
             "status": "success",
@@ -186,11 +188,12 @@ def send_verification_email(email, verify_url):
         verify_url=verify_url,
         email=email
     )
-    success, message = send_email(email, subject, html_content)
+    # Not worth delivering once the link in it has expired
+    success, message = send_email(email, subject, html_content, expires_in=VERIFY_TOKEN_TTL)
     if not success:
-        current_app.logger.error(f"Failed to send verification email: {message}")
+        current_app.logger.error(f"Failed to queue verification email: {message}")
         return False
-    current_app.logger.info(f"Verification email sent to {email}")
+    current_app.logger.info(f"Verification email queued for {email}")
     return True
 
 @user_blueprint.route("/verify-email/<token>", methods=["GET"])
@@ -198,7 +201,7 @@ def verify_email_get(token):
     try:
         s = URLSafeTimedSerializer(current_app.config["SECRET_KEY"])
         try:
-            email = s.loads(token, max_age=900)  # 15 min expiration
+            email = s.loads(token, max_age=VERIFY_TOKEN_TTL)
         except SignatureExpired:
             return redirect(f"{current_app.config['FRONTEND_URL']}/verify-email-result?status=expired")
         except BadSignature:
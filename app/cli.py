@@ -0,0 +1,132 @@
+import click
+from datetime import datetime
+from flask.cli import AppGroup
+from app.models.client.financial import UserMonthlyTotal
+from app.helpers.allocation_jobs import run_worker
+from app.helpers.finalization import finalize_month
+from app.helpers.allocation_replay import replay
+from app.helpers.send_email import run_email_worker
+from app.models.client.email_outbox import EmailOutbox
+from app.models.client.users_model import UserFinancialProfile
+from app import db
+from app.utils.db_pool import disable_statement_timeout
+"""
+    Flask CLI commands for maintenance jobs.
+    Usage: flask <group> <command> --help
+"""
+
+totals_cli = AppGroup('totals', help='Maintain the user_monthly_totals rollup.')
+
+
+@totals_cli.command('rebuild')
+@click.option('--user', 'user_id', default=None, help='Only rebuild this user_id. Rebuilds everyone when omitted.')
+def rebuild_totals(user_id):
+    """Recompute user_monthly_totals from financial_records."""
+    disable_statement_timeout(db.session)  # the full rebuild is one long INSERT ... SELECT
+    rows = UserMonthlyTotal.rebuild(user_id=user_id)
+    scope = f"user {user_id}" if user_id else "all users"
+    click.echo(f"Rebuilt {rows} monthly total row(s) for {scope}.")
+
+
+allocations_cli = AppGroup('allocations', help='Allocation recalculation jobs.')
+
+
+@allocations_cli.command('worker')
+@click.option('--burst', is_flag=True, help='Exit once the queue is empty instead of waiting for new jobs.')
+@click.option('--poll-timeout', default=5, show_default=True, help='Seconds to block waiting for a job.')
+def allocations_worker(burst, poll_timeout):
+    """Process queued allocation recalculations."""
+    processed = run_worker(poll_timeout=poll_timeout, burst=burst)
+    click.echo(f"Processed {processed} job(s).")
+
+
+@allocations_cli.command('finalize')
+@click.option('--month', required=True, help='Month to finalize, YYYY-MM.')
+@click.option('--chunk-size', default=500, show_default=True, help='Users per transaction.')
+@click.option('--restart', is_flag=True, help='Ignore the checkpoint of an interrupted run.')
+def finalize_allocations(month, chunk_size, restart):
+    """Finalize a month's allocations for all users, resuming from the last checkpoint."""
+    def report(summary):
+        total = summary['total_users'] or 1
+        click.echo(
+            f"[{summary['users'] * 100 // total:3d}%] users {summary['users']}/{summary['total_users']}, "
+            f"allocations {summary['allocations']}, goals {summary['goals']}, {summary['elapsed_seconds']}s"
+        )
+
+    summary = finalize_month(month, chunk_size=chunk_size, restart=restart, progress=report)
+    if summary['resumed_from']:
+        click.echo(f"Resumed after user {summary['resumed_from']}.")
+    click.echo(
+        f"Finalized {month}: {summary['users']} user(s), {summary['allocations']} allocation(s), "
+        f"{summary['goals']} goal(s) in {summary['chunks']} chunk(s), {summary['elapsed_seconds']}s."
+    )
+
+
+@allocations_cli.command('replay')
+@click.option('--from', 'from_month', required=True, help='First month to rebuild, YYYY-MM.')
+@click.option('--user', 'user_ids', multiple=True, help='user_id to replay; repeat for several.')
+@click.option('--all', 'all_users', is_flag=True, help='Replay every user with a financial profile.')
+@click.option('--workers', default=4, show_default=True, help='Worker processes; 1 runs in this process.')
+@click.option('--restart', is_flag=True, help='Replay users an interrupted run already finished.')
+@click.option('--dry-run', is_flag=True, help='Compute everything, then roll back each user.')
+def replay_allocations(from_month, user_ids, all_users, workers, restart, dry_run):
+    """Rebuild allocations, balances and goal amounts from the ledger, from a month on."""
+    try:
+        datetime.strptime(from_month, "%Y-%m")
+    except ValueError:
+        raise click.BadParameter("expected YYYY-MM", param_hint="--from")
+    if bool(user_ids) == all_users:
+        raise click.UsageError("Pass either --user or --all.")
+
+    targets = UserFinancialProfile.get_user_ids() if all_users else list(user_ids)
+
+    def report(summary):
+        processed = summary['replayed'] + summary['skipped'] + summary['failed']
+        if processed % 100 == 0 or processed == summary['users']:
+            click.echo(
+                f"[{processed}/{summary['users']}] records {summary['records']}, "
+                f"{summary['users_per_second']} users/s, {summary['records_per_second']} records/s"
+            )
+
+    summary = replay(targets, from_month, workers=workers, restart=restart, dry_run=dry_run, progress=report)
+    if summary['skipped_done']:
+        click.echo(f"Skipped {summary['skipped_done']} user(s) finished by an earlier run (--restart to redo).")
+    for problem in summary['problems']:
+        click.echo(f"  {problem['status']}: user {problem['user_id']}: {problem.get('reason')}")
+    click.echo(
+        f"{'Dry run' if dry_run else 'Replayed'} from {from_month}: {summary['replayed']} user(s) replayed, "
+        f"{summary['skipped']} skipped, {summary['failed']} failed; {summary['records']} record(s) in "
+        f"{summary['elapsed_seconds']}s ({summary['users_per_second']} users/s, "
+        f"{summary['records_per_second']} records/s)."
+    )
+
+
+email_cli = AppGroup('email', help='Email outbox delivery.')
+
+
+@email_cli.command('worker')
+@click.option('--burst', is_flag=True, help='Exit once no email is due instead of waiting for new ones.')
+@click.option('--poll-interval', default=None, type=float, help='Seconds between polls when idle [default: EMAIL_POLL_INTERVAL].')
+def email_worker(burst, poll_interval):
+    """Deliver queued emails."""
+    totals = run_email_worker(poll_interval=poll_interval, burst=burst)
+    click.echo(
+        f"Claimed {totals['claimed']} email(s): {totals['sent']} sent, "
+        f"{totals['retried']} to retry, {totals['dead']} dead-lettered, {totals['expired']} expired."
+    )
+
+
+@email_cli.command('requeue-dead')
+@click.option('--id', 'message_ids', multiple=True, help='Outbox id to requeue; repeat for several. All when omitted.')
+def email_requeue_dead(message_ids):
+    """Give dead-lettered emails a fresh set of attempts."""
+    count = EmailOutbox.requeue_dead(list(message_ids) or None)
+    click.echo(f"Requeued {count} email(s).")
+
+
+@email_cli.command('status')
+def email_status():
+    """Count outbox emails by status."""
+    counts = EmailOutbox.status_counts()
+    for status in (EmailOutbox.PENDING, EmailOutbox.SENT, EmailOutbox.DEAD):
+        click.echo(f"{status}: {counts.get(status, 0)}")
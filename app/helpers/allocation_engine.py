@@ -0,0 +1,448 @@
+from dataclasses import dataclass, field
+from decimal import Decimal
+from fractions import Fraction
+from app.helpers.financials import quantize
+from app.helpers import allocation_vectorized
+"""
+    Pure allocation engine.
+    Takes a snapshot of a user's balances, monthly totals, active goals and the
+    current month's allocations, and returns an AllocationPlan describing every
+    write the recalculation needs. Nothing in this module touches the database,
+    so the same logic can be applied in a single transaction, replayed or simulated.
+"""
+
+ZERO = Decimal('0.00')
+# Portfolios with at least this many open goals split surpluses on integer-cent arrays
+# (see app.helpers.allocation_vectorized) when NumPy is installed; results are identical.
+VECTORIZE_MIN_GOALS = 64
+
+
+@dataclass
+class LedgerEntry:
+    """An allocation transaction to record in financial_records."""
+    category: str  # "Saving" or "Deficit"
+    amount: Decimal
+    description: str
+
+
+class AllocationGoal:
+    """
+    The fields of a goal the engine reads, and nothing else.
+
+    Built straight from a projection query (see Goal.get_allocation_goals) instead of
+    Goal.to_dict(), so a recalculation loads no relationships and formats no
+    timestamps. Amounts are Decimals (or anything Decimal(str(x)) accepts);
+    protection_level is the GoalProtectionLevel value and status the status name.
+    """
+    __slots__ = (
+        "goal_id", "title", "target_amount", "current_amount", "priority_percentage",
+        "status", "protection_level", "protection_reason", "is_locked", "is_essential",
+    )
+
+    def __init__(self, goal_id, title=None, target_amount=0, current_amount=0, priority_percentage=0,
+                 status=None, protection_level="flexible", protection_reason=None,
+                 is_locked=False, is_essential=False):
+        self.goal_id = goal_id
+        self.title = title
+        self.target_amount = target_amount
+        self.current_amount = current_amount
+        self.priority_percentage = priority_percentage
+        self.status = status
+        self.protection_level = protection_level
+        self.protection_reason = protection_reason
+        self.is_locked = is_locked
+        self.is_essential = is_essential
+
+    def __repr__(self):
+        return f"<AllocationGoal(goal_id='{self.goal_id}', target={self.target_amount}, current={self.current_amount})>"
+
+    def to_dict(self):
+        return {name: getattr(self, name) for name in self.__slots__}
+
+
+# Sign of each ledger entry's effect on (savings_balance, deficit_balance), by description.
+# Lets a replay unwind recorded entries; keep in step with the LedgerEntry descriptions below.
+LEDGER_EFFECTS = {
+    "Deficit fully repaid using current funds.": (0, -1),
+    "Partial deficit repayment made.": (0, -1),
+    "Recorded deficit after using available funds.": (0, 1),
+    "Withdrawn from savings to cover expenses.": (-1, 0),
+    "No active goals — funds moved to savings.": (1, 0),
+    "Goals already funded — funds saved.": (1, 0),
+    "Unallocated funds moved to savings.": (1, 0),
+}
+
+
+@dataclass
+class AllocationPlan:
+    """Result of a recalculation: the new balances plus the writes needed to reach them."""
+    net_change: Decimal
+    savings_balance: Decimal
+    deficit_balance: Decimal
+    total_income: Decimal
+    total_expense: Decimal
+    response: dict
+    ledger_entries: list = field(default_factory=list)
+    allocation_deltas: dict = field(default_factory=dict)  # goal_id -> change to this month's allocation
+    goal_deltas: dict = field(default_factory=dict)  # goal_id -> change to goals.current_amount
+
+    @property
+    def has_changes(self):
+        """False when there was nothing to process and no write is needed."""
+        return self.net_change != 0
+
+
+def _add_delta(deltas, goal_id, amount):
+    deltas[goal_id] = quantize(deltas.get(goal_id, ZERO) + amount)
+
+
+def compute_net_change(balances, totals):
+    """Return the quantized (income_delta - expense_delta) since the last snapshot."""
+    total_income = quantize(Decimal(str(totals.get("total_income", 0))))
+    total_expense = quantize(Decimal(str(totals.get("total_expense", 0))))
+    income_delta = quantize(total_income - (balances.get("total_income_snapshot") or ZERO))
+    expense_delta = quantize(total_expense - (balances.get("total_expense_snapshot") or ZERO))
+    return quantize(income_delta - expense_delta)
+
+
+def plan_recalculation(balances, totals, goals, month_allocations=None):
+    """
+    Run the savings → flexible goals → deficit allocation strategy in memory.
+
+    Args:
+        balances: dict with savings_balance, deficit_balance, total_income_snapshot,
+            total_expense_snapshot and include_savings_in_alloc from the financial profile.
+        totals: dict with total_income and total_expense for the current month.
+        goals: list of AllocationGoal for the active goals (see Goal.get_allocation_goals).
+        month_allocations: dict of goal_id -> amount allocated this month. Only read
+            when the net change is negative.
+
+    Returns:
+        AllocationPlan
+    """
+    month_allocations = month_allocations or {}
+
+    total_income = quantize(Decimal(str(totals.get("total_income", 0))))
+    total_expense = quantize(Decimal(str(totals.get("total_expense", 0))))
+    net_change = compute_net_change(balances, totals)
+
+    savings_balance = quantize(balances.get("savings_balance") or ZERO)
+    deficit_balance = quantize(balances.get("deficit_balance") or ZERO)
+
+    plan = AllocationPlan(
+        net_change=net_change,
+        savings_balance=savings_balance,
+        deficit_balance=deficit_balance,
+        total_income=total_income,
+        total_expense=total_expense,
+        response={}
+    )
+
+    # No change, nothing to process
+    if net_change == 0:
+        plan.response = {
+            "status": "success",
+            "message": "No new transactions to process.",
+            "savings_balance": float(savings_balance),
+            "deficit_balance": float(deficit_balance)
+        }
+        return plan
+
+    existing_savings = savings_balance
+    existing_deficit = deficit_balance
+    available_funds = net_change
+
+    # Optionally include existing savings in allocation pool (for positive changes)
+    if balances.get("include_savings_in_alloc") and existing_savings > 0 and net_change > 0:
+        available_funds += existing_savings
+        plan.savings_balance = ZERO
+
+    # Case A: Repay existing deficit if we have positive funds
+    if existing_deficit > 0 and available_funds > 0:
+        if available_funds >= existing_deficit:
+            paid = existing_deficit
+            available_funds -= paid
+            plan.deficit_balance = ZERO
+            plan.ledger_entries.append(
+                LedgerEntry("Deficit", paid, "Deficit fully repaid using current funds.")
+            )
+        else:
+            paid = available_funds
+            plan.deficit_balance = quantize(existing_deficit - paid)
+            plan.ledger_entries.append(
+                LedgerEntry("Deficit", paid, "Partial deficit repayment made.")
+            )
+            plan.response = {
+                "status": "deficit_partial",
+                "message": "Partial deficit repayment made. No allocations available.",
+                "remaining_deficit": float(plan.deficit_balance)
+            }
+            return plan
+
+    # Case B: Negative net change, pull from savings, then flexible goals, then deficit
+    if net_change < 0:
+        _plan_shortage(plan, abs(net_change), goals, month_allocations)
+        return plan
+
+    if available_funds <= 0:
+        plan.response = {
+            "status": "success",
+            "message": "All funds used for deficit repayment.",
+            "savings_balance": float(plan.savings_balance),
+            "deficit_balance": float(plan.deficit_balance)
+        }
+        return plan
+
+    if not goals:
+        plan.savings_balance = quantize(plan.savings_balance + available_funds)
+        plan.ledger_entries.append(
+            LedgerEntry("Saving", available_funds, "No active goals — funds moved to savings.")
+        )
+        plan.response = {
+            "status": "saved",
+            "message": "No active goals. Funds saved.",
+            "savings_balance": float(plan.savings_balance)
+        }
+        return plan
+
+    _plan_surplus(plan, available_funds, goals)
+    return plan
+
+
+def _plan_shortage(plan, shortage, goals, month_allocations):
+    """Cover a shortage from savings first, then flexible goal allocations, then record a deficit."""
+    pullback_from_savings = ZERO
+    recovered_from_goals = ZERO
+    goal_reductions = []
+    protected_goals_skipped = []
+
+    # Step 1: Pull from savings balance first (protects goal allocations)
+    if shortage > 0 and plan.savings_balance > 0:
+        pullback_from_savings = min(plan.savings_balance, shortage)
+        plan.savings_balance = quantize(plan.savings_balance - pullback_from_savings)
+        shortage -= pullback_from_savings
+        plan.ledger_entries.append(
+            LedgerEntry("Saving", pullback_from_savings, "Withdrawn from savings to cover expenses.")
+        )
+
+    # Step 2: Pull from flexible goal allocations (respecting protection levels)
+    if shortage > 0 and goals:
+        pullable_goals = []
+
+        for g in goals:
+            goal_id = g.goal_id
+            current_allocation = Decimal(str(month_allocations.get(goal_id, 0) or 0))
+            if current_allocation <= 0:
+                continue
+
+            if g.protection_level == "protected" or g.is_locked or g.status == "completed":
+                protected_goals_skipped.append({
+                    "goal_id": str(goal_id),
+                    "goal_title": g.title,
+                    "amount": float(current_allocation),
+                    "reason": g.protection_reason or "User-protected"
+                })
+                continue
+
+            # Lower score = pull first
+            priority_pct = Decimal(str(g.priority_percentage or 0))
+            current_amt = Decimal(str(g.current_amount or 0))
+            target_amt = Decimal(str(g.target_amount or 0))
+            completion_pct = (current_amt / target_amt * 100) if target_amt > 0 else 0
+            is_essential = g.is_essential
+
+            pull_score = (
+                (100 - float(priority_pct)) * 2 +  # Low priority = pull first
+                (100 - float(completion_pct)) +    # Far from done = pull first
+                (0 if is_essential else 50)        # Non-essential = pull first
+            )
+            pullable_goals.append((pull_score, g, current_allocation))
+
+        pullable_goals.sort(key=lambda item: item[0])
+
+        for _, goal, allocated_amt in pullable_goals:
+            if shortage <= 0:
+                break
+
+            goal_id = goal.goal_id
+            pullback = min(allocated_amt, shortage)
+            new_allocation = quantize(allocated_amt - pullback)
+
+            _add_delta(plan.allocation_deltas, goal_id, -pullback)
+            _add_delta(plan.goal_deltas, goal_id, -pullback)
+
+            recovered_from_goals += pullback
+            shortage -= pullback
+
+            goal_reductions.append({
+                "goal_id": str(goal_id),
+                "goal_title": goal.title,
+                "reduced_by": float(pullback),
+                "new_allocation": float(new_allocation),
+                "priority": float(goal.priority_percentage or 0)
+            })
+
+    # Step 3: Only record deficit if we still have a shortage after pulling from all sources
+    if shortage > 0:
+        plan.deficit_balance = quantize(plan.deficit_balance + shortage)
+        plan.ledger_entries.append(
+            LedgerEntry("Deficit", shortage, "Recorded deficit after using available funds.")
+        )
+
+    plan.response = {
+        "status": "expense_processed",
+        "message": "Expense processed using available funds.",
+        "net_change": float(plan.net_change),
+        "funds_used": {
+            "from_savings": float(pullback_from_savings),
+            "from_goals": float(recovered_from_goals)
+        },
+        "goal_reductions": goal_reductions,
+        "protected_goals": protected_goals_skipped,
+        "savings_balance": float(plan.savings_balance),
+        "deficit_balance": float(plan.deficit_balance)
+    }
+
+    if shortage > 0:
+        plan.response["deficit_created"] = float(shortage)
+        plan.response["message"] += f" Deficit of {float(shortage)} recorded."
+    else:
+        plan.response["message"] += " No deficit created."
+
+
+def water_fill(pool, caps, weights):
+    """
+    Split `pool` across goals in proportion to `weights` without exceeding `caps`.
+
+    Water-filling: goals are visited in the order in which they would fill up
+    (cap / weight ascending). A goal whose proportional share of what is left
+    covers its cap gets exactly its cap, and the excess is spread over the goals
+    still open; the first goal that can't be filled stops the scan and the rest
+    split the remainder proportionally. Cents lost to truncation go one each to
+    the open goals with the largest remainders (ties by position). O(n log n).
+
+    All arguments are integers (cents; weights > 0). Returns a list of integer
+    allocations that sums to min(pool, sum(caps)), none above its cap.
+    """
+    alloc = [0] * len(caps)
+    order = sorted(range(len(caps)), key=lambda i: Fraction(caps[i], weights[i]))
+    remaining, weight_left = pool, sum(weights)
+
+    filled = 0
+    for i in order:
+        if caps[i] * weight_left > remaining * weights[i]:
+            break
+        alloc[i] = caps[i]
+        remaining -= caps[i]
+        weight_left -= weights[i]
+        filled += 1
+
+    open_goals = order[filled:]
+    if open_goals:
+        remainders = []
+        for i in open_goals:
+            alloc[i], remainder = divmod(remaining * weights[i], weight_left)
+            remainders.append((-remainder, i))
+        residue = remaining - sum(alloc[i] for i in open_goals)
+        for _, i in sorted(remainders)[:residue]:
+            alloc[i] += 1
+    return alloc
+
+
+def _plan_surplus(plan, available_funds, goals):
+    """Fill open goals by priority (see water_fill), saving only what no goal can take."""
+    goals_with_gap = []
+
+    for g in goals:
+        # Skip completed or locked goals from new allocations
+        if g.status == "completed" or g.is_locked:
+            continue
+
+        target = Decimal(str(g.target_amount or 0))
+        current = Decimal(str(g.current_amount or 0))
+        gap = quantize(target - current)
+        priority_pct = quantize(Decimal(str(g.priority_percentage or 0)))
+
+        # Goals without a priority share never receive surplus funds
+        if gap > 0 and priority_pct > 0:
+            goals_with_gap.append((g, gap, priority_pct))
+
+    if not goals_with_gap:
+        plan.savings_balance = quantize(plan.savings_balance + available_funds)
+        plan.ledger_entries.append(
+            LedgerEntry("Saving", available_funds, "Goals already funded — funds saved.")
+        )
+        plan.response = {
+            "status": "saved",
+            "message": "Goals already funded — funds saved.",
+            "savings_balance": float(plan.savings_balance)
+        }
+        return
+
+    total_gap = sum((gap for _, gap, _ in goals_with_gap), ZERO)
+    allocatable_pool = min(available_funds, total_gap)
+    total_allocated = ZERO
+    allocations_summary = []
+    newly_completed_goals = []
+
+    amounts = None
+    if len(goals_with_gap) >= VECTORIZE_MIN_GOALS and allocation_vectorized.available():
+        try:
+            amounts = allocation_vectorized.surplus_amounts(allocatable_pool, goals_with_gap)
+        except OverflowError:
+            pass  # amounts beyond int64 range: the exact path below handles them
+    if amounts is None:
+        amounts_c = water_fill(
+            int(allocatable_pool * 100),
+            [int(gap * 100) for _, gap, _ in goals_with_gap],
+            [int(pct * 100) for _, _, pct in goals_with_gap]
+        )
+        amounts = [quantize(Decimal(c) / 100) for c in amounts_c]
+
+    for (g, gap, priority_pct), allocate_amt in zip(goals_with_gap, amounts):
+        if allocate_amt <= 0:
+            continue
+
+        goal_id = g.goal_id
+        _add_delta(plan.allocation_deltas, goal_id, allocate_amt)
+        _add_delta(plan.goal_deltas, goal_id, allocate_amt)
+        total_allocated = quantize(total_allocated + allocate_amt)
+
+        new_current = Decimal(str(g.current_amount or 0)) + allocate_amt
+        target = Decimal(str(g.target_amount or 0))
+
+        if new_current >= target and g.status != "completed":
+            newly_completed_goals.append({
+                "goal_id": str(goal_id),
+                "goal_title": g.title,
+                "final_amount": float(new_current)
+            })
+
+        allocations_summary.append({
+            "goal_id": str(goal_id),
+            "goal_title": g.title,
+            "allocated_amount": float(allocate_amt),
+            "priority_percentage": float(priority_pct),
+            "new_total": float(new_current)
+        })
+
+    remaining_balance = quantize(available_funds - total_allocated)
+    if remaining_balance > 0:
+        plan.savings_balance = quantize(plan.savings_balance + remaining_balance)
+        plan.ledger_entries.append(
+            LedgerEntry("Saving", remaining_balance, "Unallocated funds moved to savings.")
+        )
+
+    plan.response = {
+        "status": "success",
+        "message": "Allocations processed successfully.",
+        "net_change": float(plan.net_change),
+        "allocations": allocations_summary,
+        "total_allocated": float(total_allocated),
+        "remaining_savings_balance": float(plan.savings_balance),
+        "deficit_balance": float(plan.deficit_balance)
+    }
+
+    if newly_completed_goals:
+        plan.response["newly_completed_goals"] = newly_completed_goals
+        plan.response["message"] += f" {len(newly_completed_goals)} goal(s) completed!"
@@ -0,0 +1,236 @@
+import json
+import logging
+import os
+import socket
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from flask import current_app
+from app import db, redis_client
+from app.utils.redis_pool import create_redis_client
+from app.helpers.allocation_service import recalculate_user
+"""
+    Redis-backed queue for allocation recalculation jobs.
+
+    - enqueue_recalculation() coalesces jobs per user: while a job for the user is
+      still queued, further enqueues return that job instead of adding another, so a
+      burst of inserts leads to one recalculation.
+    - The worker clears the user's pending marker when it starts a job, before reading
+      totals, so anything recorded after that point enqueues a fresh job.
+    - A per-user lock (SET NX PX, released by token) keeps two workers, or a worker and
+      the synchronous endpoint, from allocating for the same profile at once.
+    - Job state is a Redis hash kept for JOB_TTL seconds for status polling.
+    - Workers take jobs with BLMOVE into their own processing list and remove them
+      once done, so a job is never only in a worker's memory. Each worker refreshes a
+      heartbeat key; lists of workers whose heartbeat expired (the process died) are
+      moved back onto the queue at startup and whenever a worker is idle.
+"""
+
+jobs_log = logging.getLogger("app.alloc.jobs")
+
+QUEUE_KEY = "alloc:queue"
+JOB_PREFIX = "alloc:job:"
+PENDING_PREFIX = "alloc:pending:"
+LOCK_PREFIX = "alloc:lock:"
+WORKERS_KEY = "alloc:workers"
+PROCESSING_PREFIX = "alloc:processing:"
+HEARTBEAT_PREFIX = "alloc:worker:"
+HEARTBEAT_TTL = 90  # seconds; longer than LOCK_TTL_MS, so a worker busy with a job is never reaped
+JOB_TTL = 24 * 3600
+LOCK_TTL_MS = 60 * 1000
+LOCK_RETRY_DELAY = 0.5
+LOCK_WAIT_INTERVAL = 0.1
+
+# Returns [job_id, 1] for a new job or [existing_job_id, 0] when coalesced
+_ENQUEUE = redis_client.register_script("""
+local existing = redis.call('get', KEYS[1])
+if existing then
+    redis.call('hincrby', ARGV[5] .. existing, 'coalesced', 1)
+    return {existing, 0}
+end
+redis.call('set', KEYS[1], ARGV[1], 'EX', ARGV[3])
+redis.call('hset', KEYS[2], 'job_id', ARGV[1], 'user_id', ARGV[2], 'status', 'queued',
+           'enqueued_at', ARGV[4], 'coalesced', 0)
+redis.call('expire', KEYS[2], ARGV[3])
+redis.call('lpush', KEYS[3], ARGV[1])
+return {ARGV[1], 1}
+""")
+
+# Delete KEYS[1] only if it still holds ARGV[1]
+_COMPARE_AND_DELETE = redis_client.register_script("""
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+""")
+
+
+def _now():
+    return datetime.now(timezone.utc).isoformat()
+
+
+def enqueue_recalculation(user_id):
+    """
+    Queue a recalculation for user_id, or join the one already queued.
+
+    Returns:
+        (job_id, created) where created is False when the request was coalesced.
+    """
+    user_id = str(user_id)
+    job_id = uuid.uuid4().hex
+    existing_id, created = _ENQUEUE(
+        keys=[PENDING_PREFIX + user_id, JOB_PREFIX + job_id, QUEUE_KEY],
+        args=[job_id, user_id, JOB_TTL, _now(), JOB_PREFIX]
+    )
+    return existing_id, bool(created)
+
+
+def get_job(job_id):
+    """Return the job's state for polling, or None if unknown or expired."""
+    job = redis_client.hgetall(JOB_PREFIX + job_id)
+    if not job:
+        return None
+    if job.get("result"):
+        job["result"] = json.loads(job["result"])
+    job["coalesced"] = int(job.get("coalesced", 0))
+    return job
+
+
+def acquire_user_lock(user_id):
+    """Take the per-user allocation lock. Returns a release token, or None if it is held."""
+    token = uuid.uuid4().hex
+    if redis_client.set(LOCK_PREFIX + str(user_id), token, nx=True, px=LOCK_TTL_MS):
+        return token
+    return None
+
+
+def release_user_lock(user_id, token):
+    _COMPARE_AND_DELETE(keys=[LOCK_PREFIX + str(user_id)], args=[token])
+
+
+@contextmanager
+def user_lock(user_id, wait=0):
+    """
+    Context manager around the per-user lock; yields the token, or None if the lock is
+    still busy after waiting up to `wait` seconds.
+    """
+    token = acquire_user_lock(user_id)
+    deadline = time.monotonic() + wait
+    while token is None and time.monotonic() < deadline:
+        time.sleep(LOCK_WAIT_INTERVAL)
+        token = acquire_user_lock(user_id)
+    try:
+        yield token
+    finally:
+        if token:
+            release_user_lock(user_id, token)
+
+
+def run_job(job_id):
+    """
+    Run one queued job. If another process holds the user's lock, the job goes back
+    on the queue. Returns the job's final status, or None if it was requeued or unknown.
+    """
+    job_key = JOB_PREFIX + job_id
+    user_id = redis_client.hget(job_key, "user_id")
+    if not user_id:
+        current_app.logger.warning(f"[alloc-jobs] Job {job_id} not found, skipping")
+        return None
+
+    token = acquire_user_lock(user_id)
+    if not token:
+        time.sleep(LOCK_RETRY_DELAY)
+        pipe = redis_client.pipeline()
+        pipe.hincrby(job_key, "lock_retries", 1)
+        pipe.lpush(QUEUE_KEY, job_id)
+        pipe.execute()
+        return None
+
+    try:
+        # From here on, new records for this user must enqueue a new job
+        _COMPARE_AND_DELETE(keys=[PENDING_PREFIX + user_id], args=[job_id])
+        redis_client.hset(job_key, mapping={"status": "running", "started_at": _now()})
+
+        body, status_code = recalculate_user(uuid.UUID(user_id))
+        status = "done" if status_code < 400 else "failed"
+        redis_client.hset(job_key, mapping={
+            "status": status,
+            "http_status": status_code,
+            "result": json.dumps(body, default=str),
+            "finished_at": _now()
+        })
+        jobs_log.info("[alloc-jobs] Job %s for user %s: %s (%s)", job_id, user_id, status, status_code)
+        return status
+    finally:
+        release_user_lock(user_id, token)
+        db.session.remove()
+
+
+def reap_dead_workers():
+    """
+    Move the in-flight jobs of workers whose heartbeat expired back to the front of
+    the queue. Returns the number of jobs requeued.
+    """
+    requeued = 0
+    for worker_id in redis_client.smembers(WORKERS_KEY):
+        if redis_client.exists(HEARTBEAT_PREFIX + worker_id):
+            continue
+        processing_key = PROCESSING_PREFIX + worker_id
+        # The queue is consumed from the right, so requeued jobs run next
+        while redis_client.lmove(processing_key, QUEUE_KEY, "RIGHT", "RIGHT") is not None:
+            requeued += 1
+        redis_client.srem(WORKERS_KEY, worker_id)
+        jobs_log.warning("[alloc-jobs] Worker %s is gone, requeued its jobs", worker_id)
+    return requeued
+
+
+def run_worker(poll_timeout=5, burst=False):
+    """
+    Process jobs until interrupted. With burst=True, return once the queue is empty.
+    Must be called inside an application context.
+
+    Returns:
+        number of jobs processed
+    """
+    processed = 0
+    # BLMOVE holds the socket for up to poll_timeout, longer than REDIS_SOCKET_TIMEOUT allows
+    queue_client = create_redis_client(
+        current_app.config,
+        socket_timeout=poll_timeout + current_app.config['REDIS_SOCKET_TIMEOUT'],
+        max_connections=1
+    )
+    worker_id = f"{socket.gethostname()}:{os.getpid()}"
+    processing_key = PROCESSING_PREFIX + worker_id
+    heartbeat_key = HEARTBEAT_PREFIX + worker_id
+    heartbeat_ttl = HEARTBEAT_TTL + poll_timeout
+
+    # Heartbeat first, so a concurrent reaper never sees this worker registered without one
+    redis_client.set(heartbeat_key, _now(), ex=heartbeat_ttl)
+    redis_client.sadd(WORKERS_KEY, worker_id)
+    requeued = reap_dead_workers()
+    current_app.logger.info(f"[alloc-jobs] Worker {worker_id} started, requeued {requeued} orphaned job(s)")
+    try:
+        while True:
+            redis_client.set(heartbeat_key, _now(), ex=heartbeat_ttl)
+            job_id = queue_client.blmove(QUEUE_KEY, processing_key, poll_timeout, "RIGHT", "LEFT")
+            if job_id is None:
+                reap_dead_workers()
+                if burst:
+                    break
+                continue
+            try:
+                if run_job(job_id):
+                    processed += 1
+            except Exception as e:
+                current_app.logger.error(f"[alloc-jobs] Job {job_id} crashed: {e}")
+                redis_client.hset(JOB_PREFIX + job_id, mapping={"status": "failed", "error": str(e), "finished_at": _now()})
+            finally:
+                redis_client.lrem(processing_key, 1, job_id)
+    finally:
+        # Clean exit: anything left in the processing list goes back to the queue
+        while redis_client.lmove(processing_key, QUEUE_KEY, "RIGHT", "RIGHT") is not None:
+            pass
+        redis_client.srem(WORKERS_KEY, worker_id)
+        redis_client.delete(heartbeat_key)
+    return processed
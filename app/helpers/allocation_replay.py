@@ -0,0 +1,314 @@
+import copy
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from decimal import Decimal
+from multiprocessing import get_context
+import traceback
+from flask import current_app
+from redis.exceptions import RedisError
+from app import app, db, redis_client
+from app.utils.redis_pool import with_ttl
+from app.models.client.goal import Goal, MonthlyGoalAllocation as GoalAllocation
+from app.models.client.financial import FinancialRecord, UserMonthlyTotal
+from app.models.client.users_model import UserFinancialProfile as FinancialProfile
+from app.helpers.financials import quantize, month_range
+from app.helpers.allocation_engine import ZERO, LEDGER_EFFECTS, plan_recalculation
+"""
+    Historical replay of allocations from the financial_records ledger.
+
+    For each user, every actual income/expense record from the start of a month
+    onwards is fed, oldest first, through the same allocation engine a live
+    recalculation uses, as if a recalculation had run right after each record.
+    The whole run happens in memory; the results then replace the user's
+    allocations, allocation ledger records, goal amounts, balances and snapshots
+    from that month on, with bulk statements in one transaction per user.
+
+    Starting state at the replay month:
+      - goal amounts: stored current_amount minus the allocations being replaced
+      - savings/deficit: current balances with the replaced ledger entries unwound
+        (see LEDGER_EFFECTS), or zero when the user has no earlier allocation records
+      - snapshots: the totals of the user's latest month before the replay month,
+        which is where the last live recalculation before it left them
+    Goals only take part from their created_at on. Priorities, statuses, locks and
+    protection use their current values, since their history isn't stored.
+
+    Users are replayed in parallel by a process pool. Each replayed user is recorded
+    in a Redis set, so an interrupted run skips them when restarted.
+"""
+
+DONE_PREFIX = "replay:done:"
+DONE_TTL = 7 * 24 * 3600
+
+
+@dataclass
+class ReplayResult:
+    """End state of an in-memory replay."""
+    balances: dict
+    goal_amounts: dict  # goal_id -> current_amount
+    allocations: dict = field(default_factory=dict)  # (goal_id, month) -> allocated_amount
+    ledger: list = field(default_factory=list)  # (recorded_at, LedgerEntry)
+    records: int = 0
+
+
+def _naive(moment):
+    return moment.replace(tzinfo=None) if moment and moment.tzinfo else moment
+
+
+def replay_records(balances, goals, records):
+    """
+    Run records through the allocation engine in memory, one recalculation per record.
+
+    Args:
+        balances: dict as given to plan_recalculation (savings_balance, deficit_balance,
+            total_income_snapshot, total_expense_snapshot, include_savings_in_alloc)
+        goals: list of (created_at, AllocationGoal), oldest first; the records are copied
+        records: iterable of (recorded_at, category_type, amount), oldest first
+
+    Returns:
+        ReplayResult
+    """
+    balances = dict(balances)
+    created = [created_at for created_at, _ in goals]
+    goals = [copy.copy(g) for _, g in goals]
+    result = ReplayResult(balances=balances, goal_amounts={})
+    month_totals = {}  # month -> {"total_income", "total_expense"}
+    month_allocations = {}  # month -> {goal_id: amount}
+    started = 0  # goals[:started] already exist at the current record
+
+    for recorded_at, category_type, amount in records:
+        result.records += 1
+        month = recorded_at.strftime("%Y-%m")
+        totals = month_totals.setdefault(month, {"total_income": ZERO, "total_expense": ZERO})
+        key = "total_income" if category_type == "Income" else "total_expense"
+        totals[key] += Decimal(str(amount or 0))
+
+        while started < len(goals) and _naive(created[started]) <= _naive(recorded_at):
+            started += 1
+        allocations = month_allocations.setdefault(month, {})
+
+        plan = plan_recalculation(balances, totals, goals[:started], allocations)
+        if not plan.has_changes:
+            continue
+
+        balances.update(
+            savings_balance=plan.savings_balance,
+            deficit_balance=plan.deficit_balance,
+            total_income_snapshot=plan.total_income,
+            total_expense_snapshot=plan.total_expense
+        )
+        for g in goals[:started]:
+            delta = plan.goal_deltas.get(g.goal_id)
+            if delta:
+                g.current_amount = quantize(Decimal(str(g.current_amount)) + delta)
+        for goal_id, delta in plan.allocation_deltas.items():
+            allocations[goal_id] = quantize(allocations.get(goal_id, ZERO) + delta)
+        result.ledger.extend((recorded_at, entry) for entry in plan.ledger_entries)
+
+    result.goal_amounts = {g.goal_id: Decimal(str(g.current_amount)) for g in goals}
+    result.allocations = {
+        (goal_id, month): amount
+        for month, allocations in month_allocations.items()
+        for goal_id, amount in allocations.items() if amount
+    }
+    return result
+
+
+def _starting_balances(user_id, profile, since, from_month):
+    """Balances and snapshots at the start of the replay (see module docstring), or None if unknown."""
+    previous = UserMonthlyTotal.get_latest_totals_before(user_id, from_month) or {}
+    balances = {
+        "savings_balance": ZERO,
+        "deficit_balance": ZERO,
+        "total_income_snapshot": quantize(previous.get("total_income", ZERO)),
+        "total_expense_snapshot": quantize(previous.get("total_expense", ZERO)),
+        "include_savings_in_alloc": bool(profile.include_savings_in_alloc),
+    }
+    if not FinancialRecord.has_allocation_records_before(user_id, since):
+        return balances
+    if profile.include_savings_in_alloc:
+        # Folding savings into the pool empties them without a ledger entry, so the
+        # balance at the replay month can't be worked back from the ledger
+        return None
+
+    savings = Decimal(profile.savings_balance or 0)
+    deficit = Decimal(profile.deficit_balance or 0)
+    for category, description, amount in FinancialRecord.get_allocation_records_since(user_id, since):
+        savings_sign, deficit_sign = LEDGER_EFFECTS.get(description, (0, 0))
+        savings -= savings_sign * amount
+        deficit -= deficit_sign * amount
+    balances.update(savings_balance=quantize(savings), deficit_balance=quantize(deficit))
+    return balances
+
+
+def replay_user(user_id, from_month, dry_run=False):
+    """
+    Rebuild one user's allocations from `from_month` (YYYY-MM) on, in one transaction.
+    The profile row is locked for the duration, like a live recalculation.
+
+    Returns:
+        dict with user_id, status ("replayed", "skipped" or "failed"), records and, for
+        replayed users, allocations, ledger_entries and the final balances
+    """
+    summary = {"user_id": str(user_id), "status": "skipped", "records": 0}
+    try:
+        year, month = map(int, from_month.split("-"))
+        since, _ = month_range(year, month)
+
+        profile = FinancialProfile.get_financial_profile_for_update(user_id)
+        if not profile:
+            db.session.rollback()
+            return dict(summary, reason="Financial profile not found")
+
+        states = Goal.get_replay_state(user_id, from_month)
+        if any(state["window_finalized"] for state in states):
+            db.session.rollback()
+            return dict(summary, reason=f"Allocations from {from_month} on are already finalized")
+
+        balances = _starting_balances(user_id, profile, since, from_month)
+        if balances is None:
+            db.session.rollback()
+            return dict(summary, reason="Savings are folded into allocations; replay from the first month instead")
+
+        for state in states:
+            state["goal"].current_amount = quantize(Decimal(state["stored_amount"]) - Decimal(state["window_allocated"]))
+
+        goals = [(state["created_at"], state["goal"]) for state in states]
+        result = replay_records(balances, goals, FinancialRecord.stream_replay_records(user_id, since))
+
+        GoalAllocation.replace_from_month(user_id, from_month, result.allocations)
+        FinancialRecord.delete_allocation_records_since(user_id, since)
+        FinancialRecord.add_timed_allocation_records(user_id, result.ledger)
+        Goal.apply_amount_deltas({
+            state["goal"].goal_id: quantize(result.goal_amounts[state["goal"].goal_id] - Decimal(state["stored_amount"]))
+            for state in states
+        })
+
+        profile.savings_balance = result.balances["savings_balance"]
+        profile.deficit_balance = result.balances["deficit_balance"]
+        profile.total_income_snapshot = result.balances["total_income_snapshot"]
+        profile.total_expense_snapshot = result.balances["total_expense_snapshot"]
+        profile.last_calculated_at = datetime.now(timezone.utc)
+        db.session.add(profile)
+
+        if dry_run:
+            db.session.rollback()
+        else:
+            db.session.commit()
+
+        return dict(
+            summary,
+            status="replayed",
+            records=result.records,
+            allocations=len(result.allocations),
+            ledger_entries=len(result.ledger),
+            savings_balance=float(result.balances["savings_balance"]),
+            deficit_balance=float(result.balances["deficit_balance"])
+        )
+
+    except Exception as exc:
+        db.session.rollback()
+        current_app.logger.error(f"[replay] user={user_id} failed: {exc}")
+        current_app.logger.error(traceback.format_exc())
+        return dict(summary, status="failed", reason=str(exc))
+
+
+def _init_worker():
+    """Pool initializer: give the forked process its own app context and DB connections."""
+    app.app_context().push()
+    db.engine.dispose(close=False)
+
+
+def _replay_task(args):
+    user_id, from_month, dry_run = args
+    return replay_user(user_id, from_month, dry_run=dry_run)
+
+
+def _read_done(key):
+    try:
+        return redis_client.smembers(key) or set()
+    except RedisError as e:
+        current_app.logger.warning(f"[replay] Could not read progress {key}: {e}")
+        return set()
+
+
+def _mark_done(key, user_id):
+    try:
+        with_ttl(redis_client, key, DONE_TTL, "sadd", user_id)
+    except RedisError as e:
+        current_app.logger.warning(f"[replay] Could not record progress {key}: {e}")
+
+
+def _update_rates(summary, processed, started):
+    elapsed = time.perf_counter() - started
+    summary["elapsed_seconds"] = round(elapsed, 3)
+    summary["users_per_second"] = round(processed / elapsed, 2) if elapsed else 0.0
+    summary["records_per_second"] = round(summary["records"] / elapsed, 2) if elapsed else 0.0
+
+
+def replay(user_ids, from_month, workers=4, restart=False, dry_run=False, progress=None):
+    """
+    Replay allocations for many users from `from_month` on.
+
+    Args:
+        user_ids: users to replay
+        workers: size of the process pool; 1 runs everything in this process
+        restart: forget which users an earlier run with the same from_month finished
+        dry_run: compute and roll back every user, recording no progress
+        progress: optional callable receiving the running summary after each user
+
+    Returns:
+        summary dict: from_month, users, skipped_done, replayed, skipped, failed,
+        records, elapsed_seconds, users_per_second, records_per_second, problems
+    """
+    key = DONE_PREFIX + from_month
+    if restart and not dry_run:
+        try:
+            redis_client.delete(key)
+        except RedisError as e:
+            current_app.logger.warning(f"[replay] Could not clear progress {key}: {e}")
+    done = set() if dry_run else _read_done(key)
+    pending = [str(user_id) for user_id in user_ids if str(user_id) not in done]
+
+    summary = {
+        "from_month": from_month,
+        "users": len(pending),
+        "skipped_done": len(user_ids) - len(pending),
+        "replayed": 0,
+        "skipped": 0,
+        "failed": 0,
+        "records": 0,
+        "problems": [],
+    }
+    _update_rates(summary, 0, time.perf_counter())
+    db.session.rollback()  # end the read transaction before forking
+    tasks = [(user_id, from_month, dry_run) for user_id in pending]
+    started = time.perf_counter()
+
+    def collect(result):
+        summary[result["status"]] += 1
+        summary["records"] += result["records"]
+        if result["status"] != "replayed":
+            summary["problems"].append(result)
+        elif not dry_run:
+            _mark_done(key, result["user_id"])
+        _update_rates(summary, summary["replayed"] + summary["skipped"] + summary["failed"], started)
+        if progress:
+            progress(summary)
+
+    if workers <= 1:
+        for task in tasks:
+            collect(_replay_task(task))
+    else:
+        db.engine.dispose()  # children must not share the parent's connections
+        with ProcessPoolExecutor(max_workers=workers, mp_context=get_context("fork"), initializer=_init_worker) as pool:
+            for result in pool.map(_replay_task, tasks, chunksize=max(1, min(50, len(tasks) // (workers * 4) or 1))):
+                collect(result)
+
+    _update_rates(summary, len(tasks), started)
+    current_app.logger.info(
+        f"[replay] from={from_month} replayed={summary['replayed']} skipped={summary['skipped']} "
+        f"failed={summary['failed']} records={summary['records']} {summary['elapsed_seconds']}s"
+    )
+    return summary
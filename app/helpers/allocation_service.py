@@ -0,0 +1,194 @@
+from datetime import datetime, timezone
+from decimal import Decimal
+import logging
+import traceback
+from flask import current_app
+from app import db
+from app.models.client.goal import Goal, MonthlyGoalAllocation as GoalAllocation
+from app.models.client.financial import FinancialRecord, UserMonthlyTotal
+from app.models.client.users_model import UserFinancialProfile as FinancialProfile
+from app.helpers.financials import ensure_profile_balances
+from app.helpers.allocation_engine import compute_net_change, plan_recalculation
+"""
+    Recalculation of a user's allocations against the database.
+    Shared by the synchronous /allocations/recalculate endpoint and the
+    allocation job worker (see app.helpers.allocation_jobs).
+"""
+
+# Hot path: per-recalculation lines go to app.alloc so LOG_LEVELS / LOG_SAMPLING can tune them
+alloc_log = logging.getLogger("app.alloc")
+
+
+def recalculate_user(user_id):
+    """
+    Recalculate allocations for the given user's financial profile.
+
+    Uses ethical allocation strategy:
+      - Non-finalized goal allocations are FLEXIBLE (available for current month expenses)
+      - User can mark goals as PROTECTED to prevent pullback
+      - Finalized months are IMMUTABLE (historical integrity)
+      - Savings → Flexible Goals → Deficit (in that order)
+
+    The profile row is locked (SELECT ... FOR UPDATE) for the whole transaction, so
+    concurrent recalculations for the same user run one after the other and the
+    later one sees the snapshots the earlier one committed.
+
+    This process:
+      1. Retrieves latest monthly totals (including the just-recorded transaction).
+      2. Calculates the NET CHANGE since last recalculation.
+      3. Builds an allocation plan in memory (see app.helpers.allocation_engine):
+         deficit repayment, goal allocation by priority and gap, savings remainder.
+      4. Applies the plan in a single transaction: one bulk insert of ledger records,
+         one allocation upsert, one goal update and the profile snapshot update.
+
+    Returns:
+        (response dict, http status code)
+    """
+    try:
+        # 1. Retrieve and lock the financial profile
+        profile = FinancialProfile.get_financial_profile_for_update(user_id)
+        if not profile:
+            db.session.rollback()
+            return {"status": "error", "message": "Financial profile not found"}, 404
+
+        ensure_profile_balances(profile)
+
+        # 2. Determine current period
+        now = datetime.now(timezone.utc)
+        year, month = now.year, now.month
+        current_month = now.strftime("%Y-%m")
+
+        # 3. Check if current month is already finalized (shouldn't happen, but safety check)
+        month_finalization = GoalAllocation.check_if_monthly_allocation_finalized(user_id=user_id, month=current_month)
+
+        if month_finalization:
+            db.session.rollback()
+            return {
+                "status": "error",
+                "message": f"Month {current_month} is already finalized. Cannot modify allocations."
+            }, 400
+
+        # 4. Fetch income and expense totals for the period
+        totals = UserMonthlyTotal.get_monthly_totals(user_id=user_id, year=year, month=month)
+        alloc_log.debug("[alloc] user=%s monthly totals %s", user_id, totals)
+
+        balances = {
+            "savings_balance": profile.savings_balance,
+            "deficit_balance": profile.deficit_balance,
+            "total_income_snapshot": profile.total_income_snapshot,
+            "total_expense_snapshot": profile.total_expense_snapshot,
+            "include_savings_in_alloc": getattr(profile, "include_savings_in_alloc", False),
+        }
+
+        # 5. Load goals (and this month's allocations for pullback) only when there is a change
+        net_change = compute_net_change(balances, totals)
+        goals = []
+        month_allocations = {}
+        if net_change != 0:
+            goals = Goal.get_allocation_goals(user_id)
+            if net_change < 0:
+                month_allocations = GoalAllocation.get_month_totals_by_goal(user_id, current_month)
+
+        # 6. Plan the allocation in memory
+        plan = plan_recalculation(balances, totals, goals, month_allocations)
+        alloc_log.debug(
+            "[alloc] user=%s income=%s expense=%s net_change=%s status=%s",
+            user_id, plan.total_income, plan.total_expense, plan.net_change, plan.response.get("status")
+        )
+
+        if not plan.has_changes:
+            db.session.rollback()  # release the profile lock
+            return plan.response, 200
+
+        # 7. Apply the plan in one transaction
+        FinancialRecord.add_allocation_records(user_id, plan.ledger_entries, recorded_at=now)
+        GoalAllocation.upsert_allocation_deltas(user_id, current_month, plan.allocation_deltas)
+        Goal.apply_amount_deltas(plan.goal_deltas)
+
+        profile.savings_balance = plan.savings_balance
+        profile.deficit_balance = plan.deficit_balance
+        profile.total_income_snapshot = plan.total_income
+        profile.total_expense_snapshot = plan.total_expense
+        profile.last_calculated_at = now
+        db.session.add(profile)
+        db.session.commit()
+
+        alloc_log.info(
+            "[alloc] user=%s recalculation complete - net_change=%s, savings=%s, deficit=%s",
+            user_id, plan.net_change, plan.savings_balance, plan.deficit_balance
+        )
+
+        return plan.response, 200
+
+    except Exception as exc:
+        db.session.rollback()
+        current_app.logger.error(f"Error recalculating allocations: {exc}")
+        current_app.logger.error(traceback.format_exc())
+        return {"status": "error", "message": "Internal server error"}, 500
+
+
+def simulate_user(user_id, scenarios):
+    """
+    Dry-run the recalculation for hypothetical transactions. Nothing is written.
+
+    Reads one profile row, the current month's rollup rows and one goal snapshot
+    query (three statements in total), then evaluates every scenario in memory
+    against the same snapshot. Each scenario is independent: it adds its amount to
+    the month's income or expense totals, so pending unprocessed transactions are
+    included as a real recalculation would include them.
+
+    Args:
+        scenarios: list of {"type": "income" | "expense", "amount": Decimal}
+
+    Returns:
+        (response dict, http status code)
+    """
+    profile = FinancialProfile.get_financial_profile_by_user_id(user_id)
+    if not profile:
+        return {"status": "error", "message": "Financial profile not found"}, 404
+
+    now = datetime.now(timezone.utc)
+    current_month = now.strftime("%Y-%m")
+    totals = UserMonthlyTotal.get_monthly_totals(user_id=user_id, year=now.year, month=now.month)
+    goals, month_allocations = Goal.get_allocation_snapshot(user_id, current_month)
+
+    balances = {
+        "savings_balance": profile.savings_balance or Decimal('0.00'),
+        "deficit_balance": profile.deficit_balance or Decimal('0.00'),
+        "total_income_snapshot": profile.total_income_snapshot,
+        "total_expense_snapshot": profile.total_expense_snapshot,
+        "include_savings_in_alloc": getattr(profile, "include_savings_in_alloc", False),
+    }
+
+    results = []
+    for scenario in scenarios:
+        hypothetical = dict(totals)
+        key = "total_income" if scenario["type"] == "income" else "total_expense"
+        hypothetical[key] = Decimal(str(hypothetical.get(key, 0))) + scenario["amount"]
+
+        plan = plan_recalculation(balances, hypothetical, goals, month_allocations)
+        results.append({
+            "scenario": {"type": scenario["type"], "amount": float(scenario["amount"])},
+            "net_change": float(plan.net_change),
+            "savings_balance": float(plan.savings_balance),
+            "deficit_balance": float(plan.deficit_balance),
+            "goal_changes": {goal_id: float(delta) for goal_id, delta in plan.goal_deltas.items()},
+            "ledger_entries": [
+                {"category": entry.category, "amount": float(entry.amount), "description": entry.description}
+                for entry in plan.ledger_entries
+            ],
+            "plan": plan.response
+        })
+
+    return {
+        "status": "success",
+        "snapshot": {
+            "month": current_month,
+            "savings_balance": float(balances["savings_balance"]),
+            "deficit_balance": float(balances["deficit_balance"]),
+            "total_income": float(totals.get("total_income", 0)),
+            "total_expense": float(totals.get("total_expense", 0)),
+            "pending_net_change": float(compute_net_change(balances, totals))
+        },
+        "results": results
+    }, 200
@@ -0,0 +1,174 @@
+from decimal import Decimal
+from app.helpers.financials import quantize
+try:
+    import numpy as np
+except ImportError:  # optional: callers fall back to the Decimal path
+    np = None
+"""
+    Batched surplus allocation on integer-cent arrays (NumPy).
+
+    Same rules as allocation_engine._plan_surplus / water_fill, bit-for-bit at cent level:
+      - open goals are those not completed, not locked, with a positive gap
+        (quantize(target - current)) and a positive priority percentage
+      - the pool is min(available, sum of open gaps); it is water-filled over the
+        open goals by percentage, so a goal never exceeds its gap and what a full
+        goal can't take goes to the others
+      - truncated cents go to the open goals with the largest remainders
+      - only what no goal can take goes to savings
+    Every quantity is an exact integer (cents, or hundredths for percentages), so no
+    rounding can drift; the fill order is sorted on an exact key.
+
+    Many users are allocated in one pass: goals for all users are laid out in flat
+    arrays, grouped by user, with `offsets` marking where each user's goals start.
+"""
+
+INT = "int64"
+INT_MAX = 2 ** 63 - 1
+
+
+def available():
+    """True when NumPy is installed."""
+    return np is not None
+
+
+def to_cents(amount):
+    """Decimal-path value (quantized, truncated) of amount, in integer cents."""
+    return int(quantize(Decimal(str(amount))) * 100)
+
+
+def _segment_sums(values, offsets):
+    """Exact per-user sums of an int64 array laid out by offsets (len(offsets) == users + 1)."""
+    totals = np.concatenate(([0], np.cumsum(values, dtype=INT)))
+    return totals[offsets[1:]] - totals[offsets[:-1]]
+
+
+def _segment_cumsum_before(values, offsets, owner):
+    """Per-user running sum of values, excluding the current element."""
+    totals = np.cumsum(values, dtype=INT)
+    starts = np.concatenate(([0], totals))[offsets[:-1]]
+    return totals - values - starts[owner]
+
+
+def allocate_surplus_batch(available_c, offsets, gap_c, pct_h, eligible):
+    """
+    Water-fill each user's available funds over their goals.
+
+    Args:
+        available_c: int64[users], funds to allocate per user, in cents
+        offsets: int64[users + 1], goal index where each user's goals start; last entry is the goal count
+        gap_c: int64[goals], quantize(target - current) in cents
+        pct_h: int64[goals], priority percentage in hundredths
+        eligible: bool[goals], not completed and not locked
+
+    Returns:
+        (alloc_c int64[goals], savings_c int64[users], funded bool[users]) where funded is
+        False for users whose whole amount went to savings because no goal could take it.
+
+    Raises:
+        OverflowError: if cents x percentages could exceed int64 (use the Decimal path)
+    """
+    available_c = np.asarray(available_c, dtype=INT)
+    offsets = np.asarray(offsets, dtype=INT)
+    gap_c = np.asarray(gap_c, dtype=INT)
+    pct_h = np.asarray(pct_h, dtype=INT)
+    eligible = np.asarray(eligible, dtype=bool)
+    goal_count = len(gap_c)
+
+    owner = np.repeat(np.arange(len(available_c)), np.diff(offsets))
+    is_open = eligible & (gap_c > 0) & (pct_h > 0)
+    cap = np.where(is_open, gap_c, 0)
+    weight = np.where(is_open, pct_h, 0)
+    if is_open.any():
+        # Scaling every weight by the same factor leaves the split unchanged
+        weight //= np.gcd.reduce(weight[is_open])
+
+    total_gap = _segment_sums(cap, offsets)
+    total_weight = _segment_sums(weight, offsets)
+    funded = total_gap > 0
+    pool = np.minimum(available_c, total_gap)
+
+    if goal_count and (
+        max(int(total_gap.max()), int(pool.max())) * max(int(total_weight.max()), 1) > INT_MAX
+        or int(weight.max()) >= 2 ** 26
+    ):
+        raise OverflowError("amounts too large for int64 water-filling")
+
+    # Fill order per user: open goals by cap / weight ascending, compared exactly as
+    # (integer quotient, remainder / weight) -- the fractional parts of two distinct
+    # ratios with weights below 2**26 differ by far more than a float64 ulp.
+    safe_weight = np.where(is_open, weight, 1)
+    quotient, remainder = np.divmod(cap, safe_weight)
+    order = np.lexsort((np.arange(goal_count), remainder / safe_weight, quotient, ~is_open, owner))
+    cap_s, weight_s, open_s, owner_s = cap[order], weight[order], is_open[order], owner[order]
+
+    # A goal fills if its share at the current level covers its cap, assuming every goal
+    # before it filled; the first goal that can't fill ends the run for its user.
+    remaining = pool[owner_s] - _segment_cumsum_before(cap_s, offsets, owner_s)
+    weight_left = total_weight[owner_s] - _segment_cumsum_before(weight_s, offsets, owner_s)
+    fills = open_s & (cap_s * weight_left <= remaining * weight_s)
+    misses = (~fills).astype(INT)
+    filled = fills & (_segment_cumsum_before(misses, offsets, owner_s) + misses == 0)
+
+    # The rest split what the filled goals left, in proportion to their weights
+    filled_cap = _segment_sums(np.where(filled, cap_s, 0), offsets)
+    rest_pool = pool - filled_cap
+    rest_weight = total_weight - _segment_sums(np.where(filled, weight_s, 0), offsets)
+    splits = open_s & ~filled
+    share, leftover = np.divmod(rest_pool[owner_s] * weight_s, np.maximum(rest_weight, 1)[owner_s])
+    alloc_s = np.where(filled, cap_s, np.where(splits, share, 0))
+
+    # Largest remainders (ties by goal position) take the truncated cents
+    residue = np.where(rest_weight > 0, rest_pool - _segment_sums(np.where(splits, share, 0), offsets), 0)
+    by_remainder = np.lexsort((order, np.where(splits, -leftover, 1), owner_s))
+    rank = np.empty(goal_count, dtype=INT)
+    rank[by_remainder] = np.arange(goal_count) - offsets[:-1][owner_s[by_remainder]]
+    alloc_s += splits & (rank < residue[owner_s])
+
+    alloc_c = np.empty(goal_count, dtype=INT)
+    alloc_c[order] = alloc_s
+    savings_c = available_c - _segment_sums(alloc_c, offsets)
+    return alloc_c, savings_c, funded
+
+
+def build_batch(portfolios):
+    """
+    Lay out engine-shaped inputs as arrays for allocate_surplus_batch.
+
+    Args:
+        portfolios: list of (available_funds, goals) per user, goals as given to plan_recalculation
+            (AllocationGoal records)
+
+    Returns:
+        (available_c, offsets, gap_c, pct_h, eligible)
+    """
+    available_c, offsets, gap_c, pct_h, eligible = [], [0], [], [], []
+    for available_funds, goals in portfolios:
+        available_c.append(to_cents(available_funds))
+        for g in goals:
+            gap_c.append(to_cents(Decimal(str(g.target_amount or 0)) - Decimal(str(g.current_amount or 0))))
+            pct_h.append(int(Decimal(str(g.priority_percentage or 0)) * 100))
+            eligible.append(g.status != "completed" and not g.is_locked)
+        offsets.append(len(gap_c))
+    return (
+        np.array(available_c, dtype=INT),
+        np.array(offsets, dtype=INT),
+        np.array(gap_c, dtype=INT),
+        np.array(pct_h, dtype=INT),
+        np.array(eligible, dtype=bool),
+    )
+
+
+def surplus_amounts(pool, goals_with_gap):
+    """
+    Allocation per goal for one user, as Decimals, for the engine's priority split.
+
+    Args:
+        pool: allocatable pool (already min(available, total gap))
+        goals_with_gap: list of (AllocationGoal, gap, priority percentage) as built by the engine
+    """
+    gap_c = [to_cents(gap) for _, gap, _ in goals_with_gap]
+    pct_h = [int(pct * 100) for _, _, pct in goals_with_gap]
+    alloc_c, _, _ = allocate_surplus_batch(
+        [to_cents(pool)], [0, len(gap_c)], gap_c, pct_h, np.ones(len(gap_c), dtype=bool)
+    )
+    return [quantize(Decimal(int(c)) / 100) for c in alloc_c]
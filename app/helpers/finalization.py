@@ -0,0 +1,100 @@
+import time
+from datetime import datetime, timezone
+from flask import current_app
+from redis.exceptions import RedisError
+from app import db, redis_client
+from app.utils.redis_pool import with_ttl
+from app.models.client.goal import MonthlyGoalAllocation
+"""
+    Set-based month-end finalization.
+    Users with open allocations are processed in chunks ordered by user_id; each chunk
+    is one statement (see MonthlyGoalAllocation.finalize_for_users) and its own short
+    transaction. After each chunk the last user_id is checkpointed in Redis, so an
+    interrupted run resumes where it stopped. Finalization only touches allocations
+    that are still open, so re-running a chunk is harmless if the checkpoint is lost.
+"""
+
+CHECKPOINT_PREFIX = "finalize:checkpoint:"
+CHECKPOINT_TTL = 7 * 24 * 3600
+
+
+def _read_checkpoint(key):
+    try:
+        return redis_client.hgetall(key) or {}
+    except RedisError as e:
+        current_app.logger.warning(f"[finalize] Could not read checkpoint {key}: {e}")
+        return {}
+
+
+def _write_checkpoint(key, state):
+    try:
+        with_ttl(redis_client, key, CHECKPOINT_TTL, "hset", mapping=state)
+    except RedisError as e:
+        current_app.logger.warning(f"[finalize] Could not write checkpoint {key}: {e}")
+
+
+def finalize_month(month, chunk_size=500, restart=False, progress=None):
+    """
+    Finalize all open allocations for `month` (YYYY-MM).
+
+    Args:
+        chunk_size: users per chunk / transaction.
+        restart: ignore any checkpoint and start from the first user.
+        progress: optional callable receiving the running summary dict after each chunk.
+
+    Returns:
+        summary dict: month, total_users, users, allocations, goals, chunks,
+        elapsed_seconds, resumed_from
+    """
+    key = CHECKPOINT_PREFIX + month
+    checkpoint = {} if restart else _read_checkpoint(key)
+    if checkpoint.get("status") == "completed":
+        checkpoint = {}
+
+    after = checkpoint.get("last_user_id") or None
+    users_done = int(checkpoint.get("users", 0))
+    summary = {
+        "month": month,
+        "total_users": users_done + MonthlyGoalAllocation.count_unfinalized_users(month),
+        "users": users_done,
+        "allocations": int(checkpoint.get("allocations", 0)),
+        "goals": int(checkpoint.get("goals", 0)),
+        "chunks": 0,
+        "resumed_from": after,
+    }
+    db.session.rollback()  # end the read transaction before the first chunk
+    started = time.perf_counter()
+
+    while True:
+        user_ids = MonthlyGoalAllocation.get_unfinalized_user_ids(month, chunk_size, after=after)
+        if not user_ids:
+            break
+
+        allocations, goals = MonthlyGoalAllocation.finalize_for_users(month, user_ids)
+        db.session.commit()
+
+        after = str(user_ids[-1])
+        summary["users"] += len(user_ids)
+        summary["allocations"] += allocations
+        summary["goals"] += goals
+        summary["chunks"] += 1
+        summary["elapsed_seconds"] = round(time.perf_counter() - started, 3)
+
+        _write_checkpoint(key, {
+            "status": "running",
+            "last_user_id": after,
+            "users": summary["users"],
+            "allocations": summary["allocations"],
+            "goals": summary["goals"],
+            "updated_at": datetime.now(timezone.utc).isoformat()
+        })
+        current_app.logger.info(
+            f"[finalize] {month} chunk {summary['chunks']}: users={summary['users']}/"
+            f"{summary['total_users']} allocations={summary['allocations']} goals={summary['goals']}"
+        )
+        if progress:
+            progress(summary)
+
+    summary["elapsed_seconds"] = round(time.perf_counter() - started, 3)
+    _write_checkpoint(key, {"status": "completed", "updated_at": datetime.now(timezone.utc).isoformat()})
+    return summary
@@ -1,4 +1,5 @@
 from decimal import Decimal, ROUND_DOWN
+from datetime import datetime
 """
     Helper functions for financial calculations.
     These functions can be used to ensure consistent handling of financial data.
@@ -14,4 +15,11 @@ def ensure_profile_balances(profile):
     if profile.deficit_balance is None:
         profile.deficit_balance = Decimal('0.00')
     if profile.savings_balance is None:
-        profile.savings_balance = Decimal('0.00')
\ No newline at end of file
+        profile.savings_balance = Decimal('0.00')
+
+
+def month_range(year, month):
+    """Return the half-open [start, end) datetimes for a month, for index-friendly range filters."""
+    start = datetime(year, month, 1)
+    end = datetime(year + 1, 1, 1) if month == 12 else datetime(year, month + 1, 1)
+    return start, end
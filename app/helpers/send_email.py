@@ -1,44 +1,166 @@
-#from sendgrid import SendGridAPIClient
-#from sendgrid.helpers.mail import Mail, To, Email
-import os
-import re
-#from flask import logging, request
-import requests
 import logging
-from dotenv import load_dotenv
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+import requests
+from requests.adapters import HTTPAdapter
 from flask import current_app
-load_dotenv()
-
-def send_email(to_email, subject, html_content):
-    """Send an email using netpipo's email service."""
-    service_url = os.getenv("NETPIPO_EMAIL_URL")
-    current_app.logger.info(f"Service URL: {service_url}")
-    
-    if not service_url:
-        current_app.logger.error("NETPIPO_EMAIL_URL is not set in environment variables.")
-        return False, "Missing email service URL"
-    
+from app import db
+from app.models.client.email_outbox import EmailOutbox
+"""
+    Email delivery through an outbox.
+
+    - send_email() only inserts the message into email_outbox; request handlers never
+      wait on the email service.
+    - The email worker (`flask email worker`) claims due messages in batches and posts
+      them to EMAIL_SERVICE_URL (netpipo's email service) from EMAIL_DELIVERY_CONCURRENCY
+      threads sharing one requests.Session, so connections are pooled and kept alive.
+      Every call is bounded by EMAIL_CONNECT_TIMEOUT / EMAIL_READ_TIMEOUT.
+    - Timeouts, connection errors, 429 and 5xx are retried with jittered exponential
+      backoff (EMAIL_RETRY_BASE doubling up to EMAIL_RETRY_CAP seconds); other 4xx and
+      messages out of EMAIL_MAX_ATTEMPTS are dead-lettered (status 'dead') and can be
+      requeued with `flask email requeue-dead`.
+    - Messages may carry an expiry (send_email(expires_in=...)); once past it they are
+      dead-lettered when the next batch is claimed instead of being sent.
+"""
+
+email_log = logging.getLogger("app.email")
+
+RETRYABLE_STATUS_CODES = {408, 425, 429, 500, 502, 503, 504}
+
+
+def send_email(to_email, subject, html_content, expires_in=None):
+    """
+    Queue an email for the email worker. With expires_in (seconds), the email is dropped
+    if it could not be delivered by then. Returns (success, message).
+    """
+    try:
+        message_id = EmailOutbox.enqueue(to_email, subject, html_content, expires_in=expires_in)
+    except Exception as e:
+        db.session.rollback()
+        message = f"Could not queue email to {to_email}: {e}"
+        current_app.logger.error(message)
+        return False, message
+    email_log.info("Queued email %s to %s", message_id, to_email)
+    return True, "Email queued"
+
+
+def create_email_session(pool_size):
+    """requests.Session keeping up to pool_size connections to the email service alive."""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+def deliver(session, service_url, message, timeout):
+    """
+    Post one message to the email service.
+
+    Returns:
+        (outcome, error) where outcome is "sent", "retry" or "dead"
+    """
     try:
-        response = requests.post(
+        response = session.post(
             service_url,
             json={
-                'subject': subject,
-                'recipients': to_email,
-                'body': html_content
-            }
+                'subject': message['subject'],
+                'recipients': message['recipient'],
+                'body': message['body']
+            },
+            timeout=timeout
         )
-        current_app.logger.info(f"response: {response}")
-        current_app.logger.info(f"response status code: {response.status_code}")
-        
-        if response.status_code == 200:
-            current_app.logger.info(f"Email sent via API successfully to {to_email}.")
-            return True, "Email sent successfully"
-        else:
-            message = f"Failed to send email. Status code: {response.status_code}, Response: {response.text}"
-            current_app.logger.error(message)
-            return False, message
     except requests.RequestException as e:
-        message = f"An error occurred while sending email: {e}"
-        current_app.logger.error(message)
-        return False, message
+        return "retry", f"{type(e).__name__}: {e}"
+    if response.status_code == 200:
+        return "sent", None
+    error = f"Status code: {response.status_code}, Response: {response.text[:500]}"
+    return ("retry" if response.status_code in RETRYABLE_STATUS_CODES else "dead"), error
+
+
+def retry_delay(attempts, base, cap):
+    """Seconds before retrying a message after its attempts-th failure: exponential, capped, jittered."""
+    return random.uniform(0.5, 1.0) * min(cap, base * 2 ** (attempts - 1))
+
+
+def process_batch(session, executor, config):
+    """
+    Claim one batch, deliver it and record the outcome of every message in one commit.
+
+    Returns:
+        {"claimed", "sent", "retried", "dead", "expired"} counts
+    """
+    expired = EmailOutbox.expire_due()
+    if expired:
+        email_log.warning("Dead-lettered %s expired email(s)", expired)
+    messages = EmailOutbox.claim_batch(config['EMAIL_BATCH_SIZE'], config['EMAIL_LEASE_SECONDS'])
+    counts = {"claimed": len(messages), "sent": 0, "retried": 0, "dead": 0, "expired": expired}
+    if not messages:
+        return counts
 
+    timeout = (config['EMAIL_CONNECT_TIMEOUT'], config['EMAIL_READ_TIMEOUT'])
+    results = executor.map(lambda message: deliver(session, config['EMAIL_SERVICE_URL'], message, timeout), messages)
+
+    sent = []
+    for message, (outcome, error) in zip(messages, results):
+        if outcome == "sent":
+            sent.append(message['id'])
+        elif outcome == "retry" and message['attempts'] < config['EMAIL_MAX_ATTEMPTS']:
+            delay = retry_delay(message['attempts'], config['EMAIL_RETRY_BASE'], config['EMAIL_RETRY_CAP'])
+            EmailOutbox.mark_failed(message['id'], error, retry_in=delay)
+            counts["retried"] += 1
+            email_log.warning(
+                "Email %s to %s failed (attempt %s), retrying in %.0fs: %s",
+                message['id'], message['recipient'], message['attempts'], delay, error
+            )
+        else:
+            EmailOutbox.mark_failed(message['id'], error)
+            counts["dead"] += 1
+            email_log.error(
+                "Email %s to %s dead-lettered after %s attempt(s): %s",
+                message['id'], message['recipient'], message['attempts'], error
+            )
+    EmailOutbox.mark_sent(sent)
+    db.session.commit()
+    counts["sent"] = len(sent)
+    return counts
+
+
+def run_email_worker(poll_interval=None, burst=False):
+    """
+    Deliver queued emails until interrupted. With burst=True, return once nothing is due.
+    Must be called inside an application context.
+
+    Returns:
+        totals of process_batch() counts
+    """
+    config = current_app.config
+    if not config['EMAIL_SERVICE_URL']:
+        raise RuntimeError("EMAIL_SERVICE_URL (NETPIPO_EMAIL_URL) is not set")
+    poll_interval = config['EMAIL_POLL_INTERVAL'] if poll_interval is None else poll_interval
+    concurrency = config['EMAIL_DELIVERY_CONCURRENCY']
+
+    totals = {"claimed": 0, "sent": 0, "retried": 0, "dead": 0, "expired": 0}
+    session = create_email_session(concurrency)
+    email_log.info("Email worker started (batch %s, %s connections)", config['EMAIL_BATCH_SIZE'], concurrency)
+    try:
+        with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="email") as executor:
+            while True:
+                try:
+                    counts = process_batch(session, executor, config)
+                except Exception as e:
+                    db.session.rollback()
+                    current_app.logger.error(f"Email worker: batch failed: {e}")
+                    counts = {"claimed": 0}
+                for key, value in counts.items():
+                    totals[key] += value
+                if counts["claimed"] < config['EMAIL_BATCH_SIZE']:
+                    # Queue drained; a full batch means more may be due right away
+                    if burst:
+                        break
+                    time.sleep(poll_interval)
+    finally:
+        session.close()
+        db.session.remove()
+    return totals
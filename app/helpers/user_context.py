@@ -0,0 +1,38 @@
+from flask import g
+from flask_jwt_extended import get_jwt_identity
+from app.models.client.users_model import User
+"""
+    Request-scoped user context.
+
+    get_user_context() resolves a user's id, currency and financial profile id once
+    per request and keeps the result on flask.g; across requests it is served from
+    the user context cache (User.get_cached_user_context), so hot endpoints don't
+    query the user and its currency each time.
+
+    Called without a user_id it uses the JWT identity, which requires the view to
+    be behind jwt_required(); the identity's context is also available as
+    g.user_context.
+
+    The context is a dict of strings:
+        {"user_id", "currency_code", "currency_id", "financial_profile_id"}
+    Treat it as read-only, it is shared by every caller in the request.
+"""
+
+
+def get_user_context(user_id=None):
+    """Context of user_id (or of the JWT identity), or None if the user doesn't exist."""
+    from_identity = user_id is None
+    if from_identity:
+        if "user_context" in g:
+            return g.user_context
+        user_id = get_jwt_identity()
+        if user_id is None:
+            return None
+
+    contexts = g.setdefault("user_contexts", {})
+    key = str(user_id)
+    if key not in contexts:
+        contexts[key] = User.get_cached_user_context(key)
+    if from_identity:
+        g.user_context = contexts[key]
+    return contexts[key]
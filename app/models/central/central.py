@@ -9,7 +9,7 @@ import hashlib
 from datetime import datetime, timezone
 from flask import current_app
 from sqlalchemy import DateTime as Datetime, or_
-from app import db
+from app import db, reference_cache, user_context_cache
 import uuid
 from datetime import datetime
 
@@ -216,6 +216,7 @@ class Currency(db.Model):
             )
             db.session.add(new_currency)
             db.session.commit()
+            reference_cache.invalidate("currencies")
             return new_currency
         except Exception as e:
             db.session.rollback()
@@ -228,6 +229,46 @@ class Currency(db.Model):
             return Currency.query.filter_by(id=currency_id).one()
         except NoResultFound:
             return None
+
+    @staticmethod
+    def get_cached_currency_by_code(code):
+        """Currency dict for a code, served from the reference cache. Use on hot paths that only need the id."""
+        def load():
+            currency = Currency.get_currency_by_code(code)
+            return currency.to_dict() if currency else None
+        return reference_cache.get_or_load("currencies", f"code:{code}", load)
+
+    @staticmethod
+    def get_cached_currency_by_id(currency_id):
+        """Currency dict for an id, served from the reference cache."""
+        def load():
+            currency = Currency.get_currency_by_id(currency_id)
+            return currency.to_dict() if currency else None
+        return reference_cache.get_or_load("currencies", f"id:{currency_id}", load)
+
+    @staticmethod
+    def update_currency(currency_id, name=None, symbol=None, code=None):
+        try:
+            currency = Currency.get_currency_by_id(currency_id)
+            if not currency:
+                return None
+            if name:
+                currency.name = name
+            if symbol is not None:
+                currency.symbol = symbol
+            code_changed = bool(code) and code != currency.code
+            if code:
+                currency.code = code
+            db.session.commit()
+            reference_cache.invalidate("currencies")
+            if code_changed:
+                # Cached user contexts resolve the currency id from the code
+                user_context_cache.invalidate("users")
+            return currency
+        except Exception as e:
+            db.session.rollback()
+            current_app.logger.error(f"Error updating currency: {str(e)}")
+            return None
         
     @staticmethod
     def get_all_currencies():
@@ -258,6 +299,8 @@ class Currency(db.Model):
                 return None
             db.session.delete(currency)
             db.session.commit()
+            reference_cache.invalidate("currencies")
+            user_context_cache.invalidate("users")
             return currency
         except Exception as e:
             db.session.rollback()
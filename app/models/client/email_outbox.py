@@ -0,0 +1,157 @@
+from app import db
+from sqlalchemy.dialects.postgresql import UUID
+from sqlalchemy import func, select, update, text, or_
+import uuid
+
+
+class EmailOutbox(db.Model):
+    """
+    Emails waiting to be delivered by the email worker (see app.helpers.send_email).
+
+    Attributes:
+        status (String): 'pending' until delivered ('sent') or given up on ('dead').
+        attempts (Integer): Deliveries started so far.
+        next_attempt_at (DateTime): When the message is next due. Claiming a message
+            pushes it forward by a lease, so a message whose worker died is retried
+            once the lease runs out.
+        last_error (Text): Why the last attempt failed.
+        expires_at (DateTime): Optional. Past it the message is no longer worth sending
+            (e.g. its verification link has expired) and is dead-lettered instead.
+    """
+
+    __tablename__ = "email_outbox"
+    __table_args__ = (
+        db.Index(
+            "ix_email_outbox_pending_next_attempt", "next_attempt_at",
+            postgresql_where=text("status = 'pending'")
+        ),
+    )
+
+    PENDING = "pending"
+    SENT = "sent"
+    DEAD = "dead"
+
+    id = db.Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4, nullable=False)
+    recipient = db.Column(db.String(255), nullable=False)
+    subject = db.Column(db.String(255), nullable=False)
+    body = db.Column(db.Text, nullable=False)
+    status = db.Column(db.String(20), nullable=False, default=PENDING)
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    next_attempt_at = db.Column(db.DateTime(timezone=True), nullable=False, default=func.now())
+    last_error = db.Column(db.Text, nullable=True)
+    created_at = db.Column(db.DateTime(timezone=True), nullable=False, default=func.now())
+    sent_at = db.Column(db.DateTime(timezone=True), nullable=True)
+    expires_at = db.Column(db.DateTime(timezone=True), nullable=True)
+
+    def __repr__(self):
+        return f"<EmailOutbox(id={self.id}, recipient={self.recipient}, status={self.status}, attempts={self.attempts})>"
+
+    @staticmethod
+    def enqueue(recipient, subject, body, expires_in=None):
+        """Add a message to the outbox and commit; it expires after expires_in seconds if given. Returns its id."""
+        message = EmailOutbox(recipient=recipient, subject=subject, body=body)
+        if expires_in is not None:
+            message.expires_at = func.now() + func.make_interval(0, 0, 0, 0, 0, 0, expires_in)
+        db.session.add(message)
+        db.session.commit()
+        return message.id
+
+    @staticmethod
+    def expire_due():
+        """
+        Dead-letter pending messages past their expires_at and commit, so they are never
+        claimed. Returns the number of messages expired.
+        """
+        count = db.session.execute(
+            update(EmailOutbox)
+            .where(EmailOutbox.status == EmailOutbox.PENDING, EmailOutbox.expires_at <= func.now())
+            .values(status=EmailOutbox.DEAD, last_error="Expired before delivery")
+        ).rowcount
+        db.session.commit()
+        return count
+
+    @staticmethod
+    def claim_batch(limit, lease_seconds):
+        """
+        Claim up to `limit` due messages, oldest first, and commit.
+
+        One UPDATE ... WHERE id IN (SELECT ... FOR UPDATE SKIP LOCKED) counts the attempt
+        and moves next_attempt_at lease_seconds ahead, so concurrent workers never claim
+        the same message and no row lock is held while the messages are delivered.
+
+        Returns:
+            list of dicts {id, recipient, subject, body, attempts}
+        """
+        due = (
+            select(EmailOutbox.id)
+            .where(
+                EmailOutbox.status == EmailOutbox.PENDING,
+                EmailOutbox.next_attempt_at <= func.now(),
+                or_(EmailOutbox.expires_at.is_(None), EmailOutbox.expires_at > func.now())
+            )
+            .order_by(EmailOutbox.next_attempt_at)
+            .limit(limit)
+            .with_for_update(skip_locked=True)
+        )
+        rows = db.session.execute(
+            update(EmailOutbox)
+            .where(EmailOutbox.id.in_(due.scalar_subquery()))
+            .values(
+                attempts=EmailOutbox.attempts + 1,
+                next_attempt_at=func.now() + func.make_interval(0, 0, 0, 0, 0, 0, lease_seconds)
+            )
+            .returning(EmailOutbox.id, EmailOutbox.recipient, EmailOutbox.subject, EmailOutbox.body, EmailOutbox.attempts)
+        ).all()
+        db.session.commit()
+        return [row._asdict() for row in rows]
+
+    @staticmethod
+    def mark_sent(message_ids):
+        """Mark delivered messages as sent (one statement, no commit)."""
+        if message_ids:
+            db.session.execute(
+                update(EmailOutbox)
+                .where(EmailOutbox.id.in_(message_ids))
+                .values(status=EmailOutbox.SENT, sent_at=func.now(), last_error=None)
+            )
+
+    @staticmethod
+    def mark_failed(message_id, error, retry_in=None):
+        """
+        Record a failed attempt (no commit). The message is retried in retry_in seconds,
+        or dead-lettered when retry_in is None.
+        """
+        values = {"last_error": error}
+        if retry_in is None:
+            values["status"] = EmailOutbox.DEAD
+        else:
+            values["next_attempt_at"] = func.now() + func.make_interval(0, 0, 0, 0, 0, 0, retry_in)
+        db.session.execute(update(EmailOutbox).where(EmailOutbox.id == message_id).values(**values))
+
+    @staticmethod
+    def requeue_dead(message_ids=None):
+        """
+        Put dead-lettered messages (all, or the given ids) back in the queue with fresh attempts.
+        Expired messages stay dead. Commits.
+        """
+        stmt = (
+            update(EmailOutbox)
+            .where(
+                EmailOutbox.status == EmailOutbox.DEAD,
+                or_(EmailOutbox.expires_at.is_(None), EmailOutbox.expires_at > func.now())
+            )
+            .values(status=EmailOutbox.PENDING, attempts=0, next_attempt_at=func.now())
+        )
+        if message_ids:
+            stmt = stmt.where(EmailOutbox.id.in_(message_ids))
+        count = db.session.execute(stmt).rowcount
+        db.session.commit()
+        return count
+
+    @staticmethod
+    def status_counts():
+        """Number of messages per status."""
+        rows = db.session.execute(
+            select(EmailOutbox.status, func.count()).group_by(EmailOutbox.status)
+        ).all()
+        return {status: count for status, count in rows}
@@ -11,9 +11,11 @@ from sqlalchemy.dialects.postgresql import UUID, JSONB
 import uuid
 from datetime import datetime
 from flask import jsonify
-from sqlalchemy import func
-from sqlalchemy import extract
+from sqlalchemy import event, func, inspect, select, tuple_
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 from decimal import Decimal
+from app.helpers.financials import month_range
+from app import reference_cache
 
 
 
@@ -101,6 +103,7 @@ class CategoriesType(db.Model):
                         value = value.strip()  # Remove unnecessary whitespace
                     setattr(category_type, key, value)
             db.session.commit()
+            reference_cache.invalidate("categories")
             return {"message": f"Category type '{category_type.name}' updated successfully"}
         except IntegrityError as e:
             db.session.rollback()
@@ -119,6 +122,7 @@ class CategoriesType(db.Model):
             raise NoResultFound("Category type not found")
         db.session.delete(category_type)
         db.session.commit()
+        reference_cache.invalidate("categories")
         return {"message": "Category type deleted successfully"}
 
     @staticmethod
@@ -174,6 +178,7 @@ class Categories(db.Model):
 
             db.session.add(new_category)
             db.session.commit()
+            reference_cache.invalidate("categories")
             return new_category
         except Exception as e:
            db.session.rollback()
@@ -186,11 +191,17 @@ class Categories(db.Model):
     
     @staticmethod
     def get_category_by_name(name):
-        """get category by name"""
-        category = Categories.query.filter(
-                db.func.lower(Categories.name) == db.func.lower(name.strip())
-            ).first()
-        return category.to_dict() if category else None
+        """get category by name (served from the reference cache)"""
+        def load():
+            category = Categories.query.filter(
+                    db.func.lower(Categories.name) == db.func.lower(name.strip())
+                ).first()
+            return category.to_dict() if category else None
+
+        category = reference_cache.get_or_load("categories", name.strip().lower(), load)
+        if category:
+            category["id"] = uuid.UUID(str(category["id"]))
+        return category
 
     @staticmethod
     def get_all_categories():
@@ -217,9 +228,28 @@ class Categories(db.Model):
 
             if hasattr(category, key):  # Only update valid attributes
                 setattr(category, key, value)
-        db.session.commit()
+        Categories._commit_category_change(category)
         return category
     
+    @staticmethod
+    def _commit_category_change(category):
+        """
+        Commit an edited category. When its category_type changed, the monthly totals of
+        every user with records in it are rebuilt in the same transaction, since their
+        records now count as the other type (or not at all).
+        """
+        if inspect(category).attrs.category_type.history.has_changes():
+            user_ids = [
+                row.user_id for row in
+                db.session.query(FinancialRecord.user_id)
+                .filter(FinancialRecord.category_id == category.category_id)
+                .distinct()
+            ]
+            if user_ids:
+                UserMonthlyTotal.rebuild(user_ids=user_ids)
+        db.session.commit()
+        reference_cache.invalidate("categories")
+
     @staticmethod
     def delete_category(category_id):
         """Delete a category by category_id."""
@@ -228,6 +258,7 @@ class Categories(db.Model):
             raise NoResultFound("Category not found")
         db.session.delete(category)
         db.session.commit()
+        reference_cache.invalidate("categories")
         return {"message": "Category deleted successfully", "status": "success"}
 
     @staticmethod
@@ -252,6 +283,7 @@ class Categories(db.Model):
                 )
                 db.session.add(categories_data)
             db.session.commit()
+            reference_cache.invalidate("categories")
         except Exception as e:
             db.session.rollback()
             raise Exception(f"Error adding categories: {str(e)}")
@@ -282,7 +314,7 @@ class Categories(db.Model):
 
             if hasattr(category, key):  # Only update valid attributes
                 setattr(category, key, value)
-        db.session.commit()
+        Categories._commit_category_change(category)
         return category
     
 
@@ -305,6 +337,21 @@ class FinancialRecord(db.Model):
     """
 
     __tablename__ = "financial_records"
+    __table_args__ = (
+        # Listing and month scans for one user, in (recorded_at, record_id) order
+        db.Index('ix_financial_records_user_recorded', 'user_id', 'recorded_at', 'record_id'),
+        # User-entered records only (allocation ledger rows excluded)
+        db.Index(
+            'ix_financial_records_user_recorded_user_entered', 'user_id', 'recorded_at',
+            postgresql_where=db.text('NOT is_allocation_transaction')
+        ),
+        # Actual totals: covers the SUM without touching the heap
+        db.Index(
+            'ix_financial_records_user_recorded_actual', 'user_id', 'recorded_at',
+            postgresql_include=['category_id', 'amount'],
+            postgresql_where=db.text('NOT is_allocation_transaction AND NOT expected_transaction')
+        ),
+    )
 
     record_id = db.Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4, unique=True, nullable=False)
     user_id = db.Column(UUID(as_uuid=True), db.ForeignKey("users.user_id"), nullable=False)
@@ -350,6 +397,64 @@ class FinancialRecord(db.Model):
             "expense_beneficiary_name": self.expense_beneficiary.name if self.expense_beneficiary else None,
         }
 
+    @staticmethod
+    def query_with_refs():
+        """
+        Query the columns to_dict needs, with category, category type, currency,
+        orientation and beneficiary names joined in, as flat rows.
+        One statement regardless of how many records match; serialize with row_to_dict.
+        """
+        from app.models.central.central import Currency, ExpenseOrientation, ExpenseBeneficiary
+        return (
+            db.session.query(
+                FinancialRecord.record_id,
+                FinancialRecord.user_id,
+                FinancialRecord.category_id,
+                Categories.name.label("category_name"),
+                Categories.category_type.label("category_type"),
+                CategoriesType.name.label("category_type_name"),
+                FinancialRecord.amount,
+                FinancialRecord.description,
+                FinancialRecord.recorded_at,
+                FinancialRecord.created_at,
+                FinancialRecord.updated_at,
+                FinancialRecord.currency,
+                Currency.code.label("currency_code"),
+                FinancialRecord.expected_transaction,
+                FinancialRecord.is_allocation_transaction,
+                ExpenseOrientation.name.label("expense_orientation_name"),
+                ExpenseBeneficiary.name.label("expense_beneficiary_name"),
+            )
+            .outerjoin(Categories, Categories.category_id == FinancialRecord.category_id)
+            .outerjoin(CategoriesType, CategoriesType.name == Categories.category_type)
+            .outerjoin(Currency, Currency.id == FinancialRecord.currency)
+            .outerjoin(ExpenseOrientation, ExpenseOrientation.id == FinancialRecord.expense_orientation_id)
+            .outerjoin(ExpenseBeneficiary, ExpenseBeneficiary.id == FinancialRecord.expense_beneficiary_id)
+        )
+
+    @staticmethod
+    def row_to_dict(row):
+        """Serialize a query_with_refs row to the same shape as to_dict, without touching ORM instances."""
+        return {
+            "record_id": str(row.record_id),
+            "user_id": str(row.user_id),
+            "category_id": str(row.category_id),
+            "category_name": row.category_name,
+            "category_type": str(row.category_type) if row.category_type else None,
+            "category_type_name": row.category_type_name,
+            "amount": float(row.amount),
+            "description": row.description,
+            "recorded_at": row.recorded_at.isoformat(),
+            "created_at": row.created_at.isoformat(),
+            "updated_at": row.updated_at.isoformat() if row.updated_at else None,
+            "currency": str(row.currency) if row.currency else None,
+            "currency_code": row.currency_code,
+            "expected_transaction": row.expected_transaction,
+            "is_allocation_transaction": row.is_allocation_transaction,
+            "expense_orientation_name": row.expense_orientation_name,
+            "expense_beneficiary_name": row.expense_beneficiary_name,
+        }
+
     @staticmethod
     def create_record(user_id, category_id, amount, recorded_at, expected_transaction=False, description=None, currency_id=None, is_allocation_transaction=False, expense_orientation_id=None, expense_beneficiary_id=None):
         """Creates a new financial record (either expected or actual)."""
@@ -383,6 +488,144 @@ class FinancialRecord(db.Model):
             current_app.logger.error(f"Unexpected error creating financial record: {str(e)}")
             return None
 
+    @staticmethod
+    def add_allocation_records(user_id, entries, recorded_at):
+        """
+        Insert allocation ledger entries (Saving/Deficit) with a single INSERT.
+        Entries whose category does not exist are skipped, as in create_record callers.
+        Does not commit; the caller owns the transaction.
+        """
+        return FinancialRecord.add_timed_allocation_records(user_id, [(recorded_at, entry) for entry in entries])
+
+    @staticmethod
+    def add_timed_allocation_records(user_id, timed_entries):
+        """
+        Like add_allocation_records, but each entry carries its own timestamp.
+
+        Args:
+            timed_entries: list of (recorded_at, LedgerEntry)
+        """
+        category_ids = {}
+        rows = []
+        for recorded_at, entry in timed_entries:
+            if entry.category not in category_ids:
+                category = Categories.get_category_by_name(entry.category)
+                category_ids[entry.category] = category["id"] if category else None
+            category_id = category_ids[entry.category]
+            if not category_id:
+                current_app.logger.warning(f"Category '{entry.category}' not found, skipping allocation record")
+                continue
+            rows.append({
+                "record_id": uuid.uuid4(),
+                "user_id": user_id,
+                "category_id": category_id,
+                "amount": entry.amount,
+                "description": entry.description,
+                "recorded_at": recorded_at,
+                "created_at": recorded_at,
+                "updated_at": recorded_at,
+                "expected_transaction": False,
+                "is_allocation_transaction": True,
+            })
+        if rows:
+            db.session.execute(pg_insert(FinancialRecord).values(rows))
+        return len(rows)
+
+    @staticmethod
+    def has_allocation_records_before(user_id, before):
+        """True if the user has allocation ledger records dated before `before`."""
+        return db.session.query(
+            FinancialRecord.query.filter(
+                FinancialRecord.user_id == user_id,
+                FinancialRecord.is_allocation_transaction == True,
+                FinancialRecord.recorded_at < before
+            ).exists()
+        ).scalar()
+
+    @staticmethod
+    def get_allocation_records_since(user_id, since):
+        """Allocation ledger records dated on or after `since`, as (category name, description, amount) rows."""
+        return (
+            db.session.query(Categories.name, FinancialRecord.description, FinancialRecord.amount)
+            .join(Categories, Categories.category_id == FinancialRecord.category_id)
+            .filter(
+                FinancialRecord.user_id == user_id,
+                FinancialRecord.is_allocation_transaction == True,
+                FinancialRecord.recorded_at >= since
+            )
+            .all()
+        )
+
+    @staticmethod
+    def delete_allocation_records_since(user_id, since):
+        """Delete allocation ledger records dated on or after `since`. Does not commit."""
+        return FinancialRecord.query.filter(
+            FinancialRecord.user_id == user_id,
+            FinancialRecord.is_allocation_transaction == True,
+            FinancialRecord.recorded_at >= since
+        ).delete(synchronize_session=False)
+
+    @staticmethod
+    def stream_replay_records(user_id, since, batch_size=1000):
+        """
+        Yield (recorded_at, category_type, amount) for a user's actual income and
+        expense records dated on or after `since`, oldest first, from a server-side
+        cursor. Expected and allocation records are left out, as in the monthly totals.
+        """
+        query = (
+            db.session.query(FinancialRecord.recorded_at, Categories.category_type, FinancialRecord.amount)
+            .join(Categories, Categories.category_id == FinancialRecord.category_id)
+            .filter(
+                FinancialRecord.user_id == user_id,
+                FinancialRecord.recorded_at >= since,
+                FinancialRecord.is_allocation_transaction == False,
+                FinancialRecord.expected_transaction == False,
+                Categories.category_type.in_(["Income", "Expense"])
+            )
+            .order_by(FinancialRecord.recorded_at, FinancialRecord.created_at, FinancialRecord.record_id)
+            .execution_options(yield_per=batch_size)
+        )
+        for row in query:
+            yield row
+
+    @staticmethod
+    def get_records_page(user_id, limit, after=None):
+        """
+        Fetch one page of a user's records, newest first, using keyset pagination
+        on (recorded_at, record_id).
+
+        Args:
+            after: (recorded_at, record_id) of the last row of the previous page, or None.
+
+        Returns:
+            (rows, has_more), rows as returned by query_with_refs
+        """
+        query = FinancialRecord.query_with_refs().filter(FinancialRecord.user_id == user_id)
+        if after:
+            query = query.filter(
+                tuple_(FinancialRecord.recorded_at, FinancialRecord.record_id) < tuple_(*after)
+            )
+        records = (
+            query.order_by(FinancialRecord.recorded_at.desc(), FinancialRecord.record_id.desc())
+            .limit(limit + 1)
+            .all()
+        )
+        return records[:limit], len(records) > limit
+
+    @staticmethod
+    def stream_records_by_user(user_id, batch_size=500):
+        """
+        Yield a user's records as query_with_refs rows, newest first, from a
+        server-side cursor so memory stays flat regardless of history size.
+        """
+        query = (
+            FinancialRecord.query_with_refs().filter(FinancialRecord.user_id == user_id)
+            .order_by(FinancialRecord.recorded_at.desc(), FinancialRecord.record_id.desc())
+            .execution_options(yield_per=batch_size)
+        )
+        for record in query:
+            yield record
+
     @staticmethod
     def get_records_by_user(user_id):
         """Fetch all financial records for a user, optionally filtering by expected status."""
@@ -424,23 +667,17 @@ class FinancialRecord(db.Model):
     @staticmethod
     def get_monthly_summary_list(user_id, year, month):
         """Get a summary of income and expenses for a given month."""
-        from datetime import datetime
-
-        start_date = datetime(year, month, 1)
-        if month == 12:
-            end_date = datetime(year + 1, 1, 1)
-        else:
-            end_date = datetime(year, month + 1, 1)
+        start_date, end_date = month_range(year, month)
 
         # Query records within that month
-        records = FinancialRecord.query.filter(
+        records = FinancialRecord.query_with_refs().filter(
             FinancialRecord.user_id == user_id,
             FinancialRecord.recorded_at >= start_date,
             FinancialRecord.recorded_at < end_date
         ).order_by(FinancialRecord.recorded_at.asc()).all()
         if not records:
             return None
-        return [record.to_dict() for record in records]
+        return [FinancialRecord.row_to_dict(record) for record in records]
 
     @staticmethod
     def get_monthly_summary_totals(user_id, year, month):
@@ -449,30 +686,21 @@ class FinancialRecord(db.Model):
         Returns totals for income, expense, and net balance.
         """
         try:
-            income_sum = (
-                db.session.query(func.coalesce(func.sum(FinancialRecord.amount), 0))
-                .filter(
-                    FinancialRecord.user_id == user_id,
-                    extract('year', FinancialRecord.recorded_at) == year,
-                    extract('month', FinancialRecord.recorded_at) == month,
-                    FinancialRecord.category.has(Categories.category_type == 'Income'),
-                    FinancialRecord.expected_transaction == False,
-                    FinancialRecord.is_allocation_transaction == False
+            start_date, end_date = month_range(year, month)
+            income_sum, expense_sum = (
+                db.session.query(
+                    func.coalesce(func.sum(FinancialRecord.amount).filter(Categories.category_type == 'Income'), 0),
+                    func.coalesce(func.sum(FinancialRecord.amount).filter(Categories.category_type == 'Expense'), 0)
                 )
-                .scalar()
-            )
-
-            expense_sum = (
-                db.session.query(func.coalesce(func.sum(FinancialRecord.amount), 0))
+                .join(Categories, Categories.category_id == FinancialRecord.category_id)
                 .filter(
                     FinancialRecord.user_id == user_id,
-                    extract('year', FinancialRecord.recorded_at) == year,
-                    extract('month', FinancialRecord.recorded_at) == month,
-                    FinancialRecord.category.has(Categories.category_type == 'Expense'),
+                    FinancialRecord.recorded_at >= start_date,
+                    FinancialRecord.recorded_at < end_date,
                     FinancialRecord.expected_transaction == False,
                     FinancialRecord.is_allocation_transaction == False
                 )
-                .scalar()
+                .one()
             )
 
             return {
@@ -503,7 +731,7 @@ class FinancialRecord(db.Model):
         new_record = FinancialRecord.create_record(
             user_id=user_id,
             amount=surplus_amount,
-            category_id=carried_over_cat.get("category_id"),
+            category_id=carried_over_cat.get("id"),
             expected_transaction=False,
             description=f"Carried over surplus from {from_month}",
             recorded_at=datetime.now(timezone.utc),
@@ -517,10 +745,10 @@ class FinancialRecord(db.Model):
     
     @staticmethod
     def get_income_records_by_user(user_id):
-        """Fetch all income financial records for a user."""
-        records = FinancialRecord.query.filter(
+        """Fetch all income financial records for a user, as query_with_refs rows."""
+        records = FinancialRecord.query_with_refs().filter(
             FinancialRecord.user_id == user_id,
-            FinancialRecord.category.has(Categories.category_type == 'Income')
+            Categories.category_type == 'Income'
         ).all()
         if not records:
             return None
@@ -528,10 +756,10 @@ class FinancialRecord(db.Model):
     
     @staticmethod
     def get_expense_records_by_user(user_id):
-        """Fetch all expense financial records for a user."""
-        records = FinancialRecord.query.filter(
+        """Fetch all expense financial records for a user, as query_with_refs rows."""
+        records = FinancialRecord.query_with_refs().filter(
             FinancialRecord.user_id == user_id,
-            FinancialRecord.category.has(Categories.category_type == 'Expense')
+            Categories.category_type == 'Expense'
         ).all()
         if not records:
             return None
@@ -539,13 +767,239 @@ class FinancialRecord(db.Model):
 
     @staticmethod
     def get_records_by_user_and_month(user_id, year, month):
-        """Fetch all financial records for a user in a specific month."""
-        records = FinancialRecord.query.filter(
+        """Fetch all financial records for a user in a specific month, as query_with_refs rows."""
+        start_date, end_date = month_range(year, month)
+        records = FinancialRecord.query_with_refs().filter(
             FinancialRecord.user_id == user_id,
-            extract('year', FinancialRecord.recorded_at) == year,
-            extract('month', FinancialRecord.recorded_at) == month,
+            FinancialRecord.recorded_at >= start_date,
+            FinancialRecord.recorded_at < end_date,
             FinancialRecord.is_allocation_transaction == False
         ).all()
         if not records:
             return None
-        return records
\ No newline at end of file
+        return records
+
+class UserMonthlyTotal(db.Model):
+    """
+    Rollup of a user's income and expense per month, kept in step with financial_records.
+
+    Attributes:
+        user_id (UUID): The user the totals belong to.
+        month (String): Month in YYYY-MM format.
+        category_type (String): 'Income' or 'Expense'.
+        total_amount (Numeric): Sum of actual (non-expected) records.
+        expected_amount (Numeric): Sum of expected records.
+        record_count (Integer): Number of records, actual and expected.
+
+    Allocation transactions are never counted. The rollup is maintained by the mapper
+    hooks at the end of this module, so every ORM insert, update and delete of a record
+    (including relationship cascades) adjusts it in the same flush. Core statements on
+    financial_records bypass them and must not touch counted records.
+    """
+
+    __tablename__ = "user_monthly_totals"
+
+    user_id = db.Column(UUID(as_uuid=True), db.ForeignKey("users.user_id", ondelete="CASCADE"), primary_key=True, nullable=False)
+    month = db.Column(db.String(7), primary_key=True, nullable=False)
+    category_type = db.Column(db.String(255), primary_key=True, nullable=False)
+    total_amount = db.Column(db.Numeric(14, 2), nullable=False, default=0)
+    expected_amount = db.Column(db.Numeric(14, 2), nullable=False, default=0)
+    record_count = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime(timezone=True), default=func.now(), onupdate=func.now(), nullable=False)
+
+    def __repr__(self):
+        return f"<UserMonthlyTotal(user_id={self.user_id}, month={self.month}, category_type={self.category_type}, total={self.total_amount})>"
+
+    @staticmethod
+    def month_key(recorded_at):
+        """
+        SQL expression for the YYYY-MM bucket of a recorded_at column. The rollup's only
+        month definition: contribution() and rebuild() both use it (as does the backfill
+        migration's SQL), so a record lands in the same month whichever path counted it.
+        """
+        return func.to_char(recorded_at, 'YYYY-MM')
+
+    @staticmethod
+    def contribution(connection, record_id):
+        """
+        Return (user_id, month, category_type, amount, expected) for a record as stored,
+        or None when the record does not count towards the totals.
+
+        Reads the row back on the flush's connection, so the month is month_key() of the
+        stored recorded_at rather than of the string or timezone-aware value assigned.
+        """
+        row = connection.execute(
+            select(
+                FinancialRecord.user_id,
+                UserMonthlyTotal.month_key(FinancialRecord.recorded_at),
+                Categories.category_type,
+                FinancialRecord.amount,
+                FinancialRecord.expected_transaction
+            )
+            .join(Categories, Categories.category_id == FinancialRecord.category_id)
+            .where(
+                FinancialRecord.record_id == record_id,
+                FinancialRecord.is_allocation_transaction == False,
+                Categories.category_type.in_(["Income", "Expense"])
+            )
+        ).first()
+        if row is None:
+            return None
+        user_id, month, category_type, amount, expected = row
+        return (user_id, month, category_type, Decimal(str(amount or 0)), bool(expected))
+
+    @staticmethod
+    def apply(connection, contribution, sign=1):
+        """
+        Add (sign=1) or remove (sign=-1) a contribution with a single upsert.
+        Does not commit; the caller owns the transaction.
+        """
+        if contribution is None:
+            return
+        user_id, month, category_type, amount, expected = contribution
+        signed = amount * sign
+        stmt = pg_insert(UserMonthlyTotal).values(
+            user_id=user_id,
+            month=month,
+            category_type=category_type,
+            total_amount=Decimal('0.00') if expected else signed,
+            expected_amount=signed if expected else Decimal('0.00'),
+            record_count=sign,
+            updated_at=func.now()
+        )
+        stmt = stmt.on_conflict_do_update(
+            index_elements=['user_id', 'month', 'category_type'],
+            set_={
+                "total_amount": UserMonthlyTotal.total_amount + stmt.excluded.total_amount,
+                "expected_amount": UserMonthlyTotal.expected_amount + stmt.excluded.expected_amount,
+                "record_count": UserMonthlyTotal.record_count + stmt.excluded.record_count,
+                "updated_at": stmt.excluded.updated_at,
+            }
+        )
+        connection.execute(stmt)
+
+    @staticmethod
+    def record_changed(connection, before=None, after=None):
+        """Move a record's contribution from its old (user, month, type) bucket to its new one."""
+        if before == after:
+            return
+        UserMonthlyTotal.apply(connection, before, sign=-1)
+        UserMonthlyTotal.apply(connection, after, sign=1)
+
+    @staticmethod
+    def get_month_rows(user_id, year, month):
+        """Fetch the Income and Expense rows for one month, keyed by category_type."""
+        rows = UserMonthlyTotal.query.filter_by(user_id=user_id, month=f"{year}-{month:02d}").all()
+        return {row.category_type: row for row in rows}
+
+    @staticmethod
+    def get_monthly_totals(user_id, year, month):
+        """
+        Same shape as FinancialRecord.get_monthly_summary_totals (actual records only),
+        read from at most two rollup rows.
+        """
+        rows = UserMonthlyTotal.get_month_rows(user_id, year, month)
+        income = Decimal(rows["Income"].total_amount) if "Income" in rows else Decimal('0.00')
+        expense = Decimal(rows["Expense"].total_amount) if "Expense" in rows else Decimal('0.00')
+        return {
+            "total_income": income,
+            "total_expense": expense,
+            "net_income": income - expense
+        }
+
+    @staticmethod
+    def get_latest_totals_before(user_id, month):
+        """
+        Actual income and expense totals of the user's latest month before `month`
+        (YYYY-MM) that has records, in the get_monthly_totals shape, or None.
+        """
+        latest = (
+            db.session.query(func.max(UserMonthlyTotal.month))
+            .filter(UserMonthlyTotal.user_id == user_id, UserMonthlyTotal.month < month)
+            .scalar()
+        )
+        if not latest:
+            return None
+        year, month_number = map(int, latest.split("-"))
+        return UserMonthlyTotal.get_monthly_totals(user_id, year, month_number)
+
+    @staticmethod
+    def rebuild(user_id=None, user_ids=None):
+        """
+        Recompute the rollup from financial_records for one user, the users in user_ids,
+        or everyone when neither is given. Runs as one DELETE plus one INSERT ... SELECT
+        and commits, together with any pending changes in the session.
+        """
+        if user_id:
+            user_ids = [user_id]
+        try:
+            delete_query = UserMonthlyTotal.query
+            if user_ids is not None:
+                delete_query = delete_query.filter(UserMonthlyTotal.user_id.in_(user_ids))
+            delete_query.delete(synchronize_session=False)
+
+            month_expr = UserMonthlyTotal.month_key(FinancialRecord.recorded_at)
+            source = (
+                db.session.query(
+                    FinancialRecord.user_id,
+                    month_expr,
+                    Categories.category_type,
+                    func.coalesce(func.sum(FinancialRecord.amount).filter(FinancialRecord.expected_transaction == False), 0),
+                    func.coalesce(func.sum(FinancialRecord.amount).filter(FinancialRecord.expected_transaction == True), 0),
+                    func.count(),
+                    func.now()
+                )
+                .join(Categories, Categories.category_id == FinancialRecord.category_id)
+                .filter(
+                    FinancialRecord.is_allocation_transaction == False,
+                    Categories.category_type.in_(["Income", "Expense"])
+                )
+                .group_by(FinancialRecord.user_id, month_expr, Categories.category_type)
+            )
+            if user_ids is not None:
+                source = source.filter(FinancialRecord.user_id.in_(user_ids))
+
+            result = db.session.execute(
+                pg_insert(UserMonthlyTotal).from_select(
+                    ["user_id", "month", "category_type", "total_amount", "expected_amount", "record_count", "updated_at"],
+                    source
+                )
+            )
+            db.session.commit()
+            return result.rowcount
+        except Exception as e:
+            db.session.rollback()
+            current_app.logger.error(f"Error rebuilding monthly totals: {str(e)}")
+            raise
+
+
+# Columns that decide whether and where a record counts in user_monthly_totals
+_ROLLUP_COLUMNS = ("user_id", "category_id", "amount", "recorded_at", "expected_transaction", "is_allocation_transaction")
+
+
+def _rollup_columns_changed(record):
+    state = inspect(record)
+    return any(state.attrs[name].history.has_changes() for name in _ROLLUP_COLUMNS)
+
+
+@event.listens_for(FinancialRecord, "after_insert")
+def _rollup_after_insert(mapper, connection, record):
+    UserMonthlyTotal.apply(connection, UserMonthlyTotal.contribution(connection, record.record_id))
+
+
+@event.listens_for(FinancialRecord, "before_update")
+def _rollup_before_update(mapper, connection, record):
+    if _rollup_columns_changed(record):
+        record._rollup_before = UserMonthlyTotal.contribution(connection, record.record_id)
+
+
+@event.listens_for(FinancialRecord, "after_update")
+def _rollup_after_update(mapper, connection, record):
+    if "_rollup_before" in record.__dict__:
+        before = record.__dict__.pop("_rollup_before")
+        UserMonthlyTotal.record_changed(connection, before, UserMonthlyTotal.contribution(connection, record.record_id))
+
+
+@event.listens_for(FinancialRecord, "before_delete")
+def _rollup_before_delete(mapper, connection, record):
+    UserMonthlyTotal.apply(connection, UserMonthlyTotal.contribution(connection, record.record_id), sign=-1)
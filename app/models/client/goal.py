@@ -6,14 +6,17 @@ from datetime import datetime
 from datetime import datetime, timezone
 from flask import current_app, jsonify
 from sqlalchemy import DateTime as Datetime
-from app import db
+from app import db, reference_cache
 from sqlalchemy.dialects.postgresql import UUID
 import uuid
 from datetime import datetime
 import traceback
 from sqlalchemy.dialects.postgresql import UUID, NUMERIC
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy import update, values, column, func, select, case, and_, or_, not_
 from uuid import uuid4
 from enum import Enum
+from app.helpers.allocation_engine import AllocationGoal
 
 
 class GoalProtectionLevel(Enum):
@@ -157,6 +160,36 @@ class Goal(db.Model):
             current_app.logger.error(f"Error updating goal: {e}")
             return e
     
+    @staticmethod
+    def apply_amount_deltas(deltas):
+        """
+        Add each goal's delta to current_amount and refresh funding_gap in one
+        UPDATE ... FROM (VALUES ...). Does not commit; the caller owns the transaction.
+
+        Args:
+            deltas: dict of goal_id -> Decimal change to current_amount
+        """
+        rows = [(uuid.UUID(str(goal_id)), amount) for goal_id, amount in deltas.items() if amount]
+        if not rows:
+            return 0
+        goal_deltas = values(
+            column('goal_id', UUID(as_uuid=True)),
+            column('delta', NUMERIC(12, 2)),
+            name='goal_deltas'
+        ).data(rows)
+        new_amount = func.coalesce(Goal.current_amount, 0) + goal_deltas.c.delta
+        db.session.execute(
+            update(Goal)
+            .where(Goal.goal_id == goal_deltas.c.goal_id)
+            .values(
+                current_amount=new_amount,
+                funding_gap=func.greatest(Goal.target_amount - new_amount, 0),
+                updated_at=datetime.now(timezone.utc)
+            )
+            .execution_options(synchronize_session=False)
+        )
+        return len(rows)
+
     @staticmethod
     def finalize_goal(goal_id, **kwargs):
         goal = Goal.query.filter_by(goal_id=goal_id).first()
@@ -218,6 +251,118 @@ class Goal(db.Model):
             current_app.logger.error(f"Error fetching active goals: {e}")
             return e
         
+    @staticmethod
+    def _allocation_goal_query(*extra_columns):
+        """
+        Query for the columns AllocationGoal needs, with priority and status joined in,
+        plus any extra columns. Callers add the filters.
+        """
+        return (
+            db.session.query(
+                Goal.goal_id, Goal.title, Goal.target_amount, Goal.current_amount,
+                Goal.protection_level, Goal.protection_reason, Goal.is_locked, Goal.is_essential,
+                GoalPriority.percentage.label("priority_percentage"),
+                GoalStatus.name.label("status_name"),
+                *extra_columns
+            )
+            .outerjoin(GoalPriority, GoalPriority.priority_id == Goal.priority_id)
+            .outerjoin(GoalStatus, GoalStatus.status_id == Goal.goal_status_id)
+        )
+
+    @staticmethod
+    def _to_allocation_goal(row):
+        return AllocationGoal(
+            goal_id=str(row.goal_id),
+            title=row.title,
+            target_amount=row.target_amount,
+            current_amount=row.current_amount or 0,
+            priority_percentage=row.priority_percentage or 0,
+            status=row.status_name,
+            protection_level=row.protection_level.value,
+            protection_reason=row.protection_reason,
+            is_locked=row.is_locked,
+            is_essential=row.is_essential
+        )
+
+    @staticmethod
+    def get_allocation_goals(user_id):
+        """
+        Active goals as AllocationGoal records for the allocation engine, in one query.
+        Unlike get_active_goals, no relationship is loaded and no row is serialized.
+        """
+        rows = (
+            Goal._allocation_goal_query()
+            .filter(Goal.user_id == user_id, Goal.is_active.is_(True))
+            .all()
+        )
+        return [Goal._to_allocation_goal(row) for row in rows]
+
+    @staticmethod
+    def get_allocation_snapshot(user_id, month):
+        """
+        Active goals as AllocationGoal records plus this month's allocated amount per
+        goal, in one query (a grouped allocation subquery is joined in).
+
+        Returns:
+            (goals, month_allocations) where month_allocations is goal_id -> Decimal
+        """
+        allocated = MonthlyGoalAllocation.month_totals_by_goal_query(user_id, month).subquery("month_allocated")
+        rows = (
+            Goal._allocation_goal_query(func.coalesce(allocated.c.allocated, 0).label("month_allocated"))
+            .outerjoin(allocated, allocated.c.goal_id == Goal.goal_id)
+            .filter(Goal.user_id == user_id, Goal.is_active.is_(True))
+            .all()
+        )
+        goals, month_allocations = [], {}
+        for row in rows:
+            goal = Goal._to_allocation_goal(row)
+            goals.append(goal)
+            month_allocations[goal.goal_id] = row.month_allocated
+        return goals, month_allocations
+
+    @staticmethod
+    def get_replay_state(user_id, from_month):
+        """
+        Goals an allocation replay from `from_month` (YYYY-MM) works on, in one query:
+        active goals plus any goal with allocations in or after that month.
+
+        Returns:
+            list of dicts, oldest goal first, with goal (AllocationGoal), created_at,
+            stored_amount (current_amount as stored), window_allocated (allocations
+            in or after from_month) and window_finalized (True if any of them is finalized)
+        """
+        window = (
+            select(
+                MonthlyGoalAllocation.goal_id,
+                func.sum(MonthlyGoalAllocation.allocated_amount).label("allocated"),
+                func.bool_or(MonthlyGoalAllocation.is_finalized.is_(True)).label("finalized")
+            )
+            .where(MonthlyGoalAllocation.user_id == user_id, MonthlyGoalAllocation.month >= from_month)
+            .group_by(MonthlyGoalAllocation.goal_id)
+            .subquery("window_allocated")
+        )
+        rows = (
+            Goal._allocation_goal_query(
+                Goal.created_at,
+                func.coalesce(window.c.allocated, 0).label("window_allocated"),
+                func.coalesce(window.c.finalized, False).label("window_finalized")
+            )
+            .outerjoin(window, window.c.goal_id == Goal.goal_id)
+            .filter(Goal.user_id == user_id, or_(Goal.is_active.is_(True), window.c.goal_id.isnot(None)))
+            .order_by(Goal.created_at, Goal.goal_id)
+            .all()
+        )
+        return [
+            {
+                "goal": Goal._to_allocation_goal(row),
+                "created_at": row.created_at,
+                "stored_amount": row.current_amount or 0,
+                "window_allocated": row.window_allocated,
+                "window_finalized": row.window_finalized
+            }
+            for row in rows
+        ]
+
     @staticmethod
     def get_completed_goals(user_id):
         """Fetch all completed goals for a user."""
@@ -446,6 +591,7 @@ class GoalPriority(db.Model):
             priority = GoalPriority(name=name, user_id=user_id, percentage=percentage)
             db.session.add(priority)
             db.session.commit()
+            reference_cache.invalidate("goal_priorities")
             return priority.to_dict()
         except IntegrityError as e:
             db.session.rollback()
@@ -454,10 +600,13 @@ class GoalPriority(db.Model):
         
     @staticmethod
     def get_priority_by_id(priority_id):
-        priority = GoalPriority.query.filter_by(priority_id=priority_id).first()
-        if not priority:
-            return None
-        return priority.to_dict()
+        """Fetch a goal priority by id (served from the reference cache)."""
+        def load():
+            priority = GoalPriority.query.filter_by(priority_id=priority_id).first()
+            if not priority:
+                return None
+            return priority.to_dict()
+        return reference_cache.get_or_load("goal_priorities", str(priority_id), load)
     
     @staticmethod
     def get_priorities_by_user(user_id):
@@ -478,6 +627,7 @@ class GoalPriority(db.Model):
                 return None
             db.session.delete(priority)
             db.session.commit()
+            reference_cache.invalidate("goal_priorities")
             return priority.to_dict()
         except Exception as e:
             db.session.rollback()
@@ -508,6 +658,7 @@ class GoalPriority(db.Model):
                     setattr(priority, key, value)
 
             db.session.commit()
+            reference_cache.invalidate("goal_priorities")
             return priority.to_dict()
         except Exception as e:
             db.session.rollback()
@@ -542,6 +693,7 @@ class GoalStatus(db.Model):
             goal_status = GoalStatus(name=name)
             db.session.add(goal_status)
             db.session.commit()
+            reference_cache.invalidate("goal_statuses")
             return goal_status.to_dict()
         except Exception as e:
             current_app.logger.info(f"Error while adding goal status {e}")
@@ -567,6 +719,7 @@ class GoalStatus(db.Model):
             
             status.name = name
             db.session.commit()
+            reference_cache.invalidate("goal_statuses")
             return status.to_dict()
         except IntegrityError as e:
             db.session.rollback()
@@ -588,6 +741,7 @@ class GoalStatus(db.Model):
             
             db.session.delete(status)
             db.session.commit()
+            reference_cache.invalidate("goal_statuses")
             return status.to_dict()
         except Exception as e:
             db.session.rollback()
@@ -596,13 +750,16 @@ class GoalStatus(db.Model):
         
     @staticmethod
     def get_status_by_name(name):
-        """Fetch a goal status by name."""
-        try:
+        """Fetch a goal status by name (served from the reference cache)."""
+        def load():
             status = GoalStatus.query.filter_by(name=name).first()
+            return status.to_dict() if status else None
+        try:
+            status = reference_cache.get_or_load("goal_statuses", name, load)
             if not status:
                 current_app.logger.error(f"Goal status with name '{name}' not found.")
                 return None
-            return status.to_dict()
+            return status
         except Exception as e:
             current_app.logger.error(f"Error fetching goal status by name: {e}")
             return None
@@ -610,6 +767,16 @@ class GoalStatus(db.Model):
 class MonthlyGoalAllocation(db.Model):
     """Tracks monthly allocation of funds to each goal for each user as per net income."""
     __tablename__ = "monthly_goal_allocations"
+    __table_args__ = (
+        db.UniqueConstraint('user_id', 'goal_id', 'month', name='uq_monthly_goal_allocations_user_goal_month'),
+        # Month-end finalization walks the users with open allocations in a month
+        db.Index(
+            'ix_monthly_goal_allocations_month_user_open', 'month', 'user_id',
+            postgresql_where=db.text('is_finalized IS NOT TRUE')
+        ),
+        # Current-month totals per goal for a user (pullback in recalculations)
+        db.Index('ix_monthly_goal_allocations_user_month_goal', 'user_id', 'month', 'goal_id'),
+    )
 
     allocation_id = db.Column(UUID(as_uuid=True), primary_key=True, default=uuid4, unique=True, nullable=False)
     user_id = db.Column(UUID(as_uuid=True), db.ForeignKey('users.user_id'), nullable=False)
@@ -663,6 +830,77 @@ class MonthlyGoalAllocation(db.Model):
             current_app.logger.error(f"Error reallocating funds: {e}")
             return None
         
+    @staticmethod
+    def upsert_allocation_deltas(user_id, month, deltas):
+        """
+        Add each goal's delta to its allocation for the month with a single
+        INSERT ... ON CONFLICT (user_id, goal_id, month) DO UPDATE.
+        Does not commit; the caller owns the transaction.
+
+        Args:
+            deltas: dict of goal_id -> Decimal change to allocated_amount
+        """
+        now = datetime.now(timezone.utc)
+        rows = [
+            {
+                "allocation_id": uuid4(),
+                "user_id": user_id,
+                "goal_id": uuid.UUID(str(goal_id)),
+                "month": month,
+                "allocated_amount": amount,
+                "created_at": now,
+                "updated_at": now,
+                "is_finalized": False,
+                "is_deficit": False,
+            }
+            for goal_id, amount in deltas.items() if amount
+        ]
+        if not rows:
+            return 0
+        stmt = pg_insert(MonthlyGoalAllocation).values(rows)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=['user_id', 'goal_id', 'month'],
+            set_={
+                "allocated_amount": MonthlyGoalAllocation.allocated_amount + stmt.excluded.allocated_amount,
+                "updated_at": stmt.excluded.updated_at,
+            }
+        )
+        db.session.execute(stmt)
+        return len(rows)
+
+    @staticmethod
+    def replace_from_month(user_id, month, amounts):
+        """
+        Replace a user's allocations for `month` (YYYY-MM) and later: one DELETE and
+        one bulk INSERT. Does not commit; the caller owns the transaction.
+
+        Args:
+            amounts: dict of (goal_id, month) -> Decimal allocated_amount
+        """
+        MonthlyGoalAllocation.query.filter(
+            MonthlyGoalAllocation.user_id == user_id,
+            MonthlyGoalAllocation.month >= month
+        ).delete(synchronize_session=False)
+
+        now = datetime.now(timezone.utc)
+        rows = [
+            {
+                "allocation_id": uuid4(),
+                "user_id": user_id,
+                "goal_id": uuid.UUID(str(goal_id)),
+                "month": allocation_month,
+                "allocated_amount": amount,
+                "created_at": now,
+                "updated_at": now,
+                "is_finalized": False,
+                "is_deficit": False,
+            }
+            for (goal_id, allocation_month), amount in amounts.items() if amount
+        ]
+        if rows:
+            db.session.execute(pg_insert(MonthlyGoalAllocation).values(rows))
+        return len(rows)
+
     @staticmethod
     def record_deficit(user_id, month):
         """Record a deficit month where no allocations are made."""
@@ -688,28 +926,81 @@ class MonthlyGoalAllocation(db.Model):
         
     @staticmethod
     def finalize_monthly_allocations(month):
-        allocations = MonthlyGoalAllocation.query.filter_by(month=month, is_finalized=False).all()
-        if not allocations:
-            return None
+        """Finalize a month for every user (see app.helpers.finalization.finalize_month)."""
+        from app.helpers.finalization import finalize_month
         try:
-            for allocation in allocations:
-                goal = Goal.query.get(allocation.goal_id)
-                if goal:
-                    goal.current_amount += allocation.allocated_amount
-                    goal.funding_gap = Goal.calculate_funding_gap(goal.target_amount, goal.current_amount)
-                    if goal.funding_gap == 0:
-                        goal.is_completed = True
-                        goal.is_active = False
-                    db.session.add(goal)
-                allocation.is_finalized = True
-                db.session.add(allocation)
-            db.session.commit()
-            return [allocation.to_dict() for allocation in allocations]
+            return finalize_month(month)
         except Exception as e:
             db.session.rollback()
             current_app.logger.error(f"Error finalizing monthly allocations: {e}")
             return None
-        
+
+    @staticmethod
+    def get_unfinalized_user_ids(month, limit, after=None):
+        """Users with open allocations in a month, ordered by user_id, keyset-paginated by `after`."""
+        query = db.session.query(MonthlyGoalAllocation.user_id).filter(
+            MonthlyGoalAllocation.month == month,
+            MonthlyGoalAllocation.is_finalized.isnot(True)
+        )
+        if after:
+            query = query.filter(MonthlyGoalAllocation.user_id > after)
+        rows = query.distinct().order_by(MonthlyGoalAllocation.user_id).limit(limit).all()
+        return [row.user_id for row in rows]
+
+    @staticmethod
+    def count_unfinalized_users(month):
+        return db.session.query(func.count(func.distinct(MonthlyGoalAllocation.user_id))).filter(
+            MonthlyGoalAllocation.month == month,
+            MonthlyGoalAllocation.is_finalized.isnot(True)
+        ).scalar()
+
+    @staticmethod
+    def finalize_for_users(month, user_ids):
+        """
+        Finalize one month for a batch of users in a single statement: mark their
+        open allocations finalized and, with one UPDATE ... FROM over the goals they
+        belong to, complete goals whose stored current_amount reaches the target.
+        current_amount is not changed here: recalculations already credited every
+        allocation to it (Goal.apply_amount_deltas).
+        Does not commit; the caller owns the transaction.
+
+        Returns:
+            (allocations_finalized, goals_updated)
+        """
+        now = datetime.now(timezone.utc)
+        finalized = (
+            update(MonthlyGoalAllocation)
+            .where(
+                MonthlyGoalAllocation.month == month,
+                MonthlyGoalAllocation.user_id.in_(user_ids),
+                MonthlyGoalAllocation.is_finalized.isnot(True)
+            )
+            .values(is_finalized=True, updated_at=now)
+            .returning(MonthlyGoalAllocation.goal_id)
+            .cte("finalized")
+        )
+        per_goal = (
+            select(finalized.c.goal_id, func.count().label("allocations"))
+            .group_by(finalized.c.goal_id)
+            .subquery("per_goal")
+        )
+        current_amount = func.coalesce(Goal.current_amount, 0)
+        reached = current_amount >= Goal.target_amount
+        rows = db.session.execute(
+            update(Goal)
+            .where(Goal.goal_id == per_goal.c.goal_id)
+            .values(
+                funding_gap=func.greatest(Goal.target_amount - current_amount, 0),
+                is_completed=or_(Goal.is_completed, reached),
+                is_active=and_(Goal.is_active, not_(reached)),
+                completed_at=case((and_(reached, not_(Goal.is_completed)), now), else_=Goal.completed_at),
+                updated_at=now
+            )
+            .returning(per_goal.c.allocations)
+            .execution_options(synchronize_session=False)
+        ).all()
+        return sum(row.allocations for row in rows), len(rows)
+
     @staticmethod
     def get_allocations_by_month(month):
         """ Fetch all allocations for a specific month, grouped by goal."""
@@ -745,7 +1036,7 @@ class MonthlyGoalAllocation(db.Model):
     def get_allocations_by_user(user_id):
         """Fetch all allocations for a specific user, grouped by month."""
         allocations = MonthlyGoalAllocation.query.filter_by(user_id=user_id).all()
-        print(f"Allocations for user {user_id}: {allocations}")
+        current_app.logger.debug("Allocations for user %s: %s", user_id, allocations)
         if not allocations:
             return None
         result = {}
@@ -791,6 +1082,30 @@ class MonthlyGoalAllocation(db.Model):
             return True
         return False
     
+    @staticmethod
+    def month_totals_by_goal_query(user_id, month):
+        """SELECT goal_id, SUM(allocated_amount) AS allocated for one user's month, grouped by goal."""
+        return (
+            select(
+                MonthlyGoalAllocation.goal_id,
+                func.sum(MonthlyGoalAllocation.allocated_amount).label("allocated")
+            )
+            .where(MonthlyGoalAllocation.user_id == user_id, MonthlyGoalAllocation.month == month)
+            .group_by(MonthlyGoalAllocation.goal_id)
+        )
+
+    @staticmethod
+    def get_month_totals_by_goal(user_id, month):
+        """
+        Amount allocated to each of a user's goals in a month, in one grouped query
+        (served by ix_monthly_goal_allocations_user_month_goal). Sums are NUMERIC in SQL.
+
+        Returns:
+            dict of goal_id (str) -> Decimal; goals without allocations are absent
+        """
+        rows = db.session.execute(MonthlyGoalAllocation.month_totals_by_goal_query(user_id, month))
+        return {str(goal_id): allocated for goal_id, allocated in rows}
+
     @staticmethod
     def get_total_allocated_for_goal(goal_id, month):
         """Get the total amount allocated to a specific goal in a given month."""
@@ -1,5 +1,5 @@
 from psycopg2 import IntegrityError
-from app import db
+from app import db, password_hasher, user_context_cache
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.orm.exc import NoResultFound
 import uuid
@@ -8,15 +8,15 @@ from bcrypt import hashpw, gensalt, checkpw
 import hashlib
 from datetime import datetime, timezone
 from flask import current_app
-from sqlalchemy import DateTime as Datetime
+from sqlalchemy import DateTime as Datetime, event
+from sqlalchemy.orm import object_session
 from app import db
 from sqlalchemy.dialects.postgresql import UUID
 import uuid
 from datetime import datetime
 import traceback
-from app.models.central.central import Degree
+from app.models.central.central import Degree, Currency
 from uuid import uuid4
-from werkzeug.security import generate_password_hash, check_password_hash
 from decimal import Decimal
 
 
@@ -95,13 +95,29 @@ class User(db.Model):
     # Password helpers
     @staticmethod
     def set_password(user_password):
-        """Hashes the password and stores it."""
-        hashed_password = generate_password_hash(user_password)
+        """Returns the hash of a plain-text password (computed off the event loop, see PasswordHasher)."""
+        hashed_password = password_hasher.hash(user_password)
         return hashed_password
     
     def check_password(self, user_password) -> bool:
         """Verifies the given password against the stored hash."""
-        return check_password_hash(self.password, user_password)
+        return password_hasher.verify(self.password, user_password)
+
+    def rehash_password_if_needed(self, user_password):
+        """
+        After a successful check_password: store a new hash if the stored one was made
+        with other parameters than PASSWORD_HASH_METHOD. Returns True if rehashed.
+        """
+        if not password_hasher.needs_rehash(self.password):
+            return False
+        try:
+            self.password = User.set_password(user_password)
+            db.session.commit()
+            return True
+        except Exception as e:
+            db.session.rollback()
+            current_app.logger.error(f"Error rehashing password for user {self.user_id}: {e}")
+            return False
 
     @classmethod
     def get_user_by_email(cls, email):
@@ -109,7 +125,7 @@ class User(db.Model):
 
     @staticmethod
     def create_user(email, password, first_name, last_name, country_of_residence, currency):
-        """Create a user authenticated via the app"""
+        """Create a user authenticated via the app. `password` is the plain-text password."""
         hashed_pwd = User.set_password(password)
         try:
             user = User(
@@ -131,6 +147,41 @@ class User(db.Model):
     @staticmethod
     def get_user_by_id(user_id):
         return User.query.filter_by(user_id=user_id).first()
+
+    @staticmethod
+    def get_user_context(user_id):
+        """
+        The attributes most handlers need about a user, in one query: user_id, currency
+        code and id, financial profile id (None until the profile is created).
+        Returns None if the user doesn't exist.
+        """
+        row = db.session.query(
+            User.user_id,
+            User.currency.label("currency_code"),
+            Currency.id.label("currency_id"),
+            UserFinancialProfile.id.label("financial_profile_id")
+        ).outerjoin(Currency, Currency.code == User.currency) \
+         .outerjoin(UserFinancialProfile, UserFinancialProfile.user_id == User.user_id) \
+         .filter(User.user_id == user_id).first()
+        if row is None:
+            return None
+        return {
+            "user_id": str(row.user_id),
+            "currency_code": row.currency_code,
+            "currency_id": str(row.currency_id) if row.currency_id else None,
+            "financial_profile_id": str(row.financial_profile_id) if row.financial_profile_id else None,
+        }
+
+    @staticmethod
+    def get_cached_user_context(user_id):
+        """get_user_context() served from the user context cache. Values are strings (ids as str)."""
+        return user_context_cache.get_or_load("users", str(user_id), lambda: User.get_user_context(user_id))
+
+    @staticmethod
+    def invalidate_user_context(user_id):
+        """Drop the cached context after the user's currency or financial profile changed."""
+        user_context_cache.invalidate_key("users", str(user_id))
+
     @staticmethod
     def update_user(user_id, **kwargs):
         """Update user attributes dynamically."""
@@ -148,6 +199,8 @@ class User(db.Model):
                 setattr(user, key, value)
 
         db.session.commit()
+        if kwargs.get('currency') is not None:
+            User.invalidate_user_context(user_id)
         return user
 
     @staticmethod
@@ -290,6 +343,7 @@ class UserFinancialProfile(db.Model):
             )
             db.session.add(financial_profile)
             db.session.commit()
+            User.invalidate_user_context(user_id)
             return financial_profile
         except Exception as e:
             db.session.rollback()
@@ -304,6 +358,21 @@ class UserFinancialProfile(db.Model):
     @classmethod
     def get_financial_profile_by_user_id(cls, user_id):
         return cls.query.filter_by(user_id=user_id).first()
+
+    @classmethod
+    def get_financial_profile_for_update(cls, user_id):
+        """
+        Fetch the profile with SELECT ... FOR UPDATE, locking the row until the
+        current transaction ends. A concurrent caller blocks here and then reads
+        the snapshots the first one committed.
+        """
+        return cls.query.filter_by(user_id=user_id).with_for_update().populate_existing().first()
+
+    @staticmethod
+    def get_user_ids():
+        """user_id of every financial profile, in user_id order."""
+        rows = db.session.query(UserFinancialProfile.user_id).order_by(UserFinancialProfile.user_id).all()
+        return [row.user_id for row in rows]
     
 
     @staticmethod
@@ -489,4 +558,23 @@ class WaitlistUser(db.Model):
         
         db.session.delete(waitlist_user)
         db.session.commit()
-        return waitlist_user
\ No newline at end of file
+        return waitlist_user
+
+
+# Deleting a user or a financial profile, directly or through a cascade, drops the user's cached
+# context once the transaction commits (not before: a concurrent request could cache the old row again)
+@event.listens_for(User, "after_delete")
+@event.listens_for(UserFinancialProfile, "after_delete")
+def _queue_user_context_invalidation(mapper, connection, target):
+    object_session(target).info.setdefault("user_context_invalidations", set()).add(target.user_id)
+
+
+@event.listens_for(db.session, "after_commit")
+def _invalidate_user_contexts(session):
+    for user_id in session.info.pop("user_context_invalidations", ()):
+        User.invalidate_user_context(user_id)
+
+
+@event.listens_for(db.session, "after_soft_rollback")
+def _discard_user_context_invalidations(session, previous_transaction):
+    session.info.pop("user_context_invalidations", None)
@@ -0,0 +1,42 @@
+from flask import Blueprint, Response, current_app
+from app import db, query_profiler, reference_cache, log_queue_handler, redis_client, redis_guard
+from app.utils import db_pool, redis_pool
+from app.utils.access import metrics_forbidden
+
+metrics = Blueprint('metrics', __name__)
+
+
+def _reference_cache_lines():
+    lines = [
+        "# HELP app_reference_cache_lookups_total Reference cache lookups, by namespace and result.",
+        "# TYPE app_reference_cache_lookups_total counter",
+    ]
+    for namespace, counters in sorted(reference_cache.stats()["namespaces"].items()):
+        for result in ("local_hits", "redis_hits", "misses"):
+            lines.append(f'app_reference_cache_lookups_total{{namespace="{namespace}",result="{result}"}} {counters[result]}')
+    return lines
+
+
+def _logging_lines():
+    return [
+        "# HELP app_log_records_dropped_total Log records dropped because the log queue was full.",
+        "# TYPE app_log_records_dropped_total counter",
+        f"app_log_records_dropped_total {log_queue_handler.dropped_total}",
+    ]
+
+
+@metrics.route('/metrics', methods=['GET'])
+def get_metrics():
+    """
+    Per-endpoint request and SQL statistics for this worker process, in Prometheus text format.
+    Needs METRICS_TOKEN as a bearer token or an admin access token.
+    """
+    forbidden = metrics_forbidden()
+    if forbidden:
+        return forbidden
+    return Response(
+        query_profiler.prometheus(include_statements=current_app.config['METRICS_STATEMENT_LABELS'],
+                                  extra_lines=_reference_cache_lines() + _logging_lines() + db_pool.pool_lines(db.engine)
+                                      + redis_pool.pool_lines(redis_client, redis_guard)),
+        mimetype="text/plain; version=0.0.4"
+    )
@@ -0,0 +1,33 @@
+# utils/access.py
+import hmac
+from flask import request, jsonify, current_app
+from flask_jwt_extended import verify_jwt_in_request, get_jwt_identity
+
+
+def admin_forbidden():
+    """
+    403 response unless the request's JWT identity is an admin user, else None.
+    Call from a @jwt_required() view.
+    """
+    from app.models.client.users_model import User
+
+    user = User.get_user_by_id(get_jwt_identity())
+    if user is None or not user.is_admin:
+        return jsonify({"status": "error", "message": "Admin access required"}), 403
+    return None
+
+
+def metrics_forbidden():
+    """
+    401/403 response unless the request carries `Authorization: Bearer <METRICS_TOKEN>`
+    (for scrapers) or an admin access token, else None.
+    """
+    token = current_app.config['METRICS_TOKEN']
+    header = request.headers.get("Authorization", "")
+    if token and header.startswith("Bearer ") and hmac.compare_digest(header[7:].encode(), token.encode()):
+        return None
+    try:
+        verify_jwt_in_request()
+    except Exception:
+        return jsonify({"status": "error", "message": "Authentication required"}), 401
+    return admin_forbidden()
@@ -0,0 +1,97 @@
+# utils/db_pool.py
+import sys
+from sqlalchemy import text
+
+
+def engine_options(config):
+    """
+    SQLALCHEMY_ENGINE_OPTIONS built from the DB_* config keys (see app/__init__.py).
+
+    The pool is per worker process: with gunicorn -w 2, Postgres sees up to
+    2 * (DB_POOL_SIZE + DB_MAX_OVERFLOW) connections. Greenlets beyond that wait up
+    to DB_POOL_TIMEOUT seconds for a connection instead of opening new ones.
+    """
+    connect_args = {"connect_timeout": config["DB_CONNECT_TIMEOUT"]}
+    if config["DB_STATEMENT_TIMEOUT_MS"]:
+        # libpq startup option, understood by psycopg2 and psycopg 3 alike
+        connect_args["options"] = f"-c statement_timeout={config['DB_STATEMENT_TIMEOUT_MS']}"
+    return {
+        "pool_size": config["DB_POOL_SIZE"],
+        "max_overflow": config["DB_MAX_OVERFLOW"],
+        "pool_timeout": config["DB_POOL_TIMEOUT"],
+        "pool_recycle": config["DB_POOL_RECYCLE"],
+        "pool_pre_ping": config["DB_POOL_PRE_PING"],
+        "connect_args": connect_args,
+    }
+
+
+def gevent_patched():
+    """True when gevent has monkey-patched sockets (e.g. inside a gunicorn gevent worker)."""
+    if "gevent" not in sys.modules:
+        return False
+    from gevent import monkey
+    return monkey.is_module_patched("socket")
+
+
+def gevent_wait_callback(conn, timeout=None):
+    """
+    psycopg2 wait callback that yields to the gevent hub while a query is in flight
+    (same approach as psycogreen). Without it, libpq blocks the whole worker process
+    until the server answers, so one slow query stalls every greenlet in it.
+    """
+    from psycopg2 import OperationalError, extensions
+    from gevent.socket import wait_read, wait_write
+    while True:
+        state = conn.poll()
+        if state == extensions.POLL_OK:
+            break
+        elif state == extensions.POLL_READ:
+            wait_read(conn.fileno(), timeout=timeout)
+        elif state == extensions.POLL_WRITE:
+            wait_write(conn.fileno(), timeout=timeout)
+        else:
+            raise OperationalError(f"Bad result from poll: {state!r}")
+
+
+def configure_driver(database_uri, mode):
+    """
+    Make the database driver cooperative under gevent.
+
+    Args:
+        database_uri: SQLALCHEMY_DATABASE_URI; postgresql+psycopg:// selects psycopg 3,
+            which waits through the (patched) selectors module and needs no callback
+        mode: DB_GEVENT_WAIT_CALLBACK: "auto" installs the psycopg2 callback only when
+            gevent has patched sockets, "true" always, "false" never
+
+    Returns:
+        True if the psycopg2 wait callback was installed
+    """
+    if mode == "false" or database_uri.startswith("postgresql+psycopg:"):
+        return False
+    if mode == "auto" and not gevent_patched():
+        return False
+    from psycopg2 import extensions
+    extensions.set_wait_callback(gevent_wait_callback)
+    return True
+
+
+def disable_statement_timeout(session):
+    """Lift DB_STATEMENT_TIMEOUT_MS for the rest of the session's current transaction (maintenance jobs)."""
+    session.execute(text("SET LOCAL statement_timeout = 0"))
+
+
+def pool_lines(engine):
+    """Connection pool gauges for /metrics, in Prometheus text format."""
+    pool = engine.pool
+    if not hasattr(pool, "checkedout"):
+        return []
+    return [
+        "# HELP app_db_pool_connections Connections in this worker's pool, by state.",
+        "# TYPE app_db_pool_connections gauge",
+        f'app_db_pool_connections{{state="checked_out"}} {pool.checkedout()}',
+        f'app_db_pool_connections{{state="idle"}} {pool.checkedin()}',
+        f'app_db_pool_connections{{state="overflow"}} {max(pool.overflow(), 0)}',
+        "# HELP app_db_pool_size Configured pool size (DB_POOL_SIZE).",
+        "# TYPE app_db_pool_size gauge",
+        f"app_db_pool_size {pool.size()}",
+    ]
@@ -0,0 +1,76 @@
+# utils/idempotency.py
+
+import json
+from functools import wraps
+from flask import request, jsonify, current_app, make_response
+from redis.exceptions import RedisError
+
+IN_PROGRESS = "__in_progress__"
+TRANSIENT_STATUSES = (409, 429)  # not stored: a retry may succeed
+
+
+def idempotent(redis_client, ttl=86400, key_prefix="idem", lock_ttl=60):
+    """
+    Replay the stored response for requests that repeat an Idempotency-Key header.
+
+    The first request with a given key runs the view and its response (status and JSON
+    body) is kept in Redis for `ttl` seconds; retries get the same response back with an
+    Idempotent-Replayed: true header, without running the view again. A retry that
+    arrives while the first request is still running gets 409. 5xx, 409 and 429
+    responses are not stored, so the client can retry them. Requests without the
+    header run normally.
+
+    :param redis_client: Redis client instance for storing responses
+    :param ttl: Seconds to keep a stored response
+    :param key_prefix: Prefix for Redis keys to avoid collisions
+    :param lock_ttl: Seconds before an in-progress marker from a crashed request expires
+    """
+    def decorator(f):
+        @wraps(f)
+        def wrapper(*args, **kwargs):
+            idempotency_key = request.headers.get("Idempotency-Key")
+            if not idempotency_key:
+                return f(*args, **kwargs)
+
+            key = f"{key_prefix}:{request.method}:{request.path}:{idempotency_key}"
+            try:
+                claimed = redis_client.set(key, IN_PROGRESS, nx=True, ex=lock_ttl)
+                if not claimed:
+                    stored = redis_client.get(key)
+                    if stored is None:
+                        # Expired between the two calls; treat as a new request
+                        claimed = redis_client.set(key, IN_PROGRESS, nx=True, ex=lock_ttl)
+                    elif stored != IN_PROGRESS:
+                        cached = json.loads(stored)
+                        response = make_response(jsonify(cached["body"]), cached["status"])
+                        response.headers["Idempotent-Replayed"] = "true"
+                        return response
+                if not claimed:
+                    return jsonify({
+                        "status": "error",
+                        "message": "A request with this Idempotency-Key is still being processed."
+                    }), 409
+            except RedisError as e:
+                # Without Redis we can't deduplicate; run the request rather than fail it
+                current_app.logger.error(f"Idempotency store unavailable: {e}")
+                return f(*args, **kwargs)
+
+            try:
+                response = make_response(f(*args, **kwargs))
+            except Exception:
+                redis_client.delete(key)
+                raise
+
+            try:
+                if response.status_code in TRANSIENT_STATUSES or response.status_code >= 500 or not response.is_json:
+                    redis_client.delete(key)
+                else:
+                    redis_client.set(key, json.dumps({
+                        "status": response.status_code,
+                        "body": response.get_json()
+                    }), ex=ttl)
+            except RedisError as e:
+                current_app.logger.error(f"Could not store idempotent response for {key}: {e}")
+            return response
+        return wrapper
+    return decorator
@@ -0,0 +1,237 @@
+# utils/log_pipeline.py
+import atexit
+import json
+import logging
+import os
+import random
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler, TimedRotatingFileHandler
+from flask.logging import default_handler
+
+try:
+    from gevent.monkey import get_original
+except ImportError:  # gevent not installed: nothing is patched
+    import importlib
+
+    def get_original(module, name):
+        return getattr(importlib.import_module(module), name)
+
+
+def native(module, name):
+    """module.name as it was before gevent's monkey-patching (gunicorn's gevent worker), usable from OS threads."""
+    return get_original(module, name)
+
+
+def parse_mapping(raw):
+    """Parse "name=value,other=value" into a dict, ignoring blanks."""
+    mapping = {}
+    for item in (raw or "").split(","):
+        if "=" in item:
+            name, value = item.split("=", 1)
+            mapping[name.strip()] = value.strip()
+    return mapping
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line: timestamp, level, logger, message and source location."""
+
+    def format(self, record):
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+            "module": record.module,
+            "line": record.lineno,
+            "process": record.process,
+        }
+        if record.exc_info:
+            entry["exc_info"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Keep only a fraction of DEBUG/INFO records from chosen loggers.
+
+    Rates are matched on the longest logger-name prefix, e.g. {"app.alloc": 0.05}
+    keeps about 5% of records from app.alloc and its children. WARNING and above
+    are never sampled out.
+    """
+
+    def __init__(self, rates):
+        super().__init__()
+        self.rates = sorted(((name, float(rate)) for name, rate in rates.items()), key=lambda r: -len(r[0]))
+
+    def filter(self, record):
+        if record.levelno >= logging.WARNING or not self.rates:
+            return True
+        for name, rate in self.rates:
+            if record.name == name or record.name.startswith(name + "."):
+                return rate >= 1 or random.random() < rate
+        return True
+
+
+class BoundedQueueHandler(QueueHandler):
+    """
+    QueueHandler over a bounded queue that never blocks the caller: when the queue is
+    full the record is dropped and counted. The listener reports drops as a warning.
+
+    The queue and lock are the native (C) ones, shared safely between the request
+    greenlets and the listener's OS thread; the bound is checked with qsize() and may be
+    overshot by a few records under concurrent logging.
+    """
+
+    def __init__(self, maxsize):
+        super().__init__(native("queue", "SimpleQueue")())
+        self.maxsize = maxsize
+        self.dropped = 0  # since the listener last reported
+        self.dropped_total = 0
+        self._lock = native("_thread", "allocate_lock")()
+
+    def enqueue(self, record):
+        if self.queue.qsize() < self.maxsize:
+            self.queue.put_nowait(record)
+            return
+        with self._lock:
+            self.dropped += 1
+            self.dropped_total += 1
+
+    def take_dropped(self):
+        with self._lock:
+            dropped, self.dropped = self.dropped, 0
+        return dropped
+
+
+class _DropReporter(logging.Handler):
+    """Runs on the listener thread after each record and logs how many were dropped."""
+
+    def __init__(self, queue_handler, target):
+        super().__init__()
+        self.queue_handler = queue_handler
+        self.target = target
+
+    def emit(self, record):
+        dropped = self.queue_handler.take_dropped()
+        if dropped:
+            self.target.handle(logging.LogRecord(
+                "app.logging", logging.WARNING, __file__, 0,
+                "Log queue full: dropped %d record(s)", (dropped,), None
+            ))
+
+
+class _NativeThread:
+    """
+    The part of threading.Thread that QueueListener uses (start, join), on the unpatched
+    _thread module: under gevent a threading.Thread is a greenlet, and a listener
+    greenlet would do its file writes and rotation on the request hub.
+    """
+
+    def __init__(self, target):
+        self._target = target
+        self._done = native("_thread", "allocate_lock")()
+
+    def start(self):
+        self._done.acquire()
+        native("_thread", "start_new_thread")(self._run, ())
+
+    def _run(self):
+        try:
+            self._target()
+        finally:
+            self._done.release()
+
+    def join(self):
+        with self._done:
+            pass
+
+
+class NativeQueueListener(QueueListener):
+    """QueueListener that drains the queue on an OS thread, also under gevent."""
+
+    def start(self):
+        self._thread = _NativeThread(self._monitor)
+        self._thread.start()
+
+
+def _file_handler(config):
+    path = config["LOG_FILE"].format(pid=os.getpid())
+    if os.path.dirname(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+    when = config.get("LOG_ROTATE_WHEN")
+    if when:
+        return TimedRotatingFileHandler(path, when=when, backupCount=config["LOG_BACKUP_COUNT"], encoding="utf-8")
+    return RotatingFileHandler(
+        path, maxBytes=config["LOG_MAX_BYTES"], backupCount=config["LOG_BACKUP_COUNT"], encoding="utf-8"
+    )
+
+
+_pipeline = {}  # the running listener and what a forked child needs to start its own
+
+
+def _start_listener(queue_handler, config):
+    """Start a listener writing queue_handler's records to a new file handler (named for this process)."""
+    file_handler = _file_handler(config)
+    if config["LOG_FORMAT"] == "json":
+        file_handler.setFormatter(JsonFormatter())
+    else:
+        file_handler.setFormatter(logging.Formatter(
+            '%(asctime)s - %(name)s - %(levelname)s - %(message)s - [in %(pathname)s:%(lineno)d]'
+        ))
+    listener = NativeQueueListener(
+        queue_handler.queue, file_handler, _DropReporter(queue_handler, file_handler),
+        respect_handler_level=True
+    )
+    listener.start()
+    _pipeline.update(listener=listener, queue_handler=queue_handler, config=config)
+
+
+def _restart_in_child():
+    """
+    After fork (e.g. the `flask allocations replay` process pool) only the forking thread
+    survives, so the inherited listener is gone: give the child a fresh queue and its own
+    listener and file, instead of filling a queue nobody drains.
+    """
+    if not _pipeline:
+        return
+    queue_handler = _pipeline["queue_handler"]
+    queue_handler.queue = native("queue", "SimpleQueue")()
+    queue_handler._lock = native("_thread", "allocate_lock")()
+    queue_handler.dropped = queue_handler.dropped_total = 0
+    _start_listener(queue_handler, _pipeline["config"])
+
+
+def _stop_listener():
+    if _pipeline:
+        _pipeline["listener"].stop()
+
+
+atexit.register(_stop_listener)
+os.register_at_fork(after_in_child=_restart_in_child)
+
+
+def setup_logging(app):
+    """
+    Route app.logger (and its children, e.g. app.alloc) through a bounded queue to a
+    rotating file written by a listener on a native OS thread, so request code only enqueues.
+    Forked children restart the listener with their own file.
+
+    Config keys (see app/__init__.py): LOG_FILE, LOG_FORMAT ("json" or "text"),
+    LOG_MAX_BYTES, LOG_BACKUP_COUNT, LOG_ROTATE_WHEN, LOG_QUEUE_SIZE, LOG_LEVEL,
+    LOG_LEVELS ("app.alloc=WARNING,app.auth=INFO") and LOG_SAMPLING ("app.alloc=0.05").
+
+    Returns:
+        the BoundedQueueHandler (its `dropped_total` counter feeds /metrics)
+    """
+    config = app.config
+    queue_handler = BoundedQueueHandler(config["LOG_QUEUE_SIZE"])
+    queue_handler.addFilter(SamplingFilter(parse_mapping(config["LOG_SAMPLING"])))
+    _start_listener(queue_handler, config)
+
+    # Flask's stderr handler would write synchronously on the request greenlet
+    app.logger.removeHandler(default_handler)
+    app.logger.addHandler(queue_handler)
+    app.logger.setLevel(config["LOG_LEVEL"])
+    for name, level in parse_mapping(config["LOG_LEVELS"]).items():
+        logging.getLogger(name).setLevel(level.upper())
+    return queue_handler
@@ -0,0 +1,34 @@
+# utils/pagination.py
+import base64
+import json
+import uuid
+from datetime import datetime
+
+
+def encode_cursor(recorded_at, record_id):
+    """Encode a (recorded_at, record_id) keyset position as an opaque URL-safe string."""
+    payload = json.dumps([recorded_at.isoformat(), str(record_id)])
+    return base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii')
+
+
+def decode_cursor(cursor):
+    """
+    Decode a cursor produced by encode_cursor.
+
+    :raises ValueError: if the cursor is malformed
+    """
+    try:
+        recorded_at, record_id = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+        return datetime.fromisoformat(recorded_at), uuid.UUID(record_id)
+    except (TypeError, ValueError, UnicodeError) as e:
+        raise ValueError(f"Invalid cursor: {e}")
+
+
+def parse_page_size(value, default, maximum):
+    """Parse a ?limit= value, falling back to default and clamping to [1, maximum]."""
+    if value is None or value == "":
+        return default
+    size = int(value)
+    if size < 1:
+        raise ValueError("limit must be a positive integer")
+    return min(size, maximum)
@@ -0,0 +1,61 @@
+# utils/password_hashing.py
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from werkzeug.security import generate_password_hash, check_password_hash
+from app.utils.db_pool import gevent_patched
+
+
+class PasswordHasher:
+    """
+    Password hashing and verification on a bounded pool of native threads.
+
+    scrypt and PBKDF2 take tens of milliseconds of CPU and hashlib releases the GIL
+    while computing them, so running them on native threads keeps the calling
+    worker responsive: under gevent the calling greenlet yields to the hub while it
+    waits (gevent.threadpool), otherwise the calling thread blocks on a
+    ThreadPoolExecutor. `workers` also caps how many hashes run at once per process;
+    0 hashes inline on the calling thread.
+
+    Hashes use werkzeug's format, so existing hashes keep verifying; needs_rehash()
+    tells whether a stored hash was made with other parameters than `method`.
+    """
+
+    def __init__(self, method="scrypt", workers=4):
+        self.method = method
+        self.workers = workers
+        self._pool = None
+        self._pool_lock = threading.Lock()
+        self._method_prefix = None
+
+    def _run(self, fn, *args):
+        if self.workers <= 0:
+            return fn(*args)  # inline, on the calling thread (PASSWORD_HASH_WORKERS=0)
+        if self._pool is None:
+            with self._pool_lock:
+                if self._pool is None:
+                    # Created on first use, i.e. in the worker process after gevent has patched
+                    if gevent_patched():
+                        from gevent.threadpool import ThreadPool
+                        self._pool = ThreadPool(self.workers)
+                    else:
+                        self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="password-hash")
+        if isinstance(self._pool, ThreadPoolExecutor):
+            return self._pool.submit(fn, *args).result()
+        return self._pool.apply(fn, args)
+
+    def hash(self, password):
+        """Hash a password with the configured method."""
+        return self._run(generate_password_hash, password, self.method)
+
+    def verify(self, stored_hash, password):
+        """True if password matches stored_hash."""
+        if not stored_hash or password is None:
+            return False
+        return self._run(check_password_hash, stored_hash, password)
+
+    def needs_rehash(self, stored_hash):
+        """True if stored_hash was made with another method or other parameters than configured."""
+        if self._method_prefix is None:
+            # werkzeug fills in default parameters ("scrypt" -> "scrypt:32768:8:1"); hash once to learn them
+            self._method_prefix = self._run(generate_password_hash, "", self.method).split("$", 1)[0]
+        return stored_hash.split("$", 1)[0] != self._method_prefix
@@ -0,0 +1,188 @@
+# utils/query_profiler.py
+import json
+import re
+import threading
+import time
+from flask import g, has_request_context, request
+
+QUERY_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200)
+_WHITESPACE = re.compile(r"\s+")
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", " ")
+
+
+class QueryProfiler:
+    """
+    Per-request SQL statement counts and timings, aggregated per endpoint.
+
+    Cursor listeners (see on_before_execute / on_after_execute) add each statement's
+    duration to the current request's stats on flask.g; statements issued outside a
+    request are ignored. The request hooks in app/__init__.py call start() and
+    finish(), which folds the request into per-endpoint totals kept in this process.
+
+    Totals are per worker process: with several gunicorn workers, each one serves
+    its own /metrics and Prometheus should scrape them separately (or sum them).
+    """
+
+    def __init__(self, slowest=5, statement_chars=200):
+        self.slowest = slowest
+        self.statement_chars = statement_chars
+        self._endpoints = {}
+        self._lock = threading.Lock()
+
+    # --- cursor listeners -------------------------------------------------
+
+    def on_before_execute(self, conn, cursor, statement, parameters, context, executemany):
+        if context is not None and has_request_context() and "query_stats" in g:
+            context._profiler_started = time.perf_counter()
+
+    def on_after_execute(self, conn, cursor, statement, parameters, context, executemany):
+        started = getattr(context, "_profiler_started", None)
+        if started is None or not (has_request_context() and "query_stats" in g):
+            return
+        elapsed = time.perf_counter() - started
+        stats = g.query_stats
+        stats["queries"] += 1
+        stats["db_seconds"] += elapsed
+        if elapsed > stats["slowest_seconds"]:
+            stats["slowest_seconds"] = elapsed
+            stats["slowest_statement"] = statement
+
+    # --- request hooks ----------------------------------------------------
+
+    def start(self):
+        g.query_stats = {
+            "started": time.perf_counter(),
+            "queries": 0,
+            "db_seconds": 0.0,
+            "slowest_seconds": 0.0,
+            "slowest_statement": None,
+        }
+
+    def finish(self, response):
+        """Fold the current request into the endpoint totals; returns the request summary."""
+        stats = g.pop("query_stats", None)
+        if stats is None:
+            return None
+        endpoint = request.endpoint or "unmatched"
+        summary = {
+            "endpoint": endpoint,
+            "method": request.method,
+            "path": request.path,
+            "status": response.status_code,
+            "queries": stats["queries"],
+            "db_ms": round(stats["db_seconds"] * 1000, 3),
+            "duration_ms": round((time.perf_counter() - stats["started"]) * 1000, 3),
+            "slowest_ms": round(stats["slowest_seconds"] * 1000, 3),
+            "slowest_statement": self._normalize(stats["slowest_statement"]),
+        }
+
+        with self._lock:
+            totals = self._endpoints.setdefault(endpoint, {
+                "requests": {},
+                "queries": 0,
+                "db_seconds": 0.0,
+                "request_seconds": 0.0,
+                "max_queries": 0,
+                "buckets": [0] * len(QUERY_BUCKETS),
+                "slowest": [],
+            })
+            key = (request.method, response.status_code)
+            totals["requests"][key] = totals["requests"].get(key, 0) + 1
+            totals["queries"] += stats["queries"]
+            totals["db_seconds"] += stats["db_seconds"]
+            totals["request_seconds"] += summary["duration_ms"] / 1000
+            totals["max_queries"] = max(totals["max_queries"], stats["queries"])
+            for index, bound in enumerate(QUERY_BUCKETS):
+                if stats["queries"] <= bound:
+                    totals["buckets"][index] += 1
+            statement = summary["slowest_statement"]
+            if statement:
+                slowest = {text: seconds for seconds, text in totals["slowest"]}
+                slowest[statement] = max(slowest.get(statement, 0.0), stats["slowest_seconds"])
+                totals["slowest"] = sorted(((seconds, text) for text, seconds in slowest.items()), reverse=True)[:self.slowest]
+        return summary
+
+    def _normalize(self, statement):
+        if not statement:
+            return None
+        return _WHITESPACE.sub(" ", statement).strip()[:self.statement_chars]
+
+    # --- reporting --------------------------------------------------------
+
+    def snapshot(self):
+        """Copy of the per-endpoint totals."""
+        with self._lock:
+            return {
+                endpoint: dict(totals, requests=dict(totals["requests"]), buckets=list(totals["buckets"]),
+                               slowest=list(totals["slowest"]))
+                for endpoint, totals in self._endpoints.items()
+            }
+
+    def prometheus(self, extra_lines=(), include_statements=False):
+        """
+        Totals in the Prometheus text exposition format (version 0.0.4). The slowest
+        statements' text is only exported as a label with include_statements; otherwise
+        each endpoint reports its slowest statement time alone.
+        """
+        endpoints = self.snapshot()
+        lines = [
+            "# HELP app_http_requests_total Requests served, by endpoint, method and status.",
+            "# TYPE app_http_requests_total counter",
+        ]
+        for endpoint, totals in sorted(endpoints.items()):
+            for (method, status), count in sorted(totals["requests"].items()):
+                lines.append(
+                    f'app_http_requests_total{{endpoint="{_escape(endpoint)}",method="{method}",status="{status}"}} {count}'
+                )
+
+        def per_endpoint(name, kind, help_text, value):
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            for endpoint, totals in sorted(endpoints.items()):
+                lines.append(f'{name}{{endpoint="{_escape(endpoint)}"}} {value(totals)}')
+
+        per_endpoint("app_db_queries_total", "counter", "SQL statements issued while serving requests.",
+                     lambda t: t["queries"])
+        per_endpoint("app_db_query_seconds_total", "counter", "Time spent in SQL statements while serving requests.",
+                     lambda t: round(t["db_seconds"], 6))
+        per_endpoint("app_request_seconds_total", "counter", "Wall time spent serving requests.",
+                     lambda t: round(t["request_seconds"], 6))
+        per_endpoint("app_db_queries_per_request_max", "gauge", "Most SQL statements issued by one request.",
+                     lambda t: t["max_queries"])
+
+        lines.append("# HELP app_db_queries_per_request SQL statements per request.")
+        lines.append("# TYPE app_db_queries_per_request histogram")
+        for endpoint, totals in sorted(endpoints.items()):
+            label = _escape(endpoint)
+            count = sum(totals["requests"].values())
+            for bound, bucket in zip(QUERY_BUCKETS, totals["buckets"]):
+                lines.append(f'app_db_queries_per_request_bucket{{endpoint="{label}",le="{bound}"}} {bucket}')
+            lines.append(f'app_db_queries_per_request_bucket{{endpoint="{label}",le="+Inf"}} {count}')
+            lines.append(f'app_db_queries_per_request_sum{{endpoint="{label}"}} {totals["queries"]}')
+            lines.append(f'app_db_queries_per_request_count{{endpoint="{label}"}} {count}')
+
+        lines.append("# HELP app_db_slowest_statement_seconds Slowest statements seen per endpoint.")
+        lines.append("# TYPE app_db_slowest_statement_seconds gauge")
+        for endpoint, totals in sorted(endpoints.items()):
+            if not include_statements:
+                if totals["slowest"]:
+                    lines.append(
+                        f'app_db_slowest_statement_seconds{{endpoint="{_escape(endpoint)}"}} {round(totals["slowest"][0][0], 6)}'
+                    )
+                continue
+            for seconds, statement in totals["slowest"]:
+                lines.append(
+                    f'app_db_slowest_statement_seconds{{endpoint="{_escape(endpoint)}",statement="{_escape(statement)}"}} '
+                    f'{round(seconds, 6)}'
+                )
+
+        lines.extend(extra_lines)
+        return "\n".join(lines) + "\n"
+
+    @staticmethod
+    def log_line(summary):
+        """A request summary as a one-line JSON log message."""
+        return "[queries] " + json.dumps(summary, default=str, separators=(",", ":"))
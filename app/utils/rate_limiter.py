@@ -1,38 +1,220 @@
 # utils/rate_limiter.py
 
+import ipaddress
+import math
+import threading
+import time
+from collections import OrderedDict, namedtuple
 from functools import wraps
-from flask import request, jsonify
+from flask import request, jsonify, current_app, make_response
+from flask_jwt_extended import verify_jwt_in_request, get_jwt_identity
 
-def rate_limiter(redis_client, limit=5, window=10, key_prefix="rl"):
+# KEYS: bucket. ARGV: capacity, tokens refilled per millisecond, tokens already spent locally
+# Refill, debit and TTL in one round trip, timed by the Redis clock so workers agree on it.
+# Returns {allowed, tokens left (floored), ms until the next token if refused, ms until full}
+TOKEN_BUCKET = """
+local capacity = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local spent = tonumber(ARGV[3])
+local now = redis.call('time')
+now = tonumber(now[1]) * 1000 + math.floor(tonumber(now[2]) / 1000)
+local bucket = redis.call('hmget', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(bucket[1]) or capacity
+local ts = tonumber(bucket[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - ts) * rate)
+tokens = math.max(0, tokens - spent)
+local allowed = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+    allowed = 1
+end
+local full_in = math.ceil((capacity - tokens) / rate)
+redis.call('hset', KEYS[1], 'tokens', tostring(tokens), 'ts', now)
+redis.call('pexpire', KEYS[1], full_in + 1000)
+local retry_in = 0
+if allowed == 0 then
+    retry_in = math.ceil((1 - tokens) / rate)
+end
+return {allowed, math.floor(tokens), retry_in, full_in}
+"""
+
+RateLimitResult = namedtuple("RateLimitResult", "allowed remaining retry_after reset")
+
+
+def _from_proxy(addr):
+    """Whether the peer is on a loopback or private network, i.e. can be our own reverse proxy."""
+    try:
+        address = ipaddress.ip_address(addr or "")
+    except ValueError:
+        return False
+    return address.is_loopback or address.is_private
+
+
+def client_ip():
+    """
+    The caller's address. Behind RATE_LIMIT_TRUSTED_PROXIES proxies that each append to
+    X-Forwarded-For, it is the entry that many hops from the right; entries further
+    left are client-supplied and ignored. X-Forwarded-For is only read when the peer
+    is a loopback or private address, so a caller reaching the app directly cannot
+    pick its own bucket.
+    """
+    trusted = current_app.config['RATE_LIMIT_TRUSTED_PROXIES']
+    if trusted and _from_proxy(request.remote_addr):
+        forwarded = [addr.strip() for addr in request.headers.get("X-Forwarded-For", "").split(",") if addr.strip()]
+        if len(forwarded) >= trusted:
+            return forwarded[-trusted]
+    return request.remote_addr
+
+
+def jwt_subject():
+    """JWT identity of the caller if the request carries a valid token, else None."""
+    try:
+        # The signature is what matters for keying; revocation is checked by the view itself
+        verify_jwt_in_request(optional=True, skip_revocation_check=True)
+        return get_jwt_identity()
+    except Exception:
+        return None
+
+
+def rate_limit_identity(parts):
+    """
+    Key identifying the caller, from the parts named in `parts`:
+      "ip"    client_ip()
+      "user"  the JWT subject, or the client IP for anonymous callers
+      "route" the endpoint, so one caller gets a separate budget per route
+    """
+    values = []
+    for part in parts:
+        if part == "ip":
+            values.append(client_ip())
+        elif part == "user":
+            subject = jwt_subject()
+            values.append(f"user:{subject}" if subject else f"ip:{client_ip()}")
+        elif part == "route":
+            values.append(request.endpoint or request.path)
+        else:
+            raise ValueError(f"Unknown rate limit key part: {part}")
+    return ":".join(str(value) for value in values)
+
+
+class TokenBucketLimiter:
     """
-    Docstring for rate_limiter
-    
-    :param redis_client: Redis client instance for storing request counts
+    Token bucket of `limit` tokens refilled evenly over `window` seconds, one bucket per
+    key in Redis (a hash of tokens and last refill time, expiring once full).
+
+    - Each check is one Lua call: refill, debit and TTL change together, so there is no
+      window where a key exists without a TTL.
+    - Pre-check: after Redis reports a bucket with more than `headroom` of its capacity
+      left, this process answers further requests for that key itself for up to
+      `local_ttl` seconds, as long as that share stays untouched. The tokens it spent
+      are debited in Redis on the next call. Processes can overshoot the limit by what
+      they spend locally before that call, so with headroom h and W processes a
+      caller may get up to (W - 1) * (1 - h) * limit extra requests per refill period.
+    - While Redis is unreachable (see RedisGuard) each process keeps its own buckets.
+    """
+
+    def __init__(self, redis_guard, limit, window, local_maxsize=10000):
+        self.guard = redis_guard
+        self.limit = limit
+        self.window = window
+        self.rate = limit / (window * 1000.0)  # tokens per millisecond
+        self.local_maxsize = local_maxsize
+        self._precheck = OrderedDict()  # key -> [expires_at, remaining reported by Redis, spent locally since]
+        self._fallback = OrderedDict()  # key -> [tokens, last refill (monotonic ms)]
+        self._lock = threading.Lock()
+        self._script = redis_guard.client.register_script(TOKEN_BUCKET)
+
+    def take(self, key, headroom=0.5, local_ttl=1.0):
+        """Spend one token from key's bucket. Returns a RateLimitResult (times in seconds)."""
+        now = time.monotonic()
+        spent = 0
+        with self._lock:
+            entry = self._precheck.pop(key, None)
+            if entry:
+                if entry[0] > now and entry[1] - entry[2] - 1 >= self.limit * headroom:
+                    entry[2] += 1
+                    self._precheck[key] = entry
+                    remaining = entry[1] - entry[2]
+                    return RateLimitResult(True, remaining, 0, self._seconds((self.limit - remaining) / self.rate))
+                spent = entry[2]
+
+        allowed, remaining, retry_in, full_in = self.guard.run(
+            lambda client: [int(value) for value in self._script(
+                keys=[key], args=[self.limit, self.rate, spent], client=client
+            )],
+            lambda: self._local_take(key, spent)
+        )
+        if local_ttl and allowed:
+            with self._lock:
+                self._precheck[key] = [now + local_ttl, remaining, 0]
+                while len(self._precheck) > self.local_maxsize:
+                    self._precheck.popitem(last=False)
+        return RateLimitResult(bool(allowed), remaining, self._seconds(retry_in), self._seconds(full_in))
+
+    def _local_take(self, key, spent):
+        """The Lua script's arithmetic on a per-process bucket."""
+        now = time.monotonic() * 1000
+        with self._lock:
+            tokens, ts = self._fallback.pop(key, (self.limit, now))
+            tokens = min(self.limit, tokens + max(0, now - ts) * self.rate)
+            tokens = max(0, tokens - spent)
+            allowed = tokens >= 1
+            if allowed:
+                tokens -= 1
+            self._fallback[key] = (tokens, now)
+            while len(self._fallback) > self.local_maxsize:
+                self._fallback.popitem(last=False)
+        retry_in = 0 if allowed else math.ceil((1 - tokens) / self.rate)
+        return int(allowed), math.floor(tokens), retry_in, math.ceil((self.limit - tokens) / self.rate)
+
+    @staticmethod
+    def _seconds(ms):
+        return math.ceil(ms / 1000)
+
+
+def rate_limiter(redis_guard, limit=5, window=10, key_prefix="rl", key=("ip",)):
+    """
+    Allow `limit` requests per caller in any `window` seconds (a token bucket, so a burst
+    of `limit` followed by one request every window / limit seconds). Responses carry
+    RateLimit-Limit, RateLimit-Remaining, RateLimit-Reset and RateLimit-Policy headers;
+    refused requests get 429 with Retry-After. RATE_LIMIT_ENABLED=false turns it off.
+
+    :param redis_guard: RedisGuard wrapping the Redis client that stores the buckets
     :param limit: Maximum number of requests allowed within the window
     :param window: Time window in seconds for rate limiting
     :param key_prefix: Prefix for Redis keys to avoid collisions
+    :param key: parts identifying the caller, see rate_limit_identity()
     """
+    limiter = TokenBucketLimiter(redis_guard, limit, window)
+
     def decorator(f):
         @wraps(f)
         def wrapper(*args, **kwargs):
-            ip = request.remote_addr
-            key = f"{key_prefix}:{ip}"
-
-            current = redis_client.incr(key)
-
-            if current == 1:
-                redis_client.expire(key, window)
+            if not current_app.config['RATE_LIMIT_ENABLED'] or request.method == "OPTIONS":
+                return f(*args, **kwargs)
 
-            if current > limit:
-                return jsonify({
-                    "message": f"Too many requests, please try after {window} seconds.",
+            result = limiter.take(
+                f"{key_prefix}:{rate_limit_identity(key)}",
+                headroom=current_app.config['RATE_LIMIT_LOCAL_HEADROOM'],
+                local_ttl=current_app.config['RATE_LIMIT_LOCAL_TTL']
+            )
+            if result.allowed:
+                response = make_response(f(*args, **kwargs))
+            else:
+                response = make_response(jsonify({
+                    "message": f"Too many requests, please try after {result.retry_after} seconds.",
                     "status": "error"
-                }), 429
+                }), 429)
+                response.headers["Retry-After"] = str(result.retry_after)
 
-            return f(*args, **kwargs)
+            response.headers["RateLimit-Limit"] = str(limit)
+            response.headers["RateLimit-Remaining"] = str(max(0, result.remaining))
+            response.headers["RateLimit-Reset"] = str(result.reset)
+            response.headers["RateLimit-Policy"] = f"{limit};w={window}"
+            return response
         return wrapper
     return decorator
 # Example usage:
 # @app.route('/some_endpoint')
-# @rate_limiter(redis_client, limit=10, window=60)
-# def some_endpoint():
\ No newline at end of file
+# @rate_limiter(redis_guard, limit=10, window=60, key=("user", "route"))
+# def some_endpoint():
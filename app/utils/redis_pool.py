@@ -0,0 +1,124 @@
+# utils/redis_pool.py
+import logging
+import threading
+import time
+from redis import BlockingConnectionPool, Redis
+from redis.backoff import ExponentialWithJitterBackoff
+from redis.exceptions import ConnectionError as RedisConnectionError, TimeoutError as RedisTimeoutError
+from redis.retry import Retry
+
+redis_log = logging.getLogger("app.redis")
+
+
+def create_redis_client(config, socket_timeout=None, max_connections=None):
+    """
+    Redis client over a BlockingConnectionPool built from the REDIS_* config keys.
+
+    Callers wait up to REDIS_POOL_TIMEOUT seconds for a free connection instead of
+    opening unbounded ones; every command is bounded by REDIS_SOCKET_TIMEOUT and
+    retried REDIS_RETRIES times with jittered exponential backoff on connection
+    errors and timeouts. Idle connections are health-checked (PING) before reuse.
+
+    Args:
+        socket_timeout: override for clients issuing blocking commands (BRPOP), whose
+            reads legitimately last longer than REDIS_SOCKET_TIMEOUT
+        max_connections: override for REDIS_MAX_CONNECTIONS
+    """
+    pool = BlockingConnectionPool(
+        host=config["REDIS_HOST"],
+        port=config["REDIS_PORT"],
+        db=config["REDIS_DB"],
+        decode_responses=True,
+        max_connections=max_connections or config["REDIS_MAX_CONNECTIONS"],
+        timeout=config["REDIS_POOL_TIMEOUT"],
+        socket_timeout=socket_timeout or config["REDIS_SOCKET_TIMEOUT"],
+        socket_connect_timeout=config["REDIS_CONNECT_TIMEOUT"],
+        health_check_interval=config["REDIS_HEALTH_CHECK_INTERVAL"],
+        retry=Retry(ExponentialWithJitterBackoff(cap=config["REDIS_RETRY_BACKOFF_CAP"]), config["REDIS_RETRIES"]),
+    )
+    return Redis(connection_pool=pool)
+
+
+def with_ttl(client, key, ttl, command, *args, **kwargs):
+    """
+    Run `command` on key and set its TTL in one round trip (MULTI/EXEC pipeline).
+    E.g. with_ttl(redis_client, key, 3600, "hset", mapping=state).
+
+    Returns:
+        the command's reply
+    """
+    pipe = client.pipeline()
+    getattr(pipe, command)(key, *args, **kwargs)
+    pipe.expire(key, ttl)
+    return pipe.execute()[0]
+
+
+class RedisGuard:
+    """
+    Redis operations with an in-process fallback for when Redis is down.
+
+    After a connection error or timeout, Redis is skipped for `cooldown` seconds and
+    the fallback answers instead, so an outage costs each worker one timeout per
+    cooldown rather than one per request. Fallbacks answer from per-process state, so
+    they only suit data that may be approximate for a while (e.g. rate-limit buckets).
+    Other errors (bad commands, script errors) are raised as usual.
+    """
+
+    def __init__(self, client, cooldown=5.0):
+        self.client = client
+        self.cooldown = cooldown
+        self.errors = 0
+        self.fallbacks = 0
+        self._down_until = 0.0
+        self._lock = threading.Lock()
+
+    @property
+    def available(self):
+        """False while Redis is being skipped after a failure."""
+        return time.monotonic() >= self._down_until
+
+    def run(self, operation, fallback):
+        """Return operation(client), or fallback() if Redis is unreachable or in cooldown."""
+        if self.available:
+            try:
+                return operation(self.client)
+            except (RedisConnectionError, RedisTimeoutError) as e:
+                self._down_until = time.monotonic() + self.cooldown
+                with self._lock:
+                    self.errors += 1
+                redis_log.warning("Redis unavailable, using local fallback for %ss: %s", self.cooldown, e)
+        with self._lock:
+            self.fallbacks += 1
+        return fallback()
+
+
+def pool_stats(client):
+    """Connection counts of a client's BlockingConnectionPool."""
+    pool = client.connection_pool
+    created = len(getattr(pool, "_connections", []))
+    idle = sum(1 for connection in list(getattr(pool, "pool").queue) if connection is not None) \
+        if hasattr(pool, "pool") else 0
+    return {"max": pool.max_connections, "created": created, "in_use": created - idle, "idle": idle}
+
+
+def pool_lines(client, guard):
+    """Redis pool utilization and fallback counters for /metrics, in Prometheus text format."""
+    stats = pool_stats(client)
+    return [
+        "# HELP app_redis_pool_connections Connections in this worker's Redis pool, by state.",
+        "# TYPE app_redis_pool_connections gauge",
+        f'app_redis_pool_connections{{state="in_use"}} {stats["in_use"]}',
+        f'app_redis_pool_connections{{state="idle"}} {stats["idle"]}',
+        "# HELP app_redis_pool_max_connections Configured pool limit (REDIS_MAX_CONNECTIONS).",
+        "# TYPE app_redis_pool_max_connections gauge",
+        f"app_redis_pool_max_connections {stats['max']}",
+        "# HELP app_redis_errors_total Redis connection errors and timeouts that opened the fallback.",
+        "# TYPE app_redis_errors_total counter",
+        f"app_redis_errors_total {guard.errors}",
+        "# HELP app_redis_fallbacks_total Operations answered by the local fallback.",
+        "# TYPE app_redis_fallbacks_total counter",
+        f"app_redis_fallbacks_total {guard.fallbacks}",
+        "# HELP app_redis_available 1 unless Redis is being skipped after a failure.",
+        "# TYPE app_redis_available gauge",
+        f"app_redis_available {int(guard.available)}",
+    ]
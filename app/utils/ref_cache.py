@@ -0,0 +1,156 @@
+# utils/ref_cache.py
+import json
+import threading
+import time
+from collections import OrderedDict
+from flask import current_app
+from redis.exceptions import RedisError
+
+
+class ReferenceCache:
+    """
+    Two-level cache for rarely changing reference data (categories, currencies,
+    goal priorities and statuses).
+
+    - Level 1 is an in-process LRU with a short TTL.
+    - Level 2 is Redis, shared by all workers. Keys embed a per-namespace version;
+      invalidate() bumps the version, so every worker stops reading the old keys
+      as soon as its local entries (and local copy of the version) expire.
+
+    Values must be JSON-serializable dicts; each hit returns a fresh copy so callers
+    can't mutate the cached value. Misses (None) are never cached. If Redis is
+    unavailable the cache degrades to the local level plus the loader.
+    """
+
+    def __init__(self, redis_client, maxsize=1024, ttl=60, redis_ttl=3600, prefix="refcache"):
+        self.redis = redis_client
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.redis_ttl = redis_ttl
+        self.prefix = prefix
+        self._local = OrderedDict()  # (namespace, key) -> (expires_at, raw json)
+        self._versions = {}  # namespace -> (expires_at, version)
+        self._counters = {}  # namespace -> {"local_hits", "redis_hits", "misses"}
+        self._lock = threading.Lock()
+
+    def _count(self, namespace, counter):
+        with self._lock:
+            counters = self._counters.setdefault(namespace, {"local_hits": 0, "redis_hits": 0, "misses": 0})
+            counters[counter] += 1
+
+    def _version_key(self, namespace):
+        return f"{self.prefix}:{namespace}:version"
+
+    def _version(self, namespace):
+        now = time.monotonic()
+        cached = self._versions.get(namespace)
+        if cached and cached[0] > now:
+            return cached[1]
+        try:
+            version = int(self.redis.get(self._version_key(namespace)) or 0)
+        except RedisError as e:
+            current_app.logger.warning(f"Reference cache: could not read version for {namespace}: {e}")
+            return None
+        self._versions[namespace] = (now + self.ttl, version)
+        return version
+
+    def _local_get(self, local_key):
+        with self._lock:
+            entry = self._local.get(local_key)
+            if not entry:
+                return None
+            if entry[0] <= time.monotonic():
+                del self._local[local_key]
+                return None
+            self._local.move_to_end(local_key)
+            return entry[1]
+
+    def _local_set(self, local_key, raw):
+        with self._lock:
+            self._local[local_key] = (time.monotonic() + self.ttl, raw)
+            self._local.move_to_end(local_key)
+            while len(self._local) > self.maxsize:
+                self._local.popitem(last=False)
+
+    def get_or_load(self, namespace, key, loader):
+        """
+        Return the cached value for (namespace, key), calling loader() on a miss.
+
+        :param namespace: group of keys invalidated together, e.g. "categories"
+        :param key: lookup key within the namespace (normalize before calling)
+        :param loader: zero-argument callable returning a JSON-serializable dict or None
+        """
+        local_key = (namespace, key)
+        raw = self._local_get(local_key)
+        if raw is not None:
+            self._count(namespace, "local_hits")
+            return json.loads(raw)
+
+        version = self._version(namespace)
+        redis_key = f"{self.prefix}:{namespace}:v{version}:{key}"
+        if version is not None:
+            try:
+                raw = self.redis.get(redis_key)
+            except RedisError as e:
+                current_app.logger.warning(f"Reference cache: Redis read failed for {redis_key}: {e}")
+                version = None
+            if raw is not None:
+                self._count(namespace, "redis_hits")
+                self._local_set(local_key, raw)
+                return json.loads(raw)
+
+        self._count(namespace, "misses")
+        value = loader()
+        if value is None:
+            return None
+
+        raw = json.dumps(value, default=str)
+        self._local_set(local_key, raw)
+        if version is not None:
+            try:
+                self.redis.setex(redis_key, self.redis_ttl, raw)
+            except RedisError as e:
+                current_app.logger.warning(f"Reference cache: Redis write failed for {redis_key}: {e}")
+        return json.loads(raw)
+
+    def invalidate(self, *namespaces):
+        """Drop every entry in the given namespaces, locally and (via a version bump) in all workers."""
+        with self._lock:
+            for local_key in [k for k in self._local if k[0] in namespaces]:
+                del self._local[local_key]
+            for namespace in namespaces:
+                self._versions.pop(namespace, None)
+        for namespace in namespaces:
+            try:
+                self.redis.incr(self._version_key(namespace))
+            except RedisError as e:
+                current_app.logger.warning(f"Reference cache: could not bump version for {namespace}: {e}")
+
+    def invalidate_key(self, namespace, key):
+        """
+        Drop one entry: locally and in Redis. Other workers may serve their local copy
+        until it expires (at most `ttl` seconds).
+        """
+        with self._lock:
+            self._local.pop((namespace, key), None)
+        version = self._version(namespace)
+        if version is None:
+            return
+        try:
+            self.redis.delete(f"{self.prefix}:{namespace}:v{version}:{key}")
+        except RedisError as e:
+            current_app.logger.warning(f"Reference cache: could not delete {namespace}:{key}: {e}")
+
+    def stats(self):
+        """Per-namespace hit counters and hit rate for this process."""
+        with self._lock:
+            namespaces = {}
+            for namespace, counters in self._counters.items():
+                lookups = sum(counters.values())
+                hits = counters["local_hits"] + counters["redis_hits"]
+                namespaces[namespace] = dict(
+                    counters,
+                    lookups=lookups,
+                    hit_rate=round(hits / lookups, 4) if lookups else 0.0
+                )
+            return {"namespaces": namespaces, "local_entries": len(self._local)}
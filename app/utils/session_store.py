@@ -0,0 +1,121 @@
+# utils/session_store.py
+
+# KEYS: session key, user's session set. ARGV: user_id, ttl, jti, session key prefix, max tracked
+_CREATE = """
+redis.call('set', KEYS[1], ARGV[1], 'EX', ARGV[2])
+redis.call('sadd', KEYS[2], ARGV[3])
+redis.call('expire', KEYS[2], ARGV[2])
+if redis.call('scard', KEYS[2]) > tonumber(ARGV[5]) then
+    for _, jti in ipairs(redis.call('smembers', KEYS[2])) do
+        if redis.call('exists', ARGV[4] .. jti) == 0 then
+            redis.call('srem', KEYS[2], jti)
+        end
+    end
+end
+return 1
+"""
+
+# KEYS: old session key, new session key, user's session set. ARGV: user_id, ttl, old jti, new jti
+# Replaces the old session with the new one only if the old one is still live and belongs to
+# the user, atomically: the user's session set loses the old jti and gains the new one in the same
+# step, so it never lists a rotated-out token nor misses the new one. Returns 0 (nothing changed)
+# when the old session was already used, revoked or expired
+_ROTATE = """
+if redis.call('get', KEYS[1]) ~= ARGV[1] then
+    return 0
+end
+redis.call('del', KEYS[1])
+redis.call('srem', KEYS[3], ARGV[3])
+redis.call('set', KEYS[2], ARGV[1], 'EX', ARGV[2])
+redis.call('sadd', KEYS[3], ARGV[4])
+redis.call('expire', KEYS[3], ARGV[2])
+return 1
+"""
+
+# KEYS: session key. ARGV: user set prefix, jti
+_REVOKE = """
+local user_id = redis.call('get', KEYS[1])
+if not user_id then
+    return 0
+end
+redis.call('del', KEYS[1])
+redis.call('srem', ARGV[1] .. user_id, ARGV[2])
+return 1
+"""
+
+# KEYS: user's session set. ARGV: session key prefix
+# Deletes every session of the user and the set itself with one DEL
+_REVOKE_ALL = """
+local keys = {KEYS[1]}
+for _, jti in ipairs(redis.call('smembers', KEYS[1])) do
+    keys[#keys + 1] = ARGV[1] .. jti
+end
+return redis.call('del', unpack(keys))
+"""
+
+
+class SessionStore:
+    """
+    Refresh-token sessions in Redis, one per login (so one per device).
+
+    - session:<jti> holds the user_id and expires with the refresh token
+      (JWT_REFRESH_TOKEN_EXPIRES); a token is valid while its key exists, so the
+      revocation check in the JWT blocklist loader is a single EXISTS.
+    - sessions:<user_id> is the set of the user's session ids, used to log out
+      everywhere; entries whose session expired are pruned once the set grows
+      past max_tracked.
+    - Access tokens carry the id of the session they were issued for in a "sid"
+      claim, so revoking a session also rejects its access tokens.
+
+    Every multi-key change is one Lua script, so a session is never half created,
+    rotated or revoked.
+    """
+
+    def __init__(self, redis_guard, ttl, prefix="session", max_tracked=50):
+        self.guard = redis_guard
+        self.ttl = ttl
+        self.session_prefix = f"{prefix}:"
+        self.user_prefix = f"{prefix}s:"
+        self.max_tracked = max_tracked
+        client = redis_guard.client
+        self._create = client.register_script(_CREATE)
+        self._rotate = client.register_script(_ROTATE)
+        self._revoke = client.register_script(_REVOKE)
+        self._revoke_all = client.register_script(_REVOKE_ALL)
+
+    def create(self, user_id, jti):
+        """Start a session for a newly issued refresh token."""
+        user_id = str(user_id)
+        self._create(
+            keys=[self.session_prefix + jti, self.user_prefix + user_id],
+            args=[user_id, self.ttl, jti, self.session_prefix, self.max_tracked]
+        )
+
+    def rotate(self, user_id, old_jti, new_jti):
+        """
+        Replace session old_jti by new_jti. Returns False if old_jti was already
+        rotated or revoked, so of two refreshes racing with one token only one wins.
+        """
+        user_id = str(user_id)
+        return bool(self._rotate(
+            keys=[self.session_prefix + old_jti, self.session_prefix + new_jti, self.user_prefix + user_id],
+            args=[user_id, self.ttl, old_jti, new_jti]
+        ))
+
+    def is_active(self, jti, when_unavailable=False):
+        """
+        True if the session exists. While Redis is unreachable, returns when_unavailable
+        (see RedisGuard) instead of raising.
+        """
+        return self.guard.run(
+            lambda client: client.exists(self.session_prefix + jti) == 1,
+            lambda: when_unavailable
+        )
+
+    def revoke(self, jti):
+        """End one session. Returns True if it existed."""
+        return bool(self._revoke(keys=[self.session_prefix + jti], args=[self.user_prefix, jti]))
+
+    def revoke_all(self, user_id):
+        """End every session of a user. Returns the number of keys deleted (sessions plus the set)."""
+        return int(self._revoke_all(keys=[self.user_prefix + str(user_id)], args=[self.session_prefix]))
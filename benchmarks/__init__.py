@@ -0,0 +1,5 @@
+"""
+    Benchmarks for the allocation hot paths.
+    These scripts write to the database configured in SQLALCHEMY_DATABASE_URI,
+    so point them at a scratch database, never at production.
+"""
@@ -0,0 +1,118 @@
+"""
+Throughput of the surplus split: the Decimal allocation path (plan_recalculation,
+one user at a time) against the integer-cent NumPy allocator
+(app.helpers.allocation_vectorized, all users in one pass), on random portfolios.
+
+Cent-level parity between the two is checked by tests/test_allocation_parity.py;
+this script only times them.
+
+The engine modules are imported without running app/__init__.py, so no database,
+Redis or app configuration is needed; only NumPy is required.
+
+Usage:
+    python -m benchmarks.allocation_split_throughput --cases 2000 --max-goals 300 --seed 1
+"""
+import argparse
+import json
+import random
+import sys
+import time
+import types
+from decimal import Decimal
+from pathlib import Path
+
+
+def _register_bare_packages():
+    """Make `app` and `app.helpers` importable as plain packages, skipping app/__init__.py (the Flask app)."""
+    app_dir = Path(__file__).resolve().parent.parent / "app"
+    for name, path in (("app", app_dir), ("app.helpers", app_dir / "helpers")):
+        if name not in sys.modules:
+            package = types.ModuleType(name)
+            package.__path__ = [str(path)]
+            sys.modules[name] = package
+
+
+_register_bare_packages()
+
+from app.helpers import allocation_engine, allocation_vectorized  # noqa: E402
+from app.helpers.allocation_engine import AllocationGoal, plan_recalculation  # noqa: E402
+
+ZERO_BALANCES = {
+    "savings_balance": Decimal("0.00"),
+    "deficit_balance": Decimal("0.00"),
+    "total_income_snapshot": Decimal("0.00"),
+    "total_expense_snapshot": Decimal("0.00"),
+    "include_savings_in_alloc": False,
+}
+
+
+def random_amount(rng, high):
+    """Amounts as the API hands them to the engine: floats with at most two decimals."""
+    return round(rng.uniform(0, high), rng.choice([0, 1, 2]))
+
+
+def random_portfolio(rng, max_goals):
+    goals = []
+    for i in range(rng.randint(0, max_goals)):
+        target = random_amount(rng, 50000) or 1.0
+        current = random_amount(rng, target * 1.2)  # some goals are already overfunded
+        percentage = rng.choice([0, 0, -5, rng.randint(1, 100), rng.randint(1, 100), rng.randint(1, 100)])
+        goals.append(AllocationGoal(
+            goal_id=f"g{i}",
+            title=f"Goal {i}",
+            target_amount=target,
+            current_amount=current,
+            priority_percentage=float(percentage),
+            status="completed" if rng.random() < 0.05 else None,
+            is_locked=rng.random() < 0.05,
+        ))
+    available = Decimal(str(random_amount(rng, 100000) or 0.01))
+    return available, goals
+
+
+def decimal_path(available, goals):
+    """The engine's Decimal split alone (vectorized split turned off)."""
+    allocation_engine.VECTORIZE_MIN_GOALS = float("inf")
+    return plan_recalculation(ZERO_BALANCES, {"total_income": available, "total_expense": 0}, goals)
+
+
+def run(cases, max_goals, seed):
+    rng = random.Random(seed)
+    portfolios = [random_portfolio(rng, max_goals) for _ in range(cases)]
+
+    started = time.perf_counter()
+    for available, goals in portfolios:
+        decimal_path(available, goals)
+    decimal_seconds = time.perf_counter() - started
+
+    started = time.perf_counter()
+    batch = allocation_vectorized.build_batch(portfolios)
+    build_seconds = time.perf_counter() - started
+    started = time.perf_counter()
+    allocation_vectorized.allocate_surplus_batch(*batch)
+    batch_seconds = time.perf_counter() - started
+    offsets = batch[1]
+
+    return {
+        "cases": cases,
+        "goals": int(offsets[-1]),
+        "seed": seed,
+        "decimal_seconds": round(decimal_seconds, 4),
+        "batch_build_seconds": round(build_seconds, 4),
+        "batch_allocate_seconds": round(batch_seconds, 4),
+        "speedup": round(decimal_seconds / (build_seconds + batch_seconds), 1),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--cases", type=int, default=1000)
+    parser.add_argument("--max-goals", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+
+    if not allocation_vectorized.available():
+        sys.exit("NumPy is not installed")
+    seed = args.seed if args.seed is not None else random.randrange(2 ** 32)
+    report = run(args.cases, args.max_goals, seed)
+    print(json.dumps(report, indent=2))
@@ -0,0 +1,122 @@
+"""
+Concurrency check for allocation recalculation.
+
+Records one income for a fresh user, then fires N recalculations for that user in
+parallel and checks the money was allocated exactly once:
+
+    savings_balance + sum(this month's goal allocations) == income
+    total_income_snapshot == income
+
+Modes:
+    service  call recalculate_user() directly from N threads, bypassing the Redis
+             lock, so only the SELECT ... FOR UPDATE on the profile serializes them
+    http     POST /api/v1/allocations/recalculate/<user_id> from N threads
+    idem     like http, all requests sharing one Idempotency-Key
+
+Usage (scratch database and Redis only):
+    python -m benchmarks.concurrency_check --mode service --parallel 20
+"""
+import argparse
+import json
+import sys
+import threading
+import uuid
+from collections import Counter
+from datetime import datetime, timezone
+from decimal import Decimal
+from app import app, db
+from app.helpers.allocation_service import recalculate_user
+from app.models.client.financial import FinancialRecord
+from app.models.client.goal import MonthlyGoalAllocation
+from app.models.client.users_model import UserFinancialProfile
+from benchmarks.seed import ensure_reference_data, seed_user
+
+INCOME = Decimal("1234.56")
+
+
+def fire(parallel, call):
+    """Start `parallel` threads on call() together; return their results."""
+    barrier = threading.Barrier(parallel)
+    results = [None] * parallel
+
+    def worker(i):
+        barrier.wait()
+        results[i] = call()
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(parallel)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+
+def run(mode, parallel, goal_count):
+    with app.app_context():
+        categories = ensure_reference_data()
+        user_id = seed_user(goal_count=goal_count, prefix="concurrency")
+        now = datetime.now(timezone.utc)
+        FinancialRecord.create_record(
+            user_id=user_id,
+            category_id=categories["Salary"],
+            amount=INCOME,
+            recorded_at=now,
+            expected_transaction=False
+        )
+        db.session.remove()
+
+    client = app.test_client()
+    idempotency_key = uuid.uuid4().hex
+
+    def call():
+        if mode == "service":
+            with app.app_context():
+                body, status_code = recalculate_user(user_id)
+                db.session.remove()
+                return status_code, body.get("status"), False
+        headers = {"Idempotency-Key": idempotency_key} if mode == "idem" else {}
+        response = client.post(f"/api/v1/allocations/recalculate/{user_id}", headers=headers)
+        replayed = response.headers.get("Idempotent-Replayed") == "true"
+        return response.status_code, response.get_json().get("status"), replayed
+
+    results = fire(parallel, call)
+
+    with app.app_context():
+        profile = UserFinancialProfile.get_financial_profile_by_user_id(user_id)
+        allocated = db.session.query(db.func.coalesce(db.func.sum(MonthlyGoalAllocation.allocated_amount), 0)).filter(
+            MonthlyGoalAllocation.user_id == user_id,
+            MonthlyGoalAllocation.month == now.strftime("%Y-%m")
+        ).scalar()
+        savings = profile.savings_balance or Decimal("0.00")
+        snapshot = profile.total_income_snapshot or Decimal("0.00")
+
+    outcomes = Counter(f"{status_code}:{status}{':replayed' if replayed else ''}" for status_code, status, replayed in results)
+    failures = []
+    if savings + allocated != INCOME:
+        failures.append(f"savings ({savings}) + allocated ({allocated}) != income ({INCOME})")
+    if snapshot != INCOME:
+        failures.append(f"total_income_snapshot ({snapshot}) != income ({INCOME})")
+    if any(status_code >= 500 for status_code, _, _ in results):
+        failures.append("server errors")
+
+    return {
+        "mode": mode,
+        "parallel": parallel,
+        "user_id": str(user_id),
+        "outcomes": dict(outcomes),
+        "savings_balance": float(savings),
+        "allocated": float(allocated),
+        "failures": failures,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--mode", choices=["service", "http", "idem"], default="service")
+    parser.add_argument("--parallel", type=int, default=20)
+    parser.add_argument("--goals", type=int, default=5)
+    args = parser.parse_args()
+
+    report = run(args.mode, args.parallel, args.goals)
+    print(json.dumps(report, indent=2))
+    sys.exit(1 if report["failures"] else 0)
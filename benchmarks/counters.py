@@ -0,0 +1,27 @@
+"""
+Engine event counters shared by the benchmark scripts.
+"""
+from sqlalchemy import event
+
+
+class StatementCounter:
+    """Counts statements and commits issued on the engine while enabled."""
+
+    def __init__(self, engine):
+        self.enabled = False
+        self.statements = 0
+        self.commits = 0
+        event.listen(engine, "before_cursor_execute", self._on_execute)
+        event.listen(engine, "commit", self._on_commit)
+
+    def _on_execute(self, *args):
+        if self.enabled:
+            self.statements += 1
+
+    def _on_commit(self, *args):
+        if self.enabled:
+            self.commits += 1
+
+    def reset(self):
+        self.statements = 0
+        self.commits = 0
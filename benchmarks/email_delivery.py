@@ -0,0 +1,131 @@
+"""
+Email delivery throughput against the local stub email service (benchmarks.email_stub_server),
+before and after the outbox worker (see app.helpers.send_email).
+
+    before  one requests.post per message, one after the other, each on a fresh
+            connection -- how the waitlist handler used to send, holding the request
+            open for the whole call
+    after   the worker's delivery path: batches of EMAIL_BATCH_SIZE posted by
+            EMAIL_DELIVERY_CONCURRENCY threads over one pooled requests.Session
+
+By default no database is needed: the messages are built in memory and only the
+delivery is timed. With --outbox (scratch database only) the messages are queued with
+send_email() and `after` runs the real worker (run_email_worker(burst=True)), including
+claiming and recording the outcomes; the enqueue time is what a handler now waits.
+
+Usage:
+    python -m benchmarks.email_delivery --messages 500 --latency-ms 50
+    python -m benchmarks.email_delivery --messages 500 --latency-ms 50 --failure-rate 0.05 --outbox
+"""
+import argparse
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+import requests
+from app import app
+from app.helpers.send_email import create_email_session, deliver, send_email, run_email_worker
+from benchmarks.email_stub_server import start_stub_server
+from benchmarks.recalculation import percentile
+
+
+def make_messages(count):
+    return [
+        {"id": i, "recipient": f"bench-{i}@example.com", "subject": "Please verify your email address",
+         "body": "<p>Verify: https://example.com/verify-email?token=bench</p>", "attempts": 1}
+        for i in range(count)
+    ]
+
+
+def summarize(label, elapsed, latencies, outcomes, server, connections_before):
+    return {
+        "mode": label,
+        "messages": len(latencies) if latencies else sum(outcomes.values()),
+        "elapsed_seconds": round(elapsed, 3),
+        "messages_per_second": round(sum(outcomes.values()) / elapsed, 2),
+        "latency_ms": {
+            "p50": round(percentile(latencies, 50), 3),
+            "p99": round(percentile(latencies, 99), 3),
+        } if latencies else None,
+        "outcomes": outcomes,
+        "connections_opened": server.stats()["connections"] - connections_before,
+    }
+
+
+def run_before(url, messages, server):
+    connections = server.stats()["connections"]
+    latencies, outcomes = [], {}
+    started = time.perf_counter()
+    for message in messages:
+        sent_at = time.perf_counter()
+        response = requests.post(url, json={
+            "subject": message["subject"], "recipients": message["recipient"], "body": message["body"]
+        })
+        latencies.append((time.perf_counter() - sent_at) * 1000)
+        outcome = "sent" if response.status_code == 200 else "failed"
+        outcomes[outcome] = outcomes.get(outcome, 0) + 1
+    return summarize("sequential requests.post", time.perf_counter() - started, latencies, outcomes, server, connections)
+
+
+def run_after(url, messages, server, batch_size, concurrency):
+    connections = server.stats()["connections"]
+    timeout = (app.config["EMAIL_CONNECT_TIMEOUT"], app.config["EMAIL_READ_TIMEOUT"])
+    session = create_email_session(concurrency)
+    latencies, outcomes = [], {}
+
+    def timed_deliver(message):
+        sent_at = time.perf_counter()
+        outcome, _ = deliver(session, url, message, timeout)
+        return outcome, (time.perf_counter() - sent_at) * 1000
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        for offset in range(0, len(messages), batch_size):
+            for outcome, latency in executor.map(timed_deliver, messages[offset:offset + batch_size]):
+                latencies.append(latency)
+                outcomes[outcome] = outcomes.get(outcome, 0) + 1
+    elapsed = time.perf_counter() - started
+    session.close()
+    return summarize("pooled session, batched", elapsed, latencies, outcomes, server, connections)
+
+
+def run_outbox(url, messages, server):
+    connections = server.stats()["connections"]
+    app.config["EMAIL_SERVICE_URL"] = url
+    with app.app_context():
+        started = time.perf_counter()
+        for message in messages:
+            send_email(message["recipient"], message["subject"], message["body"])
+        enqueue_ms = (time.perf_counter() - started) * 1000 / len(messages)
+
+        started = time.perf_counter()
+        totals = run_email_worker(burst=True)
+        elapsed = time.perf_counter() - started
+    outcomes = {key: totals[key] for key in ("sent", "retried", "dead")}
+    result = summarize("outbox worker", elapsed, [], outcomes, server, connections)
+    result["enqueue_ms_per_message"] = round(enqueue_ms, 3)
+    return result
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--messages", type=int, default=500)
+    parser.add_argument("--latency-ms", type=int, default=50, help="Stub email service latency per request")
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="Share of requests the stub answers with 503")
+    parser.add_argument("--outbox", action="store_true", help="Queue through the outbox table and run the worker")
+    args = parser.parse_args()
+
+    server, url = start_stub_server(latency_ms=args.latency_ms, failure_rate=args.failure_rate)
+    messages = make_messages(args.messages)
+    batch_size = app.config["EMAIL_BATCH_SIZE"]
+    concurrency = app.config["EMAIL_DELIVERY_CONCURRENCY"]
+
+    before = run_before(url, messages, server)
+    after = run_outbox(url, messages, server) if args.outbox else run_after(url, messages, server, batch_size, concurrency)
+    server.shutdown()
+
+    print(json.dumps({
+        "parameters": dict(vars(args), batch_size=batch_size, concurrency=concurrency),
+        "before": before,
+        "after": after,
+        "throughput_ratio": round(after["messages_per_second"] / before["messages_per_second"], 2),
+    }, indent=2, sort_keys=True))
@@ -0,0 +1,102 @@
+"""
+Local stand-in for the email service, to exercise and benchmark email delivery offline.
+
+Accepts POST <any path> with the JSON body the worker sends ({subject, recipients, body})
+and answers 200 after --latency-ms, or 503 for a --failure-rate share of requests.
+Speaks HTTP/1.1 with keep-alive, one thread per connection. GET /stats returns the
+counters: requests, failures, connections opened.
+
+Usage:
+    python -m benchmarks.email_stub_server --port 8025 --latency-ms 50 --failure-rate 0.05
+    NETPIPO_EMAIL_URL=http://127.0.0.1:8025/send flask email worker
+"""
+import argparse
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class StubEmailHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def setup(self):
+        super().setup()
+        self.server.count("connections")
+
+    def _reply(self, status, payload):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path == "/stats":
+            self._reply(200, self.server.stats())
+        else:
+            self._reply(404, {"error": "not found"})
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        try:
+            message = json.loads(self.rfile.read(length) or b"{}")
+        except ValueError:
+            self._reply(400, {"error": "invalid JSON"})
+            return
+        if not message.get("recipients"):
+            self._reply(400, {"error": "recipients is required"})
+            return
+        time.sleep(self.server.latency)
+        self.server.count("requests")
+        if random.random() < self.server.failure_rate:
+            self.server.count("failures")
+            self._reply(503, {"error": "stub failure"})
+            return
+        self._reply(200, {"status": "sent"})
+
+    def log_message(self, format, *args):
+        pass
+
+
+class StubEmailServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, latency_ms=0, failure_rate=0.0):
+        super().__init__(address, StubEmailHandler)
+        self.latency = latency_ms / 1000
+        self.failure_rate = failure_rate
+        self._counters = {"requests": 0, "failures": 0, "connections": 0}
+        self._lock = threading.Lock()
+
+    def count(self, counter):
+        with self._lock:
+            self._counters[counter] += 1
+
+    def stats(self):
+        with self._lock:
+            return dict(self._counters)
+
+
+def start_stub_server(port=0, latency_ms=0, failure_rate=0.0):
+    """Serve in a background thread. Returns (server, url to post to)."""
+    server = StubEmailServer(("127.0.0.1", port), latency_ms=latency_ms, failure_rate=failure_rate)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}/send"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=8025)
+    parser.add_argument("--latency-ms", type=int, default=50, help="Time taken by every request")
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="Share of requests answered with 503")
+    args = parser.parse_args()
+
+    server = StubEmailServer(("127.0.0.1", args.port), latency_ms=args.latency_ms, failure_rate=args.failure_rate)
+    print(f"Stub email service on http://127.0.0.1:{args.port}/send", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print(json.dumps(server.stats()))
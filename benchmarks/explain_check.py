@@ -0,0 +1,92 @@
+"""
+EXPLAIN regression check for the financial_records month queries.
+
+Seeds a dataset, runs the real model methods, captures the SQL they send and
+EXPLAINs each statement. Exits non-zero if any of them plans a sequential scan
+on financial_records, e.g. after a predicate stops matching the indexes.
+
+Usage (scratch database only):
+    python -m benchmarks.explain_check --users 200 --months 24 --per-month 20
+"""
+import argparse
+import json
+import sys
+from datetime import datetime, timezone
+from sqlalchemy import event, text
+from app import app, db
+from app.models.client.financial import FinancialRecord
+from benchmarks.seed import ensure_reference_data, seed_user, seed_records
+
+CHECKED_TABLE = "financial_records"
+
+
+def capture_statements(engine, func):
+    """Run func() and return the (statement, parameters) pairs it executed."""
+    captured = []
+
+    def on_execute(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith("SELECT"):
+            captured.append((statement, parameters))
+
+    event.listen(engine, "before_cursor_execute", on_execute)
+    try:
+        func()
+    finally:
+        event.remove(engine, "before_cursor_execute", on_execute)
+    return captured
+
+
+def seq_scans(plan_node):
+    """Yield relation names scanned sequentially anywhere in an EXPLAIN JSON plan."""
+    if plan_node.get("Node Type") == "Seq Scan":
+        yield plan_node.get("Relation Name")
+    for child in plan_node.get("Plans", []):
+        yield from seq_scans(child)
+
+
+def run(users, months, per_month):
+    with app.app_context():
+        categories = ensure_reference_data()
+        user_ids = [seed_user(goal_count=0) for _ in range(users)]
+        for user_id in user_ids:
+            seed_records(user_id, categories, months=months, per_month=per_month)
+        db.session.execute(text(f"ANALYZE {CHECKED_TABLE}"))
+        db.session.commit()
+
+        now = datetime.now(timezone.utc)
+        target = user_ids[len(user_ids) // 2]
+        queries = {
+            "get_monthly_summary_totals": lambda: FinancialRecord.get_monthly_summary_totals(target, now.year, now.month),
+            "get_records_by_user_and_month": lambda: FinancialRecord.get_records_by_user_and_month(target, now.year, now.month),
+            "get_monthly_summary_list": lambda: FinancialRecord.get_monthly_summary_list(target, now.year, now.month),
+        }
+
+        report, failures = {}, []
+        for name, call in queries.items():
+            statements = capture_statements(db.engine, call)
+            plans = []
+            for statement, parameters in statements:
+                if CHECKED_TABLE not in statement:
+                    continue
+                with db.engine.connect() as conn:
+                    raw = conn.exec_driver_sql(f"EXPLAIN (FORMAT JSON) {statement}", parameters).scalar()
+                plan = (raw if isinstance(raw, list) else json.loads(raw))[0]["Plan"]
+                scanned = [rel for rel in seq_scans(plan) if rel == CHECKED_TABLE]
+                plans.append({"node": plan["Node Type"], "seq_scans": scanned})
+                if scanned:
+                    failures.append(name)
+            report[name] = plans
+
+    return report, failures
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--months", type=int, default=24)
+    parser.add_argument("--per-month", type=int, default=20)
+    args = parser.parse_args()
+
+    report, failures = run(args.users, args.months, args.per_month)
+    print(json.dumps({"plans": report, "failures": failures}, indent=2))
+    sys.exit(1 if failures else 0)
@@ -0,0 +1,140 @@
+"""
+Login throughput under concurrency inside one gevent worker, with password hashing
+inline (PASSWORD_HASH_WORKERS=0, how login used to run) and on the native thread
+pool (PASSWORD_HASH_WORKERS from the environment, app default otherwise).
+
+Each run happens in a fresh gevent-patched process, like a gunicorn gevent worker:
+--concurrency greenlets send --requests POST /api/v1/auth/login for seeded users,
+while a heartbeat greenlet wakes every 10ms and records how late it was -- the time
+other requests on the worker would have stalled.
+
+With --hash-only no database is needed: the greenlets call
+PasswordHasher.verify() directly instead of logging in.
+
+Usage (scratch database only, unless --hash-only):
+    python -m benchmarks.login_throughput --users 20 --concurrency 50 --requests 400
+    python -m benchmarks.login_throughput --hash-only --concurrency 50 --requests 400
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+PASSWORD = "bench-password-1"
+HEARTBEAT_SECONDS = 0.01
+
+
+def seed(users):
+    # app is imported here, not at module level: the measured processes must
+    # monkey-patch before the app is loaded
+    from app import app
+    from benchmarks.seed import seed_dataset
+    with app.app_context():
+        _, accounts = seed_dataset(users, 1, 1, 1, PASSWORD, prefix="login")
+    return [email for _, email in accounts]
+
+
+def workload(emails, concurrency, requests, hash_only):
+    """Run in a gevent-patched process; returns the measurements as a dict."""
+    from gevent import monkey
+    monkey.patch_all()
+    import gevent
+    from gevent.pool import Pool
+    from app import app, password_hasher
+    from benchmarks.recalculation import percentile
+
+    client = app.test_client()
+    stored_hash = password_hasher.hash(PASSWORD)
+    latencies, status_codes, lags = [], {}, []
+    running = [True]
+
+    def send(i):
+        started = time.perf_counter()
+        if hash_only:
+            status = 200 if password_hasher.verify(stored_hash, PASSWORD) else 401
+        else:
+            response = client.post("/api/v1/auth/login", json={"email": emails[i % len(emails)], "password": PASSWORD})
+            response.get_data()
+            status = response.status_code
+        latencies.append((time.perf_counter() - started) * 1000)
+        status_codes[status] = status_codes.get(status, 0) + 1
+
+    def heartbeat():
+        while running[0]:
+            started = time.perf_counter()
+            gevent.sleep(HEARTBEAT_SECONDS)
+            lags.append((time.perf_counter() - started - HEARTBEAT_SECONDS) * 1000)
+
+    beat = gevent.spawn(heartbeat)
+    started = time.perf_counter()
+    Pool(concurrency).map(send, range(requests))
+    elapsed = time.perf_counter() - started
+    running[0] = False
+    beat.join()
+
+    return {
+        "hash_method": app.config["PASSWORD_HASH_METHOD"],
+        "hash_workers": app.config["PASSWORD_HASH_WORKERS"],
+        "requests": requests,
+        "elapsed_seconds": round(elapsed, 3),
+        "requests_per_second": round(requests / elapsed, 2),
+        "latency_ms": {
+            "p50": round(percentile(latencies, 50), 3),
+            "p99": round(percentile(latencies, 99), 3),
+            "max": round(max(latencies), 3),
+        },
+        "event_loop_lag_ms": {
+            "p50": round(percentile(lags, 50), 3) if lags else None,
+            "max": round(max(lags), 3) if lags else None,
+        },
+        "status_codes": {str(code): count for code, count in sorted(status_codes.items())},
+    }
+
+
+def run_child(label, overrides, emails_file, args):
+    env = dict(os.environ, **overrides)
+    command = [
+        sys.executable, "-m", "benchmarks.login_throughput", "--child", emails_file,
+        "--concurrency", str(args.concurrency), "--requests", str(args.requests),
+    ]
+    if args.hash_only:
+        command.append("--hash-only")
+    result = subprocess.run(command, env=env, capture_output=True, text=True)
+    if result.returncode:
+        sys.stderr.write(result.stderr)
+        raise SystemExit(f"{label} run failed")
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--concurrency", type=int, default=50, help="Greenlets sending logins")
+    parser.add_argument("--requests", type=int, default=400)
+    parser.add_argument("--hash-only", action="store_true", help="Time PasswordHasher.verify alone (no database)")
+    parser.add_argument("--child", metavar="EMAILS_FILE", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        with open(args.child) as f:
+            emails = json.load(f)
+        print(json.dumps(workload(emails, args.concurrency, args.requests, args.hash_only), sort_keys=True))
+        sys.exit(0)
+
+    with tempfile.NamedTemporaryFile("w", suffix=".json", delete=False) as f:
+        json.dump([] if args.hash_only else seed(args.users), f)
+    try:
+        before = run_child("before", {"PASSWORD_HASH_WORKERS": "0"}, f.name, args)
+        after = run_child("after", {}, f.name, args)
+    finally:
+        os.unlink(f.name)
+
+    print(json.dumps({
+        "parameters": {key: value for key, value in vars(args).items() if key != "child"},
+        "before": before,
+        "after": after,
+        "throughput_ratio": round(after["requests_per_second"] / before["requests_per_second"], 2),
+    }, indent=2, sort_keys=True))
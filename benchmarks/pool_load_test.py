@@ -0,0 +1,158 @@
+"""
+Concurrent-request throughput inside one gevent worker, before and after the
+database pool / driver tuning (see app.utils.db_pool).
+
+Seeds --users users, then runs the same workload twice, each time in a fresh
+gevent-patched process (like a gunicorn gevent worker):
+
+    before  SQLAlchemy's default pool (5 + 10 overflow), no gevent wait callback,
+            no statement timeout -- the settings the app used to run with
+    after   the DB_* settings from the environment (app defaults otherwise)
+
+The workload is --requests GET requests (monthly records and allocations of the
+seeded users) sent by --concurrency greenlets through the Flask test client, while
+--slow greenlets keep running `SELECT pg_sleep(--slow-ms)` to stand in for slow
+report queries. Without the wait callback each of those blocks the whole process.
+
+Usage (scratch database only):
+    python -m benchmarks.pool_load_test --users 50 --concurrency 200 --requests 2000 --slow 4 --slow-ms 250
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+BEFORE = {
+    "DB_POOL_SIZE": "5",
+    "DB_MAX_OVERFLOW": "10",
+    "DB_POOL_TIMEOUT": "30",
+    "DB_POOL_PRE_PING": "false",
+    "DB_STATEMENT_TIMEOUT_MS": "0",
+    "DB_GEVENT_WAIT_CALLBACK": "false",
+}
+
+
+def seed(users):
+    # app is imported here, not at module level: the workload processes must
+    # monkey-patch before the app (and psycopg2) is loaded
+    from app import app
+    from benchmarks.seed import seed_dataset
+    with app.app_context():
+        _, accounts = seed_dataset(users, 3, 10, 3, "pool-load-1", prefix="pool")
+    return [str(user_id) for user_id, _ in accounts]
+
+
+def workload(user_ids, concurrency, requests, slow, slow_ms):
+    """Run in a gevent-patched process; returns the measurements as a dict."""
+    from gevent import monkey
+    monkey.patch_all()
+    import gevent
+    from gevent.pool import Pool
+    from datetime import datetime, timezone
+    from sqlalchemy import text
+    from app import app, db, db_wait_callback
+    from benchmarks.recalculation import percentile
+
+    client = app.test_client()
+    month = datetime.now(timezone.utc).strftime("%Y-%m")
+    latencies, status_codes, errors = [], {}, []
+    slow_queries = [0]
+    running = [True]
+
+    def send(i):
+        user_id = user_ids[i % len(user_ids)]
+        path = (f"/api/v1/financial_records/monthly_records/{user_id}/{month}" if i % 2
+                else f"/api/v1/allocations/user/{user_id}")
+        started = time.perf_counter()
+        try:
+            response = client.get(path)
+            response.get_data()
+            status_codes[response.status_code] = status_codes.get(response.status_code, 0) + 1
+        except Exception as exc:
+            errors.append(type(exc).__name__)
+        latencies.append((time.perf_counter() - started) * 1000)
+
+    def slow_report():
+        while running[0]:
+            with app.app_context():
+                try:
+                    db.session.execute(text("SELECT pg_sleep(:seconds)"), {"seconds": slow_ms / 1000})
+                    slow_queries[0] += 1
+                except Exception as exc:
+                    errors.append(type(exc).__name__)
+                finally:
+                    db.session.remove()
+
+    slow_greenlets = [gevent.spawn(slow_report) for _ in range(slow)]
+    gevent.sleep(0)
+    started = time.perf_counter()
+    Pool(concurrency).map(send, range(requests))
+    elapsed = time.perf_counter() - started
+    running[0] = False
+    gevent.joinall(slow_greenlets)
+
+    return {
+        "gevent_wait_callback": db_wait_callback,
+        "settings": {key: app.config[key] for key in BEFORE},
+        "requests": requests,
+        "elapsed_seconds": round(elapsed, 3),
+        "requests_per_second": round(requests / elapsed, 2),
+        "latency_ms": {
+            "p50": round(percentile(latencies, 50), 3),
+            "p90": round(percentile(latencies, 90), 3),
+            "p99": round(percentile(latencies, 99), 3),
+            "max": round(max(latencies), 3),
+        },
+        "status_codes": {str(code): count for code, count in sorted(status_codes.items())},
+        "errors": len(errors),
+        "slow_queries_completed": slow_queries[0],
+    }
+
+
+def run_child(label, overrides, users_file, args):
+    env = dict(os.environ, **overrides)
+    command = [
+        sys.executable, "-m", "benchmarks.pool_load_test", "--child", users_file,
+        "--concurrency", str(args.concurrency), "--requests", str(args.requests),
+        "--slow", str(args.slow), "--slow-ms", str(args.slow_ms),
+    ]
+    result = subprocess.run(command, env=env, capture_output=True, text=True)
+    if result.returncode:
+        sys.stderr.write(result.stderr)
+        raise SystemExit(f"{label} run failed")
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--concurrency", type=int, default=200, help="Greenlets sending requests")
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--slow", type=int, default=4, help="Greenlets running slow queries meanwhile")
+    parser.add_argument("--slow-ms", type=int, default=250, help="Duration of each slow query")
+    parser.add_argument("--child", metavar="USERS_FILE", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        with open(args.child) as f:
+            ids = json.load(f)
+        print(json.dumps(workload(ids, args.concurrency, args.requests, args.slow, args.slow_ms), sort_keys=True))
+        sys.exit(0)
+
+    with tempfile.NamedTemporaryFile("w", suffix=".json", delete=False) as f:
+        json.dump(seed(args.users), f)
+    try:
+        before = run_child("before", BEFORE, f.name, args)
+        after = run_child("after", {}, f.name, args)
+    finally:
+        os.unlink(f.name)
+
+    print(json.dumps({
+        "parameters": {key: value for key, value in vars(args).items() if key != "child"},
+        "before": before,
+        "after": after,
+        "throughput_ratio": round(after["requests_per_second"] / before["requests_per_second"], 2),
+    }, indent=2, sort_keys=True))
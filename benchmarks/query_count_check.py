@@ -0,0 +1,91 @@
+"""
+N+1 regression check for the financial record list endpoints.
+
+Seeds users with very different record volumes, calls each endpoint once per
+user and compares the number of SQL statements issued. The counts must not
+grow with the number of records returned, and a batch simulation must stay
+within SIMULATE_MAX_STATEMENTS reads; exits non-zero otherwise.
+
+Usage (scratch database only):
+    python -m benchmarks.query_count_check --small 5 --large 500
+"""
+import argparse
+import json
+import sys
+from datetime import datetime, timezone
+from app import app, db
+from benchmarks.counters import StatementCounter
+from benchmarks.seed import ensure_reference_data, seed_user, seed_records
+
+SIMULATE_MAX_STATEMENTS = 3
+
+ENDPOINTS = {
+    "all": "/api/v1/financial_records/all/{user_id}?limit=1000",
+    "all_ndjson": "/api/v1/financial_records/all/{user_id}?format=ndjson",
+    "income": "/api/v1/financial_records/income/{user_id}",
+    "expense": "/api/v1/financial_records/expense/{user_id}",
+    "monthly_records": "/api/v1/financial_records/monthly_records/{user_id}/{month}",
+}
+
+
+def count_statements(client, counter, url):
+    counter.reset()
+    counter.enabled = True
+    response = client.get(url)
+    response.get_data()  # drain streamed responses inside the measurement
+    counter.enabled = False
+    if response.status_code != 200:
+        raise RuntimeError(f"{url} failed: {response.status_code} {response.get_data(as_text=True)}")
+    return counter.statements
+
+
+def run(small, large):
+    with app.app_context():
+        categories = ensure_reference_data()
+        users = {}
+        for label, per_month in (("small", small), ("large", large)):
+            user_id = seed_user(goal_count=5, prefix=f"qc-{label}")
+            seed_records(user_id, categories, months=3, per_month=per_month)
+            users[label] = user_id
+        db.session.remove()
+
+        counter = StatementCounter(db.engine)
+        client = app.test_client()
+        month = datetime.now(timezone.utc).strftime("%Y-%m")
+        report, failures = {}, []
+        for name, template in ENDPOINTS.items():
+            counts = {
+                label: count_statements(client, counter, template.format(user_id=user_id, month=month))
+                for label, user_id in users.items()
+            }
+            report[name] = counts
+            if counts["large"] != counts["small"]:
+                failures.append(name)
+
+        # The simulation endpoint must stay within three reads however many scenarios it evaluates
+        scenarios = [{"type": "expense" if i % 2 else "income", "amount": 10 * (i + 1)} for i in range(50)]
+        counts = {}
+        for label, user_id in users.items():
+            counter.reset()
+            counter.enabled = True
+            response = client.post(f"/api/v1/allocations/simulate/{user_id}", json={"scenarios": scenarios})
+            counter.enabled = False
+            if response.status_code != 200:
+                raise RuntimeError(f"simulate failed: {response.status_code} {response.get_data(as_text=True)}")
+            counts[label] = counter.statements
+        report["simulate"] = counts
+        if max(counts.values()) > SIMULATE_MAX_STATEMENTS:
+            failures.append("simulate")
+
+    return report, failures
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--small", type=int, default=5, help="records per month for the small user")
+    parser.add_argument("--large", type=int, default=500, help="records per month for the large user")
+    args = parser.parse_args()
+
+    report, failures = run(args.small, args.large)
+    print(json.dumps({"statements": report, "failures": failures}, indent=2))
+    sys.exit(1 if failures else 0)
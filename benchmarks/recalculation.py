@@ -0,0 +1,81 @@
+"""
+Round-trips, commits and latency per POST /api/v1/allocations/recalculate.
+
+Usage (scratch database only):
+    python -m benchmarks.recalculation --iterations 200 --goals 10 > after.json
+
+Run the same command on the revision you want to compare against and diff
+the two reports. Each iteration records one income or expense directly
+(not measured) and then times the recalculation request.
+"""
+import argparse
+import json
+import statistics
+import time
+from datetime import datetime, timezone
+from decimal import Decimal
+from app import app, db
+from app.models.client.financial import FinancialRecord
+from benchmarks.counters import StatementCounter
+from benchmarks.seed import ensure_reference_data, seed_user
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def run(iterations, goal_count):
+    with app.app_context():
+        categories = ensure_reference_data()
+        user_id = seed_user(goal_count=goal_count)
+        counter = StatementCounter(db.engine)
+        client = app.test_client()
+
+        latencies, statements, commits = [], [], []
+        for i in range(iterations):
+            # Mostly income with a periodic expense so both branches are exercised
+            category = "Rent" if i % 4 == 3 else "Salary"
+            FinancialRecord.create_record(
+                user_id=user_id,
+                category_id=categories[category],
+                amount=Decimal("250.00") if category == "Salary" else Decimal("400.00"),
+                recorded_at=datetime.now(timezone.utc),
+                expected_transaction=False
+            )
+            db.session.remove()
+
+            counter.reset()
+            counter.enabled = True
+            started = time.perf_counter()
+            response = client.post(f"/api/v1/allocations/recalculate/{user_id}")
+            elapsed = (time.perf_counter() - started) * 1000
+            counter.enabled = False
+
+            if response.status_code != 200:
+                raise RuntimeError(f"Recalculation failed: {response.status_code} {response.get_data(as_text=True)}")
+            latencies.append(elapsed)
+            statements.append(counter.statements)
+            commits.append(counter.commits)
+
+    return {
+        "endpoint": "/api/v1/allocations/recalculate",
+        "iterations": iterations,
+        "goals": goal_count,
+        "latency_ms": {
+            "mean": round(statistics.mean(latencies), 3),
+            "p50": round(percentile(latencies, 50), 3),
+            "p99": round(percentile(latencies, 99), 3),
+        },
+        "statements_per_request": round(statistics.mean(statements), 2),
+        "commits_per_request": round(statistics.mean(commits), 2),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=100)
+    parser.add_argument("--goals", type=int, default=5)
+    args = parser.parse_args()
+    print(json.dumps(run(args.iterations, args.goals), indent=2))
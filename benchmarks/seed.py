@@ -0,0 +1,187 @@
+"""
+Synthetic data for benchmarks.
+"""
+import random
+import uuid
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from app import db
+from app.models.central.central import Currency
+from app.models.client.users_model import User, UserFinancialProfile
+from app.models.client.financial import Categories, CategoriesType, FinancialRecord, UserMonthlyTotal
+from app.models.client.goal import Goal, GoalPriority, GoalProtectionLevel
+
+BENCH_CURRENCY = "BNC"
+CATEGORIES = [
+    ("Salary", "Income"),
+    ("Rent", "Expense"),
+    ("Saving", "Income"),
+    ("Deficit", "Expense"),
+]
+
+
+def ensure_reference_data():
+    """Create the currency, category types and categories the benchmarks rely on."""
+    if not Currency.get_currency_by_code(BENCH_CURRENCY):
+        db.session.add(Currency(name="Benchmark Coin", symbol="B", code=BENCH_CURRENCY))
+
+    for type_name in ("Income", "Expense"):
+        if not CategoriesType.query.filter_by(name=type_name).first():
+            db.session.add(CategoriesType(name=type_name))
+    db.session.flush()
+
+    categories = {}
+    for name, type_name in CATEGORIES:
+        category = Categories.query.filter(db.func.lower(Categories.name) == name.lower()).first()
+        if not category:
+            category = Categories(name=name, category_type=type_name)
+            db.session.add(category)
+        categories[name] = category
+    db.session.commit()
+    return {name: category.category_id for name, category in categories.items()}
+
+
+def seed_user(goal_count=5, prefix="bench"):
+    """Create a user with a financial profile and `goal_count` active goals. Returns the user_id."""
+    tag = uuid.uuid4().hex[:10]
+    user = User(
+        email=f"{prefix}-{tag}@example.com",
+        password="not-a-real-hash",
+        first_name="Bench",
+        last_name=tag,
+        country_of_residence="Nowhere",
+        currency=BENCH_CURRENCY
+    )
+    db.session.add(user)
+    db.session.flush()
+
+    db.session.add(UserFinancialProfile(
+        user_id=user.user_id,
+        expected_monthly_income=Decimal("5000.00"),
+        expected_monthly_expenses=Decimal("3000.00"),
+        base_allocation_rate=Decimal("0.50")
+    ))
+
+    for i in range(goal_count):
+        priority = GoalPriority(name=f"{prefix}-{tag}-{i}", user_id=user.user_id, percentage=10 + (i * 17) % 80)
+        db.session.add(priority)
+        db.session.flush()
+        db.session.add(Goal(
+            user_id=user.user_id,
+            title=f"Goal {i}",
+            target_amount=Decimal(1000 * (i + 1)),
+            current_amount=Decimal("0.00"),
+            priority_id=priority.priority_id,
+            protection_level=GoalProtectionLevel.FLEXIBLE,
+            created_at=datetime.now(timezone.utc),
+            updated_at=datetime.now(timezone.utc)
+        ))
+    db.session.commit()
+    return user.user_id
+
+
+def record_rows(user_id, categories, months=12, per_month=20, end=None):
+    """Yield `per_month` synthetic income/expense rows for each of the last `months` months."""
+    end = end or datetime.now(timezone.utc).replace(tzinfo=None)
+    rng = random.Random(str(user_id))
+    for offset in range(months):
+        year, month = end.year, end.month - offset
+        while month <= 0:
+            month += 12
+            year -= 1
+        for i in range(per_month):
+            is_income = i % 3 == 0
+            recorded_at = datetime(year, month, 1 + rng.randrange(28), rng.randrange(24), rng.randrange(60))
+            yield {
+                "record_id": uuid.uuid4(),
+                "user_id": user_id,
+                "category_id": categories["Salary" if is_income else "Rent"],
+                "amount": Decimal(rng.randrange(1000, 200000)) / 100,
+                "recorded_at": recorded_at,
+                "created_at": recorded_at,
+                "updated_at": recorded_at,
+                "expected_transaction": rng.random() < 0.1,
+                "is_allocation_transaction": rng.random() < 0.05,
+            }
+
+
+def _insert_batched(model, rows, batch_size=5000):
+    for start in range(0, len(rows), batch_size):
+        db.session.execute(pg_insert(model).values(rows[start:start + batch_size]))
+
+
+def seed_records(user_id, categories, months=12, per_month=20, end=None, batch_size=5000):
+    """
+    Bulk insert `per_month` income/expense records for each of the last `months` months.
+    Bypasses FinancialRecord.create_record, so run `flask totals rebuild` afterwards
+    if the rollup matters for the benchmark.
+    """
+    rows = list(record_rows(user_id, categories, months, per_month, end))
+    _insert_batched(FinancialRecord, rows, batch_size)
+    db.session.commit()
+    return len(rows)
+
+
+def seed_dataset(users, goals_per_user, per_month, months, password, prefix="bench", batch_size=5000):
+    """
+    Bulk-create `users` users that can log in with `password`, each with a financial
+    profile, `goals_per_user` goals and `per_month` records for each of the last
+    `months` months, then rebuild the monthly totals rollup for them.
+
+    Returns:
+        (categories, [(user_id, email)])
+    """
+    categories = ensure_reference_data()
+    password_hash = User.set_password(password)
+    now = datetime.now(timezone.utc)
+    run_tag = uuid.uuid4().hex[:8]
+
+    accounts, user_rows, profile_rows, priority_rows, goal_rows = [], [], [], [], []
+    for n in range(users):
+        user_id = uuid.uuid4()
+        email = f"{prefix}-{run_tag}-{n}@example.com"
+        accounts.append((user_id, email))
+        user_rows.append({
+            "user_id": user_id, "email": email, "password": password_hash,
+            "first_name": "Bench", "last_name": str(n), "country_of_residence": "Nowhere",
+            "currency": BENCH_CURRENCY, "created_at": now, "updated_at": now,
+        })
+        profile_rows.append({
+            "id": uuid.uuid4(), "user_id": user_id,
+            "expected_monthly_income": Decimal("5000.00"), "expected_monthly_expenses": Decimal("3000.00"),
+            "base_allocation_rate": Decimal("0.50"), "deficit_balance": Decimal("0.00"),
+            "savings_balance": Decimal("0.00"), "created_at": now, "updated_at": now,
+        })
+        for i in range(goals_per_user):
+            priority_id = uuid.uuid4()
+            priority_rows.append({
+                "priority_id": priority_id, "name": f"{prefix}-{run_tag}-{n}-{i}", "user_id": user_id,
+                "percentage": 10 + (i * 17) % 80, "created_at": now, "updated_at": now,
+            })
+            goal_rows.append({
+                "goal_id": uuid.uuid4(), "user_id": user_id, "title": f"Goal {i}",
+                "target_amount": Decimal(1000 * (i + 1)), "current_amount": Decimal("0.00"),
+                "priority_id": priority_id, "protection_level": GoalProtectionLevel.FLEXIBLE,
+                "is_completed": False, "is_active": True, "is_locked": False, "is_essential": False,
+                "is_committed_expense": False, "created_at": now - timedelta(days=31 * months),
+                "updated_at": now,
+            })
+
+    _insert_batched(User, user_rows, batch_size)
+    _insert_batched(UserFinancialProfile, profile_rows, batch_size)
+    _insert_batched(GoalPriority, priority_rows, batch_size)
+    _insert_batched(Goal, goal_rows, batch_size)
+    db.session.commit()
+
+    rows = []
+    for user_id, _ in accounts:
+        rows.extend(record_rows(user_id, categories, months, per_month))
+        if len(rows) >= batch_size:
+            _insert_batched(FinancialRecord, rows, batch_size)
+            rows = []
+    _insert_batched(FinancialRecord, rows, batch_size)
+    db.session.commit()
+
+    UserMonthlyTotal.rebuild()
+    return categories, accounts
@@ -0,0 +1,176 @@
+"""
+Latency and queries per request for the hot endpoints, on a synthetic dataset.
+
+Seeds a scratch Postgres with --users users, each with --goals goals and
+--per-month income/expense records for each of the last --months months, then
+sends --iterations requests to each endpoint (spread over the seeded users)
+through the Flask test client and records latency and the SQL statements each
+request issued:
+
+    recalculate      POST /api/v1/allocations/recalculate/<user_id>
+                     (after inserting one record directly, so there is work to do)
+    create_record    POST /api/v1/financial_records/create/<user_id>/financial-records
+    monthly_records  GET  /api/v1/financial_records/monthly_records/<user_id>/<YYYY-MM>
+    user_allocations GET  /api/v1/allocations/user/<user_id>
+    login            POST /api/v1/auth/login
+
+The report is JSON with stable keys, so reports from two revisions diff cleanly:
+
+    python -m benchmarks.suite --users 200 --goals 8 --per-month 30 --months 12 > before.json
+    git checkout <other revision>
+    python -m benchmarks.suite --users 200 --goals 8 --per-month 30 --months 12 > after.json
+    diff before.json after.json
+
+Redis must be running for the recalculation lock; without it recalculate answers
+503 and the report shows that under status_codes.
+"""
+import argparse
+import json
+import random
+import statistics
+import subprocess
+import time
+from datetime import datetime, timezone
+from decimal import Decimal
+from app import app, db
+from app.models.client.financial import FinancialRecord
+from app.models.central.central import Currency
+from benchmarks.counters import StatementCounter
+from benchmarks.recalculation import percentile
+from benchmarks.seed import BENCH_CURRENCY, seed_dataset
+
+PASSWORD = "bench-password-1"
+
+
+def git_revision():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def summarize(latencies, statements, status_codes):
+    return {
+        "requests": len(latencies),
+        "status_codes": {str(code): count for code, count in sorted(status_codes.items())},
+        "latency_ms": {
+            "mean": round(statistics.mean(latencies), 3),
+            "p50": round(percentile(latencies, 50), 3),
+            "p90": round(percentile(latencies, 90), 3),
+            "p99": round(percentile(latencies, 99), 3),
+            "max": round(max(latencies), 3),
+        },
+        "queries_per_request": {
+            "mean": round(statistics.mean(statements), 2),
+            "p50": percentile(statements, 50),
+            "max": max(statements),
+        },
+    }
+
+
+def measure(counter, iterations, send, prepare=None):
+    """Call send(i) `iterations` times, timing it and counting its statements."""
+    latencies, statements, status_codes = [], [], {}
+    for i in range(iterations):
+        if prepare:
+            prepare(i)
+            db.session.remove()
+
+        counter.reset()
+        counter.enabled = True
+        started = time.perf_counter()
+        response = send(i)
+        response.get_data()  # drain streamed bodies inside the measurement
+        elapsed = (time.perf_counter() - started) * 1000
+        counter.enabled = False
+
+        latencies.append(elapsed)
+        statements.append(counter.statements)
+        status_codes[response.status_code] = status_codes.get(response.status_code, 0) + 1
+    return summarize(latencies, statements, status_codes)
+
+
+def run(users, goals, per_month, months, iterations, seed):
+    rng = random.Random(seed)
+    with app.app_context():
+        started = time.perf_counter()
+        categories, accounts = seed_dataset(users, goals, per_month, months, PASSWORD)
+        seed_seconds = time.perf_counter() - started
+        currency_id = str(Currency.get_cached_currency_by_code(BENCH_CURRENCY)["id"])
+        db.session.remove()
+
+        picks = [rng.choice(accounts) for _ in range(iterations)]
+        month = datetime.now(timezone.utc).strftime("%Y-%m")
+        counter = StatementCounter(db.engine)
+        client = app.test_client()
+
+        def add_record(i):
+            FinancialRecord.create_record(
+                user_id=picks[i][0],
+                category_id=categories["Salary" if i % 4 else "Rent"],
+                amount=Decimal("250.00"),
+                recorded_at=datetime.now(timezone.utc),
+                expected_transaction=False
+            )
+
+        endpoints = {
+            "recalculate": (
+                lambda i: client.post(f"/api/v1/allocations/recalculate/{picks[i][0]}"),
+                add_record
+            ),
+            "create_record": (
+                lambda i: client.post(
+                    f"/api/v1/financial_records/create/{picks[i][0]}/financial-records",
+                    json={
+                        "category_id": str(categories["Salary" if i % 4 else "Rent"]),
+                        "amount": "125.50",
+                        "recorded_at": datetime.now(timezone.utc).replace(tzinfo=None).isoformat(),
+                        "currency_id": currency_id,
+                    }
+                ),
+                None
+            ),
+            "monthly_records": (
+                lambda i: client.get(f"/api/v1/financial_records/monthly_records/{picks[i][0]}/{month}"),
+                None
+            ),
+            "user_allocations": (
+                lambda i: client.get(f"/api/v1/allocations/user/{picks[i][0]}"),
+                None
+            ),
+            "login": (
+                lambda i: client.post("/api/v1/auth/login", json={"email": picks[i][1], "password": PASSWORD}),
+                None
+            ),
+        }
+
+        results = {name: measure(counter, iterations, send, prepare) for name, (send, prepare) in endpoints.items()}
+
+    return {
+        "revision": git_revision(),
+        "parameters": {
+            "users": users,
+            "goals_per_user": goals,
+            "records_per_month": per_month,
+            "months": months,
+            "iterations": iterations,
+            "seed": seed,
+        },
+        "seed_seconds": round(seed_seconds, 3),
+        "endpoints": results,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=100)
+    parser.add_argument("--goals", type=int, default=5, help="Goals per user")
+    parser.add_argument("--per-month", type=int, default=30, help="Records per user per month")
+    parser.add_argument("--months", type=int, default=12, help="Months of history")
+    parser.add_argument("--iterations", type=int, default=200, help="Requests per endpoint")
+    parser.add_argument("--seed", type=int, default=1, help="Seed for the user picked by each request")
+    args = parser.parse_args()
+    report = run(args.users, args.goals, args.per_month, args.months, args.iterations, args.seed)
+    print(json.dumps(report, indent=2, sort_keys=True))
@@ -31,3 +31,17 @@ echo "Starting Gunicorn..."
 nohup gunicorn -k gevent --worker-connections 1000 -w 2 -b 0.0.0.0:8000 app:app > gunicorn.log 2>&1 &
 
 echo "Gunicorn started in background (check gunicorn.log for logs)"
+
+# Record creation only queues allocation recalculations; these workers run them
+ALLOC_WORKERS=${ALLOC_WORKERS:-1}
+mkdir -p logs
+echo "Starting $ALLOC_WORKERS allocation worker(s)..."
+for i in $(seq 1 "$ALLOC_WORKERS"); do
+    nohup flask --app app.py allocations worker > "logs/alloc_worker_$i.log" 2>&1 &
+done
+echo "Allocation workers started in background (check logs/alloc_worker_*.log for logs)"
+
+# Emails (waitlist verification) are only queued in email_outbox; this worker delivers them
+echo "Starting email worker..."
+nohup flask --app app.py email worker > logs/email_worker.log 2>&1 &
+echo "Email worker started in background (check logs/email_worker.log for logs)"
@@ -0,0 +1,52 @@
+"""unique monthly goal allocation per user, goal and month
+
+Revision ID: 3b7e9c1d2a45
+Revises: fee82014e28f
+Create Date: 2026-10-17 09:12:44.318204
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3b7e9c1d2a45'
+down_revision = 'fee82014e28f'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Merge any duplicate (user_id, goal_id, month) rows into one before adding the constraint
+    op.execute("""
+        WITH dupes AS (
+            SELECT user_id, goal_id, month,
+                   SUM(allocated_amount) AS total,
+                   MAX(allocation_id::text) AS keep_id
+            FROM monthly_goal_allocations
+            GROUP BY user_id, goal_id, month
+            HAVING COUNT(*) > 1
+        )
+        UPDATE monthly_goal_allocations a
+        SET allocated_amount = dupes.total
+        FROM dupes
+        WHERE a.allocation_id::text = dupes.keep_id
+    """)
+    op.execute("""
+        DELETE FROM monthly_goal_allocations a
+        USING monthly_goal_allocations b
+        WHERE a.user_id = b.user_id
+          AND a.goal_id = b.goal_id
+          AND a.month = b.month
+          AND a.allocation_id::text < b.allocation_id::text
+    """)
+
+    with op.batch_alter_table('monthly_goal_allocations', schema=None) as batch_op:
+        batch_op.create_unique_constraint(
+            'uq_monthly_goal_allocations_user_goal_month', ['user_id', 'goal_id', 'month']
+        )
+
+
+def downgrade():
+    with op.batch_alter_table('monthly_goal_allocations', schema=None) as batch_op:
+        batch_op.drop_constraint('uq_monthly_goal_allocations_user_goal_month', type_='unique')
@@ -0,0 +1,52 @@
+"""user monthly totals rollup
+
+Revision ID: 8d41f0a6c2b7
+Revises: 3b7e9c1d2a45
+Create Date: 2026-10-17 11:03:27.554912
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8d41f0a6c2b7'
+down_revision = '3b7e9c1d2a45'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('user_monthly_totals',
+        sa.Column('user_id', sa.UUID(), nullable=False),
+        sa.Column('month', sa.String(length=7), nullable=False),
+        sa.Column('category_type', sa.String(length=255), nullable=False),
+        sa.Column('total_amount', sa.Numeric(precision=14, scale=2), nullable=False),
+        sa.Column('expected_amount', sa.Numeric(precision=14, scale=2), nullable=False),
+        sa.Column('record_count', sa.Integer(), nullable=False),
+        sa.Column('updated_at', sa.DateTime(timezone=True), nullable=False),
+        sa.ForeignKeyConstraint(['user_id'], ['users.user_id'], ),
+        sa.PrimaryKeyConstraint('user_id', 'month', 'category_type')
+    )
+
+    # Backfill from the existing ledger
+    op.execute("""
+        INSERT INTO user_monthly_totals
+            (user_id, month, category_type, total_amount, expected_amount, record_count, updated_at)
+        SELECT fr.user_id,
+               to_char(fr.recorded_at, 'YYYY-MM'),
+               tc.category_type,
+               COALESCE(SUM(fr.amount) FILTER (WHERE NOT fr.expected_transaction), 0),
+               COALESCE(SUM(fr.amount) FILTER (WHERE fr.expected_transaction), 0),
+               COUNT(*),
+               now()
+        FROM financial_records fr
+        JOIN transaction_categories tc ON tc.category_id = fr.category_id
+        WHERE NOT fr.is_allocation_transaction
+          AND tc.category_type IN ('Income', 'Expense')
+        GROUP BY fr.user_id, to_char(fr.recorded_at, 'YYYY-MM'), tc.category_type
+    """)
+
+
+def downgrade():
+    op.drop_table('user_monthly_totals')
@@ -0,0 +1,31 @@
+"""monthly goal allocations user month goal index
+
+Revision ID: a4c81f2e6d37
+Revises: e71b3d9a5c08
+Create Date: 2026-10-17 18:41:09.207331
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a4c81f2e6d37'
+down_revision = 'e71b3d9a5c08'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Used by recalculations to sum a user's current-month allocations per goal
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'ix_monthly_goal_allocations_user_month_goal', 'monthly_goal_allocations',
+            ['user_id', 'month', 'goal_id'],
+            unique=False, postgresql_concurrently=True, if_not_exists=True
+        )
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_monthly_goal_allocations_user_month_goal', table_name='monthly_goal_allocations', postgresql_concurrently=True, if_exists=True)
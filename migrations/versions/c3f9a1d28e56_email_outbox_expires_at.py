@@ -0,0 +1,26 @@
+"""email outbox expires_at
+
+Revision ID: c3f9a1d28e56
+Revises: b7d2e5f19c43
+Create Date: 2026-10-18 15:47:09.512830
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c3f9a1d28e56'
+down_revision = 'b7d2e5f19c43'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('email_outbox', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('expires_at', sa.DateTime(timezone=True), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('email_outbox', schema=None) as batch_op:
+        batch_op.drop_column('expires_at')
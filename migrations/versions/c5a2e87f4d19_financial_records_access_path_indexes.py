@@ -0,0 +1,46 @@
+"""financial records access path indexes
+
+Revision ID: c5a2e87f4d19
+Revises: 8d41f0a6c2b7
+Create Date: 2026-10-17 13:41:09.207331
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c5a2e87f4d19'
+down_revision = '8d41f0a6c2b7'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # CONCURRENTLY cannot run inside a transaction; avoids locking writes on a large table
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'ix_financial_records_user_recorded', 'financial_records',
+            ['user_id', 'recorded_at', 'record_id'],
+            unique=False, postgresql_concurrently=True, if_not_exists=True
+        )
+        op.create_index(
+            'ix_financial_records_user_recorded_user_entered', 'financial_records',
+            ['user_id', 'recorded_at'],
+            unique=False, postgresql_concurrently=True, if_not_exists=True,
+            postgresql_where=sa.text('NOT is_allocation_transaction')
+        )
+        op.create_index(
+            'ix_financial_records_user_recorded_actual', 'financial_records',
+            ['user_id', 'recorded_at'],
+            unique=False, postgresql_concurrently=True, if_not_exists=True,
+            postgresql_include=['category_id', 'amount'],
+            postgresql_where=sa.text('NOT is_allocation_transaction AND NOT expected_transaction')
+        )
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_financial_records_user_recorded_actual', table_name='financial_records', postgresql_concurrently=True, if_exists=True)
+        op.drop_index('ix_financial_records_user_recorded_user_entered', table_name='financial_records', postgresql_concurrently=True, if_exists=True)
+        op.drop_index('ix_financial_records_user_recorded', table_name='financial_records', postgresql_concurrently=True, if_exists=True)
@@ -0,0 +1,31 @@
+"""user monthly totals: cascade user delete
+
+Revision ID: d5a8c7e31f90
+Revises: c3f9a1d28e56
+Create Date: 2026-10-18 18:21:37.904116
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd5a8c7e31f90'
+down_revision = 'c3f9a1d28e56'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Deleting a user removes their rollup rows instead of failing on the foreign key
+    with op.batch_alter_table('user_monthly_totals', schema=None) as batch_op:
+        batch_op.drop_constraint('user_monthly_totals_user_id_fkey', type_='foreignkey')
+        batch_op.create_foreign_key(
+            'user_monthly_totals_user_id_fkey', 'users', ['user_id'], ['user_id'], ondelete='CASCADE'
+        )
+
+
+def downgrade():
+    with op.batch_alter_table('user_monthly_totals', schema=None) as batch_op:
+        batch_op.drop_constraint('user_monthly_totals_user_id_fkey', type_='foreignkey')
+        batch_op.create_foreign_key('user_monthly_totals_user_id_fkey', 'users', ['user_id'], ['user_id'])
@@ -0,0 +1,32 @@
+"""monthly goal allocations open month index
+
+Revision ID: e71b3d9a5c08
+Revises: c5a2e87f4d19
+Create Date: 2026-10-17 15:02:37.518204
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e71b3d9a5c08'
+down_revision = 'c5a2e87f4d19'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Used by month-end finalization to walk users with open allocations in a month
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'ix_monthly_goal_allocations_month_user_open', 'monthly_goal_allocations',
+            ['month', 'user_id'],
+            unique=False, postgresql_concurrently=True, if_not_exists=True,
+            postgresql_where=sa.text('is_finalized IS NOT TRUE')
+        )
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_monthly_goal_allocations_month_user_open', table_name='monthly_goal_allocations', postgresql_concurrently=True, if_exists=True)
@@ -0,0 +1,12 @@
+import sys
+import types
+from pathlib import Path
+
+# The allocation engine is pure Python; import `app` and `app.helpers` as bare packages so the
+# tests don't run app/__init__.py (the Flask app, which needs a database and Redis configured).
+APP_DIR = Path(__file__).resolve().parent.parent / "app"
+for name, path in (("app", APP_DIR), ("app.helpers", APP_DIR / "helpers")):
+    if name not in sys.modules:
+        package = types.ModuleType(name)
+        package.__path__ = [str(path)]
+        sys.modules[name] = package
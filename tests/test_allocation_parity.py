@@ -0,0 +1,134 @@
+"""
+Cent-level parity of the surplus split: water_fill (Decimal engine path), the
+integer-cent NumPy allocator (allocation_vectorized) and the engine with the
+vectorized split forced on must agree exactly, on generated portfolios.
+
+Inputs come from a seeded generator, one portfolio per seed: random sizes,
+percentages including zero and negative, completed and locked goals, overfunded
+goals and amounts with zero to two decimals. A failing seed reproduces exactly.
+"""
+import random
+from decimal import Decimal
+import pytest
+from app.helpers import allocation_engine, allocation_vectorized
+from app.helpers.allocation_engine import AllocationGoal, plan_recalculation, water_fill
+
+SEEDS = range(300)
+
+ZERO_BALANCES = {
+    "savings_balance": Decimal("0.00"),
+    "deficit_balance": Decimal("0.00"),
+    "total_income_snapshot": Decimal("0.00"),
+    "total_expense_snapshot": Decimal("0.00"),
+    "include_savings_in_alloc": False,
+}
+
+needs_numpy = pytest.mark.skipif(not allocation_vectorized.available(), reason="NumPy is not installed")
+
+
+def random_amount(rng, high):
+    """Amounts as the API hands them to the engine: floats with at most two decimals."""
+    return round(rng.uniform(0, high), rng.choice([0, 1, 2]))
+
+
+def random_portfolio(seed, max_goals=60):
+    rng = random.Random(seed)
+    goals = []
+    for i in range(rng.randint(0, max_goals)):
+        target = random_amount(rng, 50000) or 1.0
+        goals.append(AllocationGoal(
+            goal_id=f"g{i}",
+            title=f"Goal {i}",
+            target_amount=target,
+            current_amount=random_amount(rng, target * 1.2),  # some goals are already overfunded
+            priority_percentage=float(rng.choice([0, 0, -5, rng.randint(1, 100), rng.randint(1, 100)])),
+            status="completed" if rng.random() < 0.05 else None,
+            is_locked=rng.random() < 0.05,
+        ))
+    # Small pools fill nothing completely, large ones fill everything
+    available = Decimal(str(random_amount(rng, rng.choice([100, 10000, 1000000])) or 0.01))
+    return available, goals
+
+
+def open_gaps(goals):
+    """Gap in cents per goal that can take surplus funds (open, positive priority)."""
+    gaps = {}
+    for g in goals:
+        gap = allocation_vectorized.to_cents(Decimal(str(g.target_amount)) - Decimal(str(g.current_amount)))
+        if g.status != "completed" and not g.is_locked and gap > 0 and g.priority_percentage > 0:
+            gaps[g.goal_id] = gap
+    return gaps
+
+
+def decimal_path(monkeypatch, available, goals, vectorized):
+    """Goal allocations and savings in cents from plan_recalculation."""
+    monkeypatch.setattr(allocation_engine, "VECTORIZE_MIN_GOALS", 1 if vectorized else float("inf"))
+    plan = plan_recalculation(ZERO_BALANCES, {"total_income": available, "total_expense": 0}, goals)
+    alloc = {goal_id: int(amount * 100) for goal_id, amount in plan.goal_deltas.items()}
+    return alloc, int(plan.savings_balance * 100)
+
+
+@pytest.mark.parametrize("seed", SEEDS)
+def test_decimal_path_fills_open_gaps_from_the_pool(monkeypatch, seed):
+    available, goals = random_portfolio(seed)
+    alloc, savings = decimal_path(monkeypatch, available, goals, vectorized=False)
+    gaps = open_gaps(goals)
+    pool = min(allocation_vectorized.to_cents(available), sum(gaps.values()))
+
+    assert sum(alloc.values()) == pool
+    assert all(0 < cents <= gaps[goal_id] for goal_id, cents in alloc.items())
+    assert savings == allocation_vectorized.to_cents(available) - pool
+
+
+@needs_numpy
+@pytest.mark.parametrize("seed", SEEDS)
+def test_batch_allocator_matches_decimal_path(monkeypatch, seed):
+    available, goals = random_portfolio(seed)
+    expected = decimal_path(monkeypatch, available, goals, vectorized=False)
+
+    alloc_c, savings_c, _ = allocation_vectorized.allocate_surplus_batch(
+        *allocation_vectorized.build_batch([(available, goals)])
+    )
+    got = {g.goal_id: int(cents) for g, cents in zip(goals, alloc_c) if cents}
+    assert (got, int(savings_c[0])) == expected
+
+
+@needs_numpy
+@pytest.mark.parametrize("seed", SEEDS)
+def test_vectorized_engine_matches_decimal_path(monkeypatch, seed):
+    available, goals = random_portfolio(seed)
+    expected = decimal_path(monkeypatch, available, goals, vectorized=False)
+    assert decimal_path(monkeypatch, available, goals, vectorized=True) == expected
+
+
+@needs_numpy
+def test_batch_allocates_many_users_in_one_pass(monkeypatch):
+    portfolios = [random_portfolio(seed) for seed in SEEDS]
+    expected = [decimal_path(monkeypatch, available, goals, vectorized=False) for available, goals in portfolios]
+
+    batch = allocation_vectorized.build_batch(portfolios)
+    alloc_c, savings_c, _ = allocation_vectorized.allocate_surplus_batch(*batch)
+    offsets = batch[1]
+    for user, (_, goals) in enumerate(portfolios):
+        start = offsets[user]
+        got = {g.goal_id: int(alloc_c[start + i]) for i, g in enumerate(goals) if alloc_c[start + i]}
+        assert (got, int(savings_c[user])) == expected[user], f"user {user}"
+
+
+@pytest.mark.parametrize("seed", SEEDS)
+def test_water_fill_invariants(seed):
+    rng = random.Random(seed)
+    count = rng.randint(1, 40)
+    caps = [rng.randint(1, 10 ** rng.randint(1, 7)) for _ in range(count)]
+    weights = [rng.randint(1, 10000) for _ in range(count)]
+    pool = rng.randint(0, 2 * sum(caps))
+
+    alloc = water_fill(pool, caps, weights)
+
+    assert sum(alloc) == min(pool, sum(caps))
+    assert all(0 <= a <= cap for a, cap in zip(alloc, caps))
+    if allocation_vectorized.available():
+        batch_alloc, _, _ = allocation_vectorized.allocate_surplus_batch(
+            [pool if pool < sum(caps) else sum(caps)], [0, count], caps, weights, [True] * count
+        )
+        assert [int(a) for a in batch_alloc] == alloc